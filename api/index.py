@@ -0,0 +1,17 @@
+"""
+Entrada da função Python na Vercel: expõe o app ASGI.
+
+A Vercel define VERCEL=1, o que liga o perfil serverless (SERVERLESS em
+config.Settings). As rewrites do vercel.json mandam /api, /admin, /finance,
+/webhook, /webapp e /health para cá; o resto continua no frontend estático.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # static/ e templates/ são caminhos relativos
+
+from app import app  # noqa: E402
+
+__all__ = ["app"]
@@ -5,9 +5,17 @@ import logging
 from contextlib import asynccontextmanager
 
 from database import init_db
-from template_config import templates  # Importar templates configurado
-from routers import bot, webapp, admin, api, finance, player
+from routers import telegram, webapp, admin, api, finance, player, cron
 from config import get_settings
+from services.pg_notify import pg_bridge
+from services.http_client import http_clients
+from services.serialization import FastJSONResponse
+from services.rate_limit import RateLimitMiddleware, rate_limiter
+from services.webhook_inbox import webhook_inbox
+from services.reconciliation import deposit_reconciler
+from services.official_draws import official_draw_sync
+from services.auto_settlement import auto_settlement
+from services.next_drawing import next_drawing_feed
 
 settings = get_settings()
 
@@ -22,11 +30,40 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifecycle events"""
+    if settings.SERVERLESS:
+        # Cada instância pode durar uma única invocação: schema (python migrations.py),
+        # webhook do Telegram (setup_webhook.py) e tarefas periódicas (/api/cron/tick) ficam fora do boot
+        logger.info("Perfil serverless: sem init_db, LISTEN/NOTIFY, workers e registro do webhook no boot")
+        yield
+        await http_clients.aclose()
+        return
+    
     # Startup
     logger.info("Inicializando banco de dados...")
     await init_db()
     logger.info("Banco de dados inicializado!")
     
+    # Conexão LISTEN/NOTIFY para eventos em tempo real entre workers
+    await pg_bridge.start()
+    
+    # Workers do inbox de webhooks do Asaas
+    await webhook_inbox.start()
+    
+    # Reconciliação periódica de depósitos pendentes
+    if settings.RECONCILE_ENABLED:
+        await deposit_reconciler.start()
+    
+    # Histórico de resultados oficiais (backfill na primeira vez, depois incremental)
+    if settings.OFFICIAL_DRAWS_SYNC_ENABLED:
+        await official_draw_sync.start()
+    
+    # Próximo sorteio/jackpot para o Mini App (snapshot em memória)
+    await next_drawing_feed.start()
+    
+    # Apuração automática dos concursos na hora do sorteio oficial
+    if settings.AUTO_SETTLEMENT_MODE != "off":
+        await auto_settlement.start()
+    
     # Configurar webhook do Telegram se WEBHOOK_URL estiver configurado
     if settings.WEBHOOK_URL:
         from routers.bot import bot
@@ -56,6 +93,13 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Encerrando aplicação...")
+    await auto_settlement.stop()
+    await next_drawing_feed.stop()
+    await official_draw_sync.stop()
+    await deposit_reconciler.stop()
+    await webhook_inbox.stop()
+    await pg_bridge.stop()
+    await http_clients.aclose()
     if settings.WEBHOOK_URL:
         from routers.bot import bot
         try:
@@ -69,19 +113,25 @@ async def lifespan(app: FastAPI):
 app = FastAPI(
     title="PowerPix",
     description="Sistema de Loteria - Telegram Mini App + Admin Dashboard",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
+# Rate limiting e limite de concorrência da API pública
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
 # Montar arquivos estáticos
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # Registrar routers
-app.include_router(bot.router, tags=["bot"])
+app.include_router(telegram.router, tags=["bot"])
 app.include_router(webapp.router, tags=["webapp"])
 app.include_router(admin.router, tags=["admin"])
 app.include_router(api.router, tags=["api"])
 app.include_router(finance.router, tags=["finance"])
 app.include_router(player.router, tags=["player"])
+app.include_router(cron.router, tags=["cron"])
 
 
 @app.get("/")
@@ -0,0 +1,29 @@
+"""Script para vincular em lote os clientes Asaas aos usuários (Usuario.asaas_customer_id)"""
+import argparse
+import asyncio
+import logging
+
+from services.asaas_customers import backfill_customer_ids
+from services.http_client import http_clients
+
+
+async def main(batch_size: int, concurrency: int, limit: int = None):
+    try:
+        stats = await backfill_customer_ids(batch_size=batch_size, concurrency=concurrency, limit=limit)
+    finally:
+        await http_clients.aclose()
+
+    print(f"\nUsuários processados: {stats['processados']}")
+    print(f"Vinculados: {stats['vinculados']}")
+    print(f"Erros: {stats['erros']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=5, help="Chamadas simultâneas ao Asaas")
+    parser.add_argument("--limit", type=int, default=None, help="Máximo de usuários nesta execução")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args.batch_size, args.concurrency, args.limit))
@@ -0,0 +1,114 @@
+"""
+Benchmark das chamadas Asaas de um depósito: cliente por chamada x cliente compartilhado
+
+Sobe o fake_asaas.py localmente e executa a sequência de /finance/deposit
+(busca cliente, cria cliente, cria cobrança, obtém QR Code) das duas formas:
+- antes: um httpx.AsyncClient novo por chamada (nova conexão a cada vez)
+- depois: AsaasService com o cliente compartilhado (keep-alive)
+
+Contra o Asaas real (HTTPS) a diferença é maior, pois cada conexão nova
+também paga o handshake TLS.
+
+Uso:
+    python benchmark_asaas_client.py [--requests 200] [--latency-ms 0]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import threading
+import time
+
+import httpx
+import uvicorn
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_fake_asaas(port: int) -> uvicorn.Server:
+    import fake_asaas
+
+    server = uvicorn.Server(uvicorn.Config(fake_asaas.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def deposit_fresh_clients(base_url: str, reference: str):
+    """Fluxo antigo: cada chamada abre e fecha seu próprio cliente"""
+    async with httpx.AsyncClient() as client:
+        await client.get(f"{base_url}/customers", params={"externalReference": reference})
+    async with httpx.AsyncClient() as client:
+        customer = (await client.post(f"{base_url}/customers", json={"name": "Bench", "externalReference": reference})).json()
+    async with httpx.AsyncClient() as client:
+        payment = (await client.post(f"{base_url}/payments", json={
+            "customer": customer["id"], "billingType": "PIX", "value": 10.0, "dueDate": "2030-01-01"
+        })).json()
+    async with httpx.AsyncClient() as client:
+        await client.get(f"{base_url}/payments/{payment['id']}/pixQrCode")
+
+
+async def deposit_shared_client(service, reference: str):
+    """Fluxo atual: AsaasService com o cliente compartilhado"""
+    await service.get_customer_by_external_reference(reference)
+    customer = await service.create_customer(name="Bench", external_reference=reference)
+    payment = await service.create_pix_payment(customer["id"], 10.0, "Bench", reference)
+    await service.get_pix_qrcode(payment["id"])
+
+
+async def measure(label: str, flow, total: int):
+    latencies = []
+    for i in range(total):
+        start = time.perf_counter()
+        await flow(f"{label}-{i}")
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "media": statistics.mean(latencies),
+        "p50": latencies[len(latencies) // 2],
+        "p99": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+    }
+
+
+async def run(total: int, base_url: str):
+    from services.asaas import AsaasService
+    from services.http_client import http_clients
+
+    service = AsaasService()
+    service.api_url = base_url
+
+    antes = await measure("antes", lambda ref: deposit_fresh_clients(base_url, ref), total)
+    depois = await measure("depois", lambda ref: deposit_shared_client(service, ref), total)
+    await http_clients.aclose()
+    return antes, depois
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    os.environ["FAKE_ASAAS_LATENCY_MS"] = str(args.latency_ms)
+    port = free_port()
+    server = start_fake_asaas(port)
+
+    antes, depois = asyncio.run(run(args.requests, f"http://127.0.0.1:{port}"))
+    server.should_exit = True
+
+    print("=" * 60)
+    print(f"Depósito (4 chamadas Asaas) - {args.requests} execuções")
+    print("=" * 60)
+    for label, stats in (("Antes (cliente por chamada)", antes), ("Depois (cliente compartilhado)", depois)):
+        print(f"\n{label}:")
+        print(f"   média {stats['media']:.2f} ms | p50 {stats['p50']:.2f} ms | p99 {stats['p99']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
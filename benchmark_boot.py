@@ -0,0 +1,136 @@
+"""
+Benchmark da checagem de schema no boot (init_db)
+
+Compara, no banco de DATABASE_URL:
+- legado: sequência do init_db antigo (create_all, uma consulta ao
+  information_schema por coluna, ALTERs/índices IF NOT EXISTS e seed do
+  admin/SystemConfig a cada boot)
+- migrations: init_db atual (uma consulta à schema_version com o schema
+  em dia)
+
+Reporta o tempo médio por boot e o número de comandos SQL enviados. Se o
+banco ainda não tiver schema_version, a primeira execução aplica as
+migrações e o tempo desse primeiro boot também é reportado.
+
+Uso:
+    DATABASE_URL=postgresql+asyncpg://... python benchmark_boot.py [--repeat 20]
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import event, select, text
+
+from config import get_settings
+from database import Admin, Base, SystemConfig, engine, init_db
+from migrations import current_version
+
+settings = get_settings()
+
+LEGACY_COLUMNS = [
+    ("sorteios", "revenue"),
+    *[("apostas", c) for c in ("concurso_id", "is_winner", "cota_ganhadora", "valor_premio", "acertos")],
+    *[("usuarios", c) for c in (
+        "pix", "telefone", "cidade", "estado", "cadastro_completo", "cpf", "is_archived",
+        "data_arquivamento", "photo_url", "cpf_digitos", "telefone_digitos", "asaas_customer_id"
+    )],
+    *[("transacoes", c) for c in ("pix_payload", "pix_qrcode", "pix_expira_em")],
+]
+
+
+class StatementCounter:
+    """Conta os comandos enviados pelo engine"""
+
+    def __init__(self):
+        self.count = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def reset(self):
+        self.count = 0
+
+
+async def legacy_boot():
+    """Mesmos comandos do init_db antigo com o schema já criado (nenhum ALTER necessário)"""
+    postgres = engine.dialect.name == "postgresql"
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    if postgres:
+        async with engine.begin() as conn:
+            for table, column in LEGACY_COLUMNS:
+                await conn.execute(text(
+                    "SELECT column_name FROM information_schema.columns "
+                    f"WHERE table_name = '{table}' AND column_name = '{column}'"
+                ))
+            await conn.execute(text("""
+                UPDATE usuarios
+                SET cpf_digitos = NULLIF(regexp_replace(cpf, '\\D', '', 'g'), ''),
+                    telefone_digitos = NULLIF(regexp_replace(telefone, '\\D', '', 'g'), '')
+                WHERE (cpf IS NOT NULL AND cpf_digitos IS NULL)
+                   OR (telefone IS NOT NULL AND telefone_digitos IS NULL)
+            """))
+        async with engine.begin() as conn:
+            await conn.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS ux_usuarios_cpf_telefone_digitos "
+                "ON usuarios (cpf_digitos, telefone_digitos)"
+            ))
+        async with engine.begin() as conn:
+            for index_name, column in [
+                ("ix_usuarios_nome_trgm", "nome"),
+                ("ix_usuarios_cpf_digitos_trgm", "cpf_digitos"),
+                ("ix_usuarios_telefone_digitos_trgm", "telefone_digitos")
+            ]:
+                await conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS {index_name} ON usuarios USING gin ({column} gin_trgm_ops)"
+                ))
+    async with engine.begin() as conn:
+        for statement in [
+            "CREATE INDEX IF NOT EXISTS ix_transacoes_gateway_id ON transacoes (gateway_id)",
+            "CREATE INDEX IF NOT EXISTS ix_transacoes_usuario_created_at ON transacoes (usuario_id, created_at)",
+            "CREATE INDEX IF NOT EXISTS ix_apostas_usuario_data_aposta ON apostas (usuario_id, data_aposta)",
+            "CREATE INDEX IF NOT EXISTS ix_apostas_concurso_winner ON apostas (concurso_id, is_winner)",
+        ]:
+            await conn.execute(text(statement))
+    async with engine.connect() as conn:
+        await conn.execute(select(Admin).where(Admin.username == settings.ADMIN_USERNAME))
+        await conn.execute(select(SystemConfig).limit(1))
+
+
+async def measure(name, fn, repeat, counter):
+    counter.reset()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await fn()
+    elapsed = (time.perf_counter() - started) / repeat
+    print(f"{name:<12} {elapsed * 1000:9.2f} ms/boot   {counter.count / repeat:6.1f} comandos/boot")
+
+
+async def main(repeat: int):
+    counter = StatementCounter()
+    print(f"Banco: {engine.url.render_as_string(hide_password=True)}\n")
+
+    async with engine.connect() as conn:
+        versao = await current_version(conn)
+    if versao == 0:
+        counter.reset()
+        started = time.perf_counter()
+        aplicadas = await init_db()
+        print(f"{'primeiro':<12} {(time.perf_counter() - started) * 1000:9.2f} ms/boot   "
+              f"{counter.count:6d} comandos ({aplicadas} migrações aplicadas)\n")
+
+    # Aquecer o pool: a conexão inicial não entra na comparação
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+    await measure("legado", legacy_boot, repeat, counter)
+    await measure("migrations", init_db, repeat, counter)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20, help="Boots medidos por variante")
+    args = parser.parse_args()
+    asyncio.run(main(args.repeat))
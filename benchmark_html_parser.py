@@ -0,0 +1,110 @@
+"""
+Benchmark do parse da página de resultados do lotteryusa.com
+
+Compara, em cada página de fixtures/lotteryusa/:
+- bs4_html_parser: implementação antiga (BeautifulSoup + html.parser na
+  página inteira, depois find_all('li'))
+- bs4_strainer: BeautifulSoup com lxml e SoupStrainer limitado ao container
+- lxml_xpath: parse_lotteryusa_html (usada pelo serviço)
+
+Reporta o tempo médio por página e o pico de memória alocada pelo Python
+(tracemalloc), e confere se as três extraem o mesmo resultado. A árvore do
+lxml é alocada em C (libxml2) e não aparece no tracemalloc: o pico do
+lxml_xpath mede só os objetos Python criados na extração.
+
+Uso:
+    python benchmark_html_parser.py [--repeat 50]
+"""
+import argparse
+import time
+import tracemalloc
+from pathlib import Path
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from services.powerball_results import parse_lotteryusa_html
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures" / "lotteryusa"
+
+
+def _extract(numbers_container):
+    white_numbers = []
+    powerball = None
+    if numbers_container:
+        for item in numbers_container.find_all('li'):
+            text = item.get_text(strip=True)
+            if text.isdigit():
+                if 'powerball' in item.get('class', []) or 'bonus' in item.get('class', []):
+                    powerball = int(text)
+                else:
+                    white_numbers.append(int(text))
+    if white_numbers and powerball:
+        return {"white": sorted(white_numbers[:5]), "powerball": [powerball]}
+    return None
+
+
+def bs4_html_parser(html: bytes):
+    soup = BeautifulSoup(html, 'html.parser')
+    numbers_container = soup.find('ul', class_='draw-result')
+    if not numbers_container:
+        numbers_container = soup.find(class_='c-draw-result')
+    return _extract(numbers_container)
+
+
+# Só listas e blocos viram nós da árvore (scripts, tabelas, links e textos soltos são descartados)
+STRAINER = SoupStrainer(["ul", "div", "li"])
+
+
+def bs4_strainer(html: bytes):
+    soup = BeautifulSoup(html, 'lxml', parse_only=STRAINER)
+    numbers_container = soup.find('ul', class_='draw-result')
+    if not numbers_container:
+        numbers_container = soup.find(class_='c-draw-result')
+    return _extract(numbers_container)
+
+
+PARSERS = {
+    "bs4_html_parser": bs4_html_parser,
+    "bs4_strainer": bs4_strainer,
+    "lxml_xpath": parse_lotteryusa_html,
+}
+
+
+def medir(parser, html: bytes, repeat: int):
+    parser(html)  # Aquecimento
+    started = time.perf_counter()
+    for _ in range(repeat):
+        resultado = parser(html)
+    media_ms = (time.perf_counter() - started) / repeat * 1000
+
+    tracemalloc.start()
+    parser(html)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, media_ms, pico / 1024
+
+
+def main(args) -> bool:
+    ok = True
+    for pagina in sorted(FIXTURES_DIR.glob("*.html")):
+        html = pagina.read_bytes()
+        print(f"\n{pagina.name} ({len(html) / 1024:.0f} KB) - tempo médio | pico tracemalloc")
+        resultados = {}
+        base_ms = None
+        for nome, parser in PARSERS.items():
+            resultado, media_ms, pico_kb = medir(parser, html, args.repeat)
+            resultados[nome] = resultado
+            base_ms = base_ms or media_ms
+            print(f"   {nome:<16} {media_ms:8.2f} ms/página ({base_ms / media_ms:5.1f}x) | pico {pico_kb:9.0f} KB")
+        if len({repr(r) for r in resultados.values()}) != 1:
+            ok = False
+            print(f"   ERRO: resultados diferentes: {resultados}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    raise SystemExit(0 if main(args) else 1)
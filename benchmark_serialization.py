@@ -0,0 +1,98 @@
+"""
+Micro-benchmark da serialização de /api/player/my-bets
+
+Compara o caminho antigo (BetResponse + json.loads + encoder padrão do FastAPI)
+com a camada orjson (bet_payload + FastJSONResponse) para 50 e 500 apostas.
+
+Uso:
+    python benchmark_serialization.py [--repeat 200]
+"""
+import argparse
+import json
+import random
+import timeit
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from database import StatusSorteio
+from routers.player import BetResponse, bet_payload
+from services.serialization import FastJSONResponse
+
+
+def gerar_apostas(quantidade: int):
+    """Apostas sintéticas no formato do ORM (números gravados como JSON)"""
+    sorteio = SimpleNamespace(id=1, status=StatusSorteio.ABERTO)
+    agora = datetime.utcnow()
+    apostas = []
+    for i in range(quantidade):
+        apostas.append(SimpleNamespace(
+            id=i + 1,
+            numeros_brancos=json.dumps(sorted(random.sample(range(1, 70), 20))),
+            numeros_vermelhos=json.dumps(sorted(random.sample(range(1, 27), 5))),
+            valor_pago=25.0,
+            data_aposta=agora - timedelta(minutes=i),
+            sorteio_id=sorteio.id,
+            sorteio=sorteio,
+            is_winner=False,
+            acertos=0,
+            valor_premio=0.0
+        ))
+    return apostas
+
+
+def caminho_antigo(apostas):
+    jogos = [
+        BetResponse(
+            id=a.id,
+            numeros_brancos=json.loads(a.numeros_brancos),
+            numeros_vermelhos=json.loads(a.numeros_vermelhos),
+            valor_pago=a.valor_pago,
+            data_aposta=a.data_aposta.isoformat(),
+            sorteio_id=a.sorteio_id,
+            sorteio_status=a.sorteio.status.value,
+            is_winner=a.is_winner,
+            acertos=a.acertos,
+            valor_premio=a.valor_premio,
+            status_display="AGUARDANDO"
+        )
+        for a in apostas
+    ]
+    content = {"telegram_id": 1, "nome": "Bench", "total_apostas": len(jogos), "jogos_ativos": jogos, "historico": []}
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def caminho_novo(apostas):
+    jogos = [bet_payload(a, a.sorteio.status.value, "AGUARDANDO") for a in apostas]
+    content = {"telegram_id": 1, "nome": "Bench", "total_apostas": len(jogos), "jogos_ativos": jogos, "historico": []}
+    return FastJSONResponse(content).body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Benchmark de serialização - /api/player/my-bets")
+    print("=" * 60)
+
+    for quantidade in (50, 500):
+        apostas = gerar_apostas(quantidade)
+
+        # Os dois caminhos precisam produzir o mesmo documento
+        assert json.loads(caminho_antigo(apostas)) == json.loads(caminho_novo(apostas))
+
+        antigo = min(timeit.repeat(lambda: caminho_antigo(apostas), number=args.repeat, repeat=3)) / args.repeat
+        novo = min(timeit.repeat(lambda: caminho_novo(apostas), number=args.repeat, repeat=3)) / args.repeat
+
+        print(f"\n{quantidade} apostas:")
+        print(f"   Antigo (Pydantic + json):  {antigo * 1000:8.3f} ms/req")
+        print(f"   Novo (orjson + fragments): {novo * 1000:8.3f} ms/req")
+        print(f"   Ganho: {antigo / novo:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
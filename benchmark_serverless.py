@@ -0,0 +1,115 @@
+"""
+Benchmark do perfil serverless: custo por invocação
+
+Simula invocações da Vercel contra o app ASGI, no banco de DATABASE_URL.
+Cada invocação roda num event loop novo (asyncio.run), o pior caso de uma
+instância quente: nada preso ao loop anterior pode ser reaproveitado.
+
+Para cada perfil, num interpretador novo:
+- frio: import do app.py + primeira invocação
+- quente: invocações seguintes na mesma instância (mediana e p95)
+- conexões abertas por invocação e invocações com erro
+
+Perfis comparados:
+- serverless: SERVERLESS=true (NullPool, sem lifespan)
+- servidor: SERVERLESS=false (pool no processo, como no uvicorn)
+
+Com o pool no processo as conexões do asyncpg ficam presas ao loop da
+invocação anterior; os erros aparecem na coluna "falhas".
+
+O schema precisa estar aplicado (python migrations.py).
+
+Uso:
+    DATABASE_URL=postgresql+asyncpg://... python benchmark_serverless.py [--invocations 50] [--path /api/player/config/bet-price]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent
+
+PROFILES = [("serverless", "true"), ("servidor", "false")]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def child(invocations: int, path: str):
+    """Roda dentro do interpretador novo e imprime o resultado em JSON"""
+    started = time.perf_counter()
+    import httpx
+    from app import app
+    from services.db_pool import pool_metrics
+    import_ms = (time.perf_counter() - started) * 1000
+
+    async def invoke() -> int:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://powerpix") as client:
+            response = await client.get(path)
+            return response.status_code
+
+    tempos, conexoes, falhas, status = [], [], 0, {}
+    for _ in range(invocations):
+        abertas = pool_metrics.conexoes_abertas
+        t0 = time.perf_counter()
+        try:
+            code = asyncio.run(invoke())
+            status[code] = status.get(code, 0) + 1
+            if code >= 500:
+                falhas += 1
+        except Exception as e:
+            falhas += 1
+            status[type(e).__name__] = status.get(type(e).__name__, 0) + 1
+        tempos.append((time.perf_counter() - t0) * 1000)
+        conexoes.append(pool_metrics.conexoes_abertas - abertas)
+
+    print(json.dumps({
+        "import_ms": import_ms,
+        "tempos_ms": tempos,
+        "conexoes": conexoes,
+        "falhas": falhas,
+        "status": {str(k): v for k, v in status.items()}
+    }))
+
+
+def run_profile(serverless: str, invocations: int, path: str) -> dict:
+    env = {**os.environ, "SERVERLESS": serverless, "PYTHONDONTWRITEBYTECODE": "1"}
+    proc = subprocess.run(
+        [sys.executable, __file__, "--child", "--invocations", str(invocations), "--path", path],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        sys.exit(f"Falha no perfil SERVERLESS={serverless}:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main(invocations: int, path: str):
+    print(f"GET {path}, {invocations} invocações por perfil (event loop novo a cada uma)\n")
+    print(f"{'perfil':<12} {'import':>9} {'1ª invoc.':>10} {'quente p50':>11} {'quente p95':>11} "
+          f"{'conexões/invoc.':>16} {'falhas':>7}")
+    for nome, serverless in PROFILES:
+        r = run_profile(serverless, invocations, path)
+        primeira, quentes = r["tempos_ms"][0], r["tempos_ms"][1:] or r["tempos_ms"]
+        conexoes = statistics.mean(r["conexoes"][1:] or r["conexoes"])
+        print(f"{nome:<12} {r['import_ms']:7.0f}ms {primeira:8.1f}ms {statistics.median(quentes):9.2f}ms "
+              f"{percentile(quentes, 0.95):9.2f}ms {conexoes:16.2f} {r['falhas']:7d}   status {r['status']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--invocations", type=int, default=50, help="Invocações medidas por perfil")
+    parser.add_argument("--path", default="/api/player/config/bet-price", help="Rota GET invocada (uma leitura no banco)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.invocations, args.path)
+    else:
+        main(args.invocations, args.path)
@@ -0,0 +1,95 @@
+"""
+Benchmark do cold start: tempo de import do app.py (python -X importtime)
+
+Cada rodada importa o app num interpretador novo e soma o tempo acumulado
+dos imports de primeiro nível. Reporta a mediana, o tempo total do processo
+e os módulos mais caros, e confere que as dependências pesadas usadas só
+sob demanda (aiogram, python-jose, bcrypt, Jinja) não são importadas no
+boot.
+
+Sai com código 1 se a mediana passar de --budget-ms ou se algum módulo
+proibido for importado: pode rodar como checagem de CI.
+
+Uso:
+    python benchmark_startup.py [--runs 5] [--budget-ms 1500] [--top 15]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent
+
+# Importados só no primeiro uso (webhook do Telegram, login/páginas do admin)
+DEFERRED_MODULES = ["aiogram", "jose", "bcrypt", "jinja2"]
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def run_once():
+    """(tempo dos imports em ms, tempo total do processo em ms, {módulo: acumulado em µs})"""
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    if proc.returncode != 0:
+        sys.exit(f"Falha ao importar app.py:\n{proc.stderr[-2000:]}")
+
+    cumulative = {}
+    top_level_us = 0
+    for line in proc.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        cumulative_us, indent, module = int(match.group(2)), len(match.group(3)), match.group(4)
+        cumulative[module] = cumulative_us
+        if indent == 1:
+            top_level_us += cumulative_us
+    return top_level_us / 1000, wall_ms, cumulative
+
+
+def main(runs: int, budget_ms: float, top: int) -> int:
+    imports_ms, walls_ms, cumulative = [], [], {}
+    for _ in range(runs):
+        import_ms, wall_ms, cumulative = run_once()
+        imports_ms.append(import_ms)
+        walls_ms.append(wall_ms)
+
+    mediana = statistics.median(imports_ms)
+    print(f"Import do app.py: mediana {mediana:.0f} ms (min {min(imports_ms):.0f}, max {max(imports_ms):.0f}) em {runs} rodadas")
+    print(f"Processo completo (python -c 'import app'): mediana {statistics.median(walls_ms):.0f} ms\n")
+
+    print(f"Módulos mais caros (acumulado, última rodada):")
+    for module, us in sorted(cumulative.items(), key=lambda item: -item[1])[:top]:
+        print(f"   {us / 1000:8.1f} ms  {module}")
+
+    falhas = []
+    importados = [m for m in DEFERRED_MODULES if m in cumulative]
+    if importados:
+        falhas.append(f"módulos que deveriam ser sob demanda foram importados no boot: {', '.join(importados)}")
+    if mediana > budget_ms:
+        falhas.append(f"import levou {mediana:.0f} ms, acima do orçamento de {budget_ms:.0f} ms")
+
+    print()
+    if falhas:
+        for falha in falhas:
+            print(f"FALHA: {falha}")
+        return 1
+    print(f"OK: dentro do orçamento de {budget_ms:.0f} ms e sem {', '.join(DEFERRED_MODULES)} no boot")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Interpretadores novos medidos")
+    parser.add_argument("--budget-ms", type=float, default=1500, help="Orçamento para a mediana do import do app.py")
+    parser.add_argument("--top", type=int, default=15, help="Quantos módulos listar")
+    args = parser.parse_args()
+    sys.exit(main(args.runs, args.budget_ms, args.top))
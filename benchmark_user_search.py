@@ -0,0 +1,117 @@
+"""
+Benchmark da busca de usuários do admin (services/user_search.py)
+
+Cria as tabelas num schema temporário, popula usuarios com uma massa
+sintética (nomes brasileiros comuns, CPF e telefone), cria os mesmos índices
+das migrações (GiST de trigramas e índice da listagem), roda ANALYZE e mede a
+latência de cada página de search_users:
+- listagem sem busca: primeira página e uma página profunda (pelo cursor)
+- termos comuns ("silva"), raros, prefixo de telefone e trecho de CPF,
+  primeira e segunda página
+
+Tudo acontece numa única transação desfeita no final: o banco não é alterado.
+Meta do painel: < 50 ms por página com 1M de usuários.
+
+Requer PostgreSQL com pg_trgm (DATABASE_URL).
+
+Uso:
+    python benchmark_user_search.py [--usuarios 1000000] [--repeat 20]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import Base, engine
+from services.user_search import search_users
+
+SCHEMA = "user_search_bench"
+
+SEED = """
+    INSERT INTO usuarios (telegram_id, nome, saldo, cadastro_completo, is_archived, data_cadastro,
+                          cpf, cpf_digitos, telefone, telefone_digitos)
+    SELECT 1000000 + g,
+           (ARRAY['Maria','José','Ana','João','Antônio','Francisca','Carlos','Paulo','Lucas','Juliana'])[1 + g % 10]
+           || ' ' || (ARRAY['Silva','Santos','Oliveira','Souza','Rodrigues','Ferreira','Alves','Pereira',
+                            'Lima','Gomes','Costa','Ribeiro','Martins','Carvalho','Almeida'])[1 + (g / 10) % 15]
+           || ' ' || md5(g::text),
+           (g % 500)::float, g % 3 <> 0, g % 50 = 0, now() - g * INTERVAL '1 minute',
+           lpad((g * 7919 % 100000000000)::text, 11, '0'), lpad((g * 7919 % 100000000000)::text, 11, '0'),
+           '119' || lpad((g * 104729 % 100000000)::text, 8, '0'), '119' || lpad((g * 104729 % 100000000)::text, 8, '0')
+    FROM generate_series(1, :usuarios) g
+"""
+
+INDEXES = [
+    "CREATE INDEX ix_usuarios_nome_trgm_gist ON usuarios USING gist (nome gist_trgm_ops)",
+    "CREATE INDEX ix_usuarios_cpf_digitos_trgm_gist ON usuarios USING gist (cpf_digitos gist_trgm_ops)",
+    "CREATE INDEX ix_usuarios_telefone_digitos_trgm_gist ON usuarios USING gist (telefone_digitos gist_trgm_ops)",
+]
+
+CASES = [
+    ("listagem", None),
+    ("termo comum: silva", "silva"),
+    ("nome completo: maria silva", "maria silva"),
+    ("termo raro: hash parcial", "3c59dc0"),
+    ("prefixo de telefone: 119", "119"),
+    ("trecho de CPF: 7919", "7919"),
+]
+
+
+async def measure(session: AsyncSession, search, repeat: int):
+    """Latências (ms) da primeira e da segunda página"""
+    primeira, segunda = [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        _, cursor = await search_users(session, search=search)
+        primeira.append((time.perf_counter() - started) * 1000)
+        if cursor:
+            started = time.perf_counter()
+            await search_users(session, search=search, cursor=cursor)
+            segunda.append((time.perf_counter() - started) * 1000)
+    return primeira, segunda
+
+
+def describe(values) -> str:
+    if not values:
+        return "      -"
+    ordered = sorted(values)
+    return f"{statistics.median(ordered):7.1f} / {ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]:7.1f}"
+
+
+async def main(args):
+    async with engine.connect() as conn:
+        trans = await conn.begin()
+        try:
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+            # public no caminho: funções e operadores do pg_trgm
+            await conn.execute(text(f"SET LOCAL search_path TO {SCHEMA}, public"))
+            await conn.run_sync(Base.metadata.create_all)
+
+            print(f"Populando {args.usuarios} usuários...")
+            started = time.perf_counter()
+            await conn.execute(text(SEED), {"usuarios": args.usuarios})
+            for statement in INDEXES:
+                await conn.execute(text(statement))
+            await conn.execute(text("ANALYZE usuarios"))
+            print(f"Massa e índices prontos em {time.perf_counter() - started:.0f} s\n")
+
+            session = AsyncSession(bind=conn)
+            print(f"{'caso':<30} {'1ª página p50/p95 (ms)':>24} {'2ª página p50/p95 (ms)':>24}")
+            for descricao, search in CASES:
+                await search_users(session, search=search)  # Aquece cache e planos
+                primeira, segunda = await measure(session, search, args.repeat)
+                print(f"{descricao:<30} {describe(primeira):>24} {describe(segunda):>24}")
+        finally:
+            await trans.rollback()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--usuarios", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
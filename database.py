@@ -1,23 +1,33 @@
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase, relationship
-from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Float, ForeignKey, Enum as SQLEnum, Text, Boolean
+from sqlalchemy.pool import NullPool
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, Float, ForeignKey, Enum as SQLEnum, Text, Boolean, Index, UniqueConstraint, event, text
 from datetime import datetime
 import enum
 import json
+import re
 from typing import Optional
-import bcrypt
 from config import get_settings
+from services.db_pool import engine_options, pool_metrics, replica_pool_metrics
 
 settings = get_settings()
 
 def hash_password(password: str) -> str:
     """Hash password using bcrypt"""
+    import bcrypt  # Sob demanda: só login/seed do admin usam (cold start)
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
 def verify_password(password: str, hashed: str) -> bool:
     """Verify password against hash"""
+    import bcrypt
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
+def normalize_digits(value: Optional[str]) -> Optional[str]:
+    """Remove a formatação de CPF/telefone, mantendo apenas os dígitos"""
+    if not value:
+        return None
+    return re.sub(r"\D", "", value) or None
+
 
 class Base(DeclarativeBase):
     pass
@@ -67,6 +77,10 @@ class Usuario(Base):
     pix = Column(String(255), nullable=True)  # Chave PIX para receber prêmios
     telefone = Column(String(20), nullable=True)  # Número de telefone
     
+    # Versões normalizadas (apenas dígitos) para login - mantidas pelos eventos abaixo
+    cpf_digitos = Column(String(14), nullable=True)
+    telefone_digitos = Column(String(20), nullable=True)
+    
     # Dados opcionais
     cidade = Column(String(100), nullable=True)
     estado = Column(String(2), nullable=True)  # UF (2 caracteres)
@@ -81,8 +95,26 @@ class Usuario(Base):
     # Foto de perfil do usuário
     photo_url = Column(String(255), nullable=True)  # Caminho relativo para a foto (ex: /static/avatars/123456.jpg)
     
+    # ID do cliente no Asaas (preenchido no primeiro depósito ou pelo backfill)
+    asaas_customer_id = Column(String(64), nullable=True)
+    
     apostas = relationship("Aposta", back_populates="usuario")
     transacoes = relationship("Transacao", back_populates="usuario", cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        # Login por CPF + telefone vira uma única busca no índice
+        Index("ux_usuarios_cpf_telefone_digitos", "cpf_digitos", "telefone_digitos", unique=True),
+        # Listagem do admin: mais recentes primeiro, paginada por (data_cadastro, id)
+        Index("ix_usuarios_data_cadastro_id", "data_cadastro", "id"),
+    )
+
+
+@event.listens_for(Usuario, "before_insert")
+@event.listens_for(Usuario, "before_update")
+def _normalize_usuario_identity(mapper, connection, target: Usuario):
+    """Mantém cpf_digitos/telefone_digitos em todo caminho de escrita do ORM"""
+    target.cpf_digitos = normalize_digits(target.cpf)
+    target.telefone_digitos = normalize_digits(target.telefone)
 
 
 class Sorteio(Base):
@@ -116,6 +148,14 @@ class Concurso(Base):
     numeros_sorteados = Column(Text, nullable=True)  # JSON string com 6 números
     data_sorteio_realizado = Column(DateTime, nullable=True)
     
+    __table_args__ = (
+        # Concurso ativo (dashboard, bot, Mini App): índice parcial só com os ativos
+        Index(
+            "ix_concursos_ativos_data_criacao", "data_criacao",
+            postgresql_where=text("is_active AND status = 'ATIVO'")
+        ),
+    )
+    
     apostas = relationship("Aposta", back_populates="concurso", cascade="all, delete-orphan")
     promocoes = relationship("Promocao", back_populates="concurso", cascade="all, delete-orphan")
 
@@ -144,10 +184,20 @@ class Transacao(Base):
     status = Column(SQLEnum(StatusTransacao), default=StatusTransacao.PENDENTE, nullable=False)
     gateway_id = Column(String(255), nullable=True)  # ID da transação no gateway de pagamento
     descricao = Column(Text, nullable=True)  # Descrição adicional
+    
+    # QR Code Pix guardado com a cobrança (reaproveitado em depósitos repetidos)
+    pix_payload = Column(Text, nullable=True)  # Copia e cola
+    pix_qrcode = Column(Text, nullable=True)  # Imagem base64
+    pix_expira_em = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
     usuario = relationship("Usuario", back_populates="transacoes")
+    
+    __table_args__ = (
+        Index("ix_transacoes_gateway_id", "gateway_id"),  # Webhook/reconciliação
+        Index("ix_transacoes_usuario_created_at", "usuario_id", "created_at"),  # Histórico do usuário
+    )
 
 
 class Aposta(Base):
@@ -171,6 +221,11 @@ class Aposta(Base):
     usuario = relationship("Usuario", back_populates="apostas")
     sorteio = relationship("Sorteio", back_populates="apostas")
     concurso = relationship("Concurso", back_populates="apostas")
+    
+    __table_args__ = (
+        Index("ix_apostas_usuario_data_aposta", "usuario_id", "data_aposta"),  # Meus jogos / histórico
+        Index("ix_apostas_concurso_winner", "concurso_id", "is_winner"),  # Apuração e ganhadores
+    )
 
 
 class Admin(Base):
@@ -181,6 +236,53 @@ class Admin(Base):
     password_hash = Column(String(255), nullable=False)
 
 
+class WebhookInbox(Base):
+    """Webhooks do Asaas gravados como recebidos, processados depois pelo worker"""
+    __tablename__ = "webhook_inbox"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    event = Column(String(50), nullable=False)
+    payment_id = Column(String(255), nullable=False)
+    payload = Column(Text, nullable=False)  # Corpo bruto recebido
+    status = Column(String(20), default="PENDENTE", nullable=False)  # PENDENTE, PROCESSADO, FALHA
+    resultado = Column(String(50), nullable=True)  # creditado, ja_processada, nao_encontrada...
+    tentativas = Column(Integer, default=0, nullable=False)
+    ultimo_erro = Column(Text, nullable=True)
+    received_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    processed_at = Column(DateTime, nullable=True)
+    proxima_tentativa_em = Column(DateTime, nullable=True)  # Pendente adiado (backoff) até este horário
+    
+    __table_args__ = (
+        # Reentregas do Asaas caem no mesmo registro
+        UniqueConstraint("event", "payment_id", name="uq_webhook_inbox_event_payment"),
+        # Fila: pendentes em ordem de chegada, e ordem por pagamento
+        Index("ix_webhook_inbox_status_id", "status", "id"),
+        Index("ix_webhook_inbox_payment_id", "payment_id", "id"),
+    )
+
+
+class OfficialDraw(Base):
+    """Resultado oficial de um sorteio da Powerball (histórico sincronizado)"""
+    __tablename__ = "official_draws"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    draw_date = Column(Date, nullable=False)  # Data do sorteio (horário de Nova York)
+    numeros_brancos = Column(Text, nullable=False)  # JSON com os 5 números brancos
+    powerball = Column(Integer, nullable=False)
+    multiplier = Column(Integer, nullable=True)  # Power Play
+    fonte = Column(String(50), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        # Um resultado por data: busca do sorteio de um concurso e sync incremental
+        UniqueConstraint("draw_date", name="uq_official_draws_draw_date"),
+    )
+    
+    def numeros_sorteados(self) -> str:
+        """Mesmo formato de Concurso.numeros_sorteados"""
+        return json.dumps({"white": json.loads(self.numeros_brancos), "powerball": [self.powerball]})
+
+
 class SystemConfig(Base):
     __tablename__ = "system_config"
     
@@ -195,8 +297,29 @@ class SystemConfig(Base):
 engine = create_async_engine(
     settings.DATABASE_URL,
     echo=False,
-    future=True
+    future=True,
+    **engine_options(settings.DATABASE_URL)
 )
+pool_metrics.attach(engine)
+
+# Réplica de leitura opcional (escolha entre réplica e primário em services/read_replica.py)
+replica_engine = create_async_engine(
+    settings.DATABASE_REPLICA_URL,
+    echo=False,
+    future=True,
+    **engine_options(settings.DATABASE_REPLICA_URL, replica_pool_metrics)
+) if settings.DATABASE_REPLICA_URL else None
+if replica_engine is not None:
+    replica_pool_metrics.attach(replica_engine)
+
+# Conexões de sessão (advisory locks, migrações) direto no PostgreSQL quando o
+# engine principal passa por PgBouncer em modo transaction
+direct_engine = create_async_engine(
+    settings.DATABASE_DIRECT_URL,
+    echo=False,
+    future=True,
+    poolclass=NullPool
+) if settings.DATABASE_DIRECT_URL else engine
 
 AsyncSessionLocal = async_sessionmaker(
     engine,
@@ -204,6 +327,12 @@ AsyncSessionLocal = async_sessionmaker(
     expire_on_commit=False
 )
 
+ReplicaSessionLocal = async_sessionmaker(
+    replica_engine,
+    class_=AsyncSession,
+    expire_on_commit=False
+) if replica_engine is not None else None
+
 
 async def get_db() -> AsyncSession:
     async with AsyncSessionLocal() as session:
@@ -214,102 +343,12 @@ async def get_db() -> AsyncSession:
 
 
 async def init_db():
-    """Criar tabelas e admin padrão se não existir"""
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    
-    # Migração: Adicionar colunas se não existirem (PostgreSQL)
-    async with engine.begin() as conn:
-        try:
-            from sqlalchemy import text
-            
-            # Verificar se a coluna revenue existe na tabela sorteios
-            result = await conn.execute(
-                text("""
-                    SELECT column_name 
-                    FROM information_schema.columns 
-                    WHERE table_name = 'sorteios' AND column_name = 'revenue'
-                """)
-            )
-            if not result.fetchone():
-                await conn.execute(text("ALTER TABLE sorteios ADD COLUMN revenue DOUBLE PRECISION DEFAULT 0.0"))
-                print("✓ Coluna 'revenue' adicionada à tabela sorteios")
-            
-            # Verificar colunas na tabela apostas
-            for col_name, col_type, default in [
-                ('concurso_id', 'INTEGER', None),
-                ('is_winner', 'BOOLEAN', 'FALSE'),
-                ('cota_ganhadora', 'INTEGER', None),
-                ('valor_premio', 'DOUBLE PRECISION', '0.0'),
-                ('acertos', 'INTEGER', '0')
-            ]:
-                result = await conn.execute(
-                    text(f"""
-                        SELECT column_name 
-                        FROM information_schema.columns 
-                        WHERE table_name = 'apostas' AND column_name = '{col_name}'
-                    """)
-                )
-                if not result.fetchone():
-                    default_clause = f" DEFAULT {default}" if default else ""
-                    await conn.execute(text(f"ALTER TABLE apostas ADD COLUMN {col_name} {col_type}{default_clause}"))
-                    print(f"✓ Coluna '{col_name}' adicionada à tabela apostas")
-            
-            # Verificar colunas na tabela usuarios
-            for col_name, col_type, default in [
-                ('pix', 'VARCHAR(255)', None),
-                ('telefone', 'VARCHAR(20)', None),
-                ('cidade', 'VARCHAR(100)', None),
-                ('estado', 'VARCHAR(2)', None),
-                ('cadastro_completo', 'BOOLEAN', 'FALSE'),
-                ('cpf', 'VARCHAR(14)', None),
-                ('is_archived', 'BOOLEAN', 'FALSE'),
-                ('data_arquivamento', 'TIMESTAMP', None),
-                ('photo_url', 'VARCHAR(255)', None)
-            ]:
-                result = await conn.execute(
-                    text(f"""
-                        SELECT column_name 
-                        FROM information_schema.columns 
-                        WHERE table_name = 'usuarios' AND column_name = '{col_name}'
-                    """)
-                )
-                if not result.fetchone():
-                    default_clause = f" DEFAULT {default}" if default else ""
-                    await conn.execute(text(f"ALTER TABLE usuarios ADD COLUMN {col_name} {col_type}{default_clause}"))
-                    print(f"✓ Coluna '{col_name}' adicionada à tabela usuarios")
-        except Exception as e:
-            print(f"⚠ Aviso ao verificar/adicionar colunas: {e}")
-    
-    # Criar admin padrão se não existir
-    async with AsyncSessionLocal() as session:
-        from sqlalchemy import select
-        
-        result = await session.execute(select(Admin).where(Admin.username == settings.ADMIN_USERNAME))
-        admin = result.scalar_one_or_none()
-        
-        if not admin:
-            password_hash = hash_password(settings.ADMIN_PASSWORD)
-            new_admin = Admin(
-                username=settings.ADMIN_USERNAME,
-                password_hash=password_hash
-            )
-            session.add(new_admin)
-            await session.commit()
-            print(f"Admin padrão criado: {settings.ADMIN_USERNAME}")
-        
-        # Criar configuração padrão do sistema se não existir
-        result = await session.execute(select(SystemConfig).limit(1))
-        config = result.scalar_one_or_none()
-        
-        if not config:
-            default_config = SystemConfig(
-                default_pack_price=25.00,
-                current_discount_percent=0,
-                override_price=0.0,
-                is_promo_active=False
-            )
-            session.add(default_config)
-            await session.commit()
-            print("Configuração padrão do sistema criada")
-
+    """
+    Checagem de schema do boot: uma consulta de versão quando está em dia.
+
+    As migrações ficam em migrations.py (também rodáveis pela CLI:
+    python migrations.py). Com MIGRATE_ON_STARTUP=false, o boot falha se
+    houver migração pendente em vez de aplicá-la.
+    """
+    from migrations import ensure_schema
+    return await ensure_schema(auto_migrate=settings.MIGRATE_ON_STARTUP)
@@ -0,0 +1,204 @@
+"""
+Servidor Asaas falso para desenvolvimento, testes de carga e benchmarks
+
+Implementa, em memória, os endpoints usados por services/asaas.py:
+- GET/POST /customers
+- POST /payments, GET /payments/{id}
+- GET /payments/{id}/pixQrCode
+
+Injeção de latência e falhas (variáveis de ambiente ou POST /_fake/config):
+- FAKE_ASAAS_LATENCY_MS / FAKE_ASAAS_JITTER_MS: atraso de cada resposta
+- FAKE_ASAAS_FAILURE_RATE: fração (0..1) de respostas 503
+
+Webhooks (como o Asaas real, para FAKE_ASAAS_WEBHOOK_URL):
+- POST /_fake/payments/{id}/pay marca a cobrança como recebida e dispara
+  PAYMENT_RECEIVED e PAYMENT_CONFIRMED
+- FAKE_ASAAS_WEBHOOK_DUPLICATES reenvia cada webhook N vezes (reentrega)
+- FAKE_ASAAS_AUTO_PAY_MS paga automaticamente cada cobrança após o atraso
+
+Uso:
+    FAKE_ASAAS_LATENCY_MS=80 FAKE_ASAAS_WEBHOOK_URL=http://localhost:8000/finance/webhook/asaas \\
+        uvicorn fake_asaas:app --port 8090
+    ASAAS_API_URL=http://localhost:8090 uvicorn app:app
+"""
+import asyncio
+import itertools
+import logging
+import os
+import random
+import time
+from datetime import datetime
+from typing import Any, Dict, Set
+
+import httpx
+from fastapi import FastAPI, HTTPException, Request
+
+app = FastAPI(title="Fake Asaas")
+logger = logging.getLogger("fake_asaas")
+
+config: Dict[str, Any] = {
+    "latency_ms": float(os.getenv("FAKE_ASAAS_LATENCY_MS", "0")),
+    "jitter_ms": float(os.getenv("FAKE_ASAAS_JITTER_MS", "0")),
+    "failure_rate": float(os.getenv("FAKE_ASAAS_FAILURE_RATE", "0")),
+    "webhook_url": os.getenv("FAKE_ASAAS_WEBHOOK_URL", ""),
+    "webhook_token": os.getenv("FAKE_ASAAS_WEBHOOK_TOKEN", ""),
+    "webhook_duplicates": int(os.getenv("FAKE_ASAAS_WEBHOOK_DUPLICATES", "1")),
+    "auto_pay_ms": float(os.getenv("FAKE_ASAAS_AUTO_PAY_MS", "0")),
+}
+
+_ids = itertools.count(1)
+customers: Dict[str, Dict[str, Any]] = {}
+payments: Dict[str, Dict[str, Any]] = {}
+stats: Dict[str, Any] = {
+    "requisicoes": 0,
+    "falhas_injetadas": 0,
+    "webhooks_enviados": 0,
+    "webhooks_erro": 0,
+    "webhook_latencias_ms": []
+}
+_tasks: Set[asyncio.Task] = set()  # Referências para os pagamentos automáticos não serem coletados
+_client: httpx.AsyncClient = None
+
+
+def _webhook_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(timeout=10.0)
+    return _client
+
+
+async def _simulate():
+    """Latência e falha injetadas antes de cada resposta da API"""
+    stats["requisicoes"] += 1
+    delay = config["latency_ms"] + random.uniform(0, config["jitter_ms"])
+    if delay:
+        await asyncio.sleep(delay / 1000)
+    if config["failure_rate"] and random.random() < config["failure_rate"]:
+        stats["falhas_injetadas"] += 1
+        raise HTTPException(status_code=503, detail="Falha injetada")
+
+
+async def _send_webhook(event: str, payment: Dict[str, Any]):
+    if not config["webhook_url"]:
+        return
+    headers = {"asaas-access-token": config["webhook_token"]} if config["webhook_token"] else {}
+    body = {"event": event, "payment": payment}
+    for _ in range(max(1, config["webhook_duplicates"])):
+        started = time.perf_counter()
+        try:
+            response = await _webhook_client().post(config["webhook_url"], json=body, headers=headers)
+            response.raise_for_status()
+            stats["webhooks_enviados"] += 1
+            stats["webhook_latencias_ms"].append((time.perf_counter() - started) * 1000)
+        except Exception as e:
+            stats["webhooks_erro"] += 1
+            logger.warning(f"Erro ao enviar webhook {event} {payment['id']}: {e}")
+
+
+async def _pay(payment_id: str):
+    payment = payments[payment_id]
+    if payment["status"] != "PENDING":
+        return
+    payment["status"] = "RECEIVED"
+    payment["paymentDate"] = datetime.now().strftime("%Y-%m-%d")
+    await _send_webhook("PAYMENT_RECEIVED", payment)
+    payment["status"] = "CONFIRMED"
+    await _send_webhook("PAYMENT_CONFIRMED", payment)
+
+
+async def _auto_pay(payment_id: str, delay_ms: float):
+    await asyncio.sleep(delay_ms / 1000)
+    await _pay(payment_id)
+
+
+# ==================== API (subconjunto do Asaas v3) ====================
+
+@app.get("/customers")
+async def list_customers(externalReference: str = None):
+    await _simulate()
+    data = [c for c in customers.values() if externalReference is None or c.get("externalReference") == externalReference]
+    return {"object": "list", "totalCount": len(data), "data": data}
+
+
+@app.post("/customers")
+async def create_customer(request: Request):
+    await _simulate()
+    body = await request.json()
+    customer_id = f"cus_{next(_ids):012d}"
+    customers[customer_id] = {"object": "customer", "id": customer_id, **body}
+    return customers[customer_id]
+
+
+@app.post("/payments")
+async def create_payment(request: Request):
+    await _simulate()
+    body = await request.json()
+    if body.get("customer") not in customers:
+        raise HTTPException(status_code=400, detail="Cliente inexistente")
+    payment_id = f"pay_{next(_ids):012d}"
+    payments[payment_id] = {
+        "object": "payment",
+        "id": payment_id,
+        "status": "PENDING",
+        "dateCreated": datetime.now().strftime("%Y-%m-%d"),
+        **body
+    }
+    if config["auto_pay_ms"]:
+        task = asyncio.create_task(_auto_pay(payment_id, config["auto_pay_ms"]))
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+    return payments[payment_id]
+
+
+@app.get("/payments/{payment_id}")
+async def get_payment(payment_id: str):
+    await _simulate()
+    if payment_id not in payments:
+        raise HTTPException(status_code=404, detail="Cobrança não encontrada")
+    return payments[payment_id]
+
+
+@app.get("/payments/{payment_id}/pixQrCode")
+async def get_pix_qrcode(payment_id: str):
+    await _simulate()
+    if payment_id not in payments:
+        raise HTTPException(status_code=404, detail="Cobrança não encontrada")
+    return {
+        "encodedImage": "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg==",
+        "payload": f"00020101021226800014br.gov.bcb.pix2558fake.asaas/{payment_id}5204000053039865802BR6304ABCD",
+        "expirationDate": f"{payments[payment_id]['dueDate']} 23:59:59"
+    }
+
+
+# ==================== Controle do fake (não existe no Asaas) ====================
+
+@app.post("/_fake/payments/{payment_id}/pay")
+async def pay_payment(payment_id: str):
+    """Simula o pagamento do Pix e dispara os webhooks"""
+    if payment_id not in payments:
+        raise HTTPException(status_code=404, detail="Cobrança não encontrada")
+    await _pay(payment_id)
+    return payments[payment_id]
+
+
+@app.post("/_fake/config")
+async def update_config(request: Request):
+    """Altera latência, falhas e webhooks em tempo de execução"""
+    body = await request.json()
+    for key, value in body.items():
+        if key not in config:
+            raise HTTPException(status_code=400, detail=f"Opção desconhecida: {key}")
+        config[key] = type(config[key])(value)
+    return config
+
+
+@app.get("/_fake/stats")
+async def get_stats():
+    latencias = sorted(stats["webhook_latencias_ms"])
+    return {
+        **{k: v for k, v in stats.items() if k != "webhook_latencias_ms"},
+        "clientes": len(customers),
+        "cobrancas": len(payments),
+        "webhook_p50_ms": latencias[len(latencias) // 2] if latencias else None,
+        "webhook_p99_ms": latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))] if latencias else None,
+    }
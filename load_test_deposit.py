@@ -0,0 +1,192 @@
+"""
+Teste de carga ponta a ponta: depósito Pix + confirmação por webhook
+
+Cenário (carga aberta, em RPS fixo):
+1. POST /finance/deposit para usuários sintéticos (criados direto no banco)
+2. Paga cada cobrança no fake_asaas.py (POST /_fake/payments/{id}/pay), que
+   dispara os webhooks PAYMENT_RECEIVED/PAYMENT_CONFIRMED para a aplicação
+3. Aguarda o inbox creditar e confere, usuário a usuário, se o saldo subiu
+   exatamente a soma das cobranças pagas (nenhum crédito perdido ou duplicado)
+
+Reporta p50/p99 da criação do depósito e da entrega dos webhooks.
+
+Pré-requisitos (mesmo DATABASE_URL da aplicação):
+    uvicorn fake_asaas:app --port 8090
+    ASAAS_API_URL=http://localhost:8090 RATE_LIMIT_ENABLED=false uvicorn app:app --port 8000
+
+Uso:
+    python load_test_deposit.py --rps 20 --duration 30 --users 200 [--duplicates 2] [--cleanup]
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import Dict, List, Optional
+
+import httpx
+from sqlalchemy import delete, select
+
+from database import AsyncSessionLocal, StatusTransacao, Transacao, Usuario
+
+TELEGRAM_ID_BASE = 8_000_000_000  # Faixa reservada para usuários do teste de carga
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+async def setup_users(total: int) -> Dict[int, float]:
+    """Cria (ou reaproveita) os usuários sintéticos; retorna saldo inicial por telegram_id"""
+    telegram_ids = [TELEGRAM_ID_BASE + i for i in range(total)]
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(Usuario).where(Usuario.telegram_id.in_(telegram_ids)))
+        existentes = {u.telegram_id: u for u in result.scalars().all()}
+        for i, telegram_id in enumerate(telegram_ids):
+            if telegram_id not in existentes:
+                session.add(Usuario(
+                    telegram_id=telegram_id,
+                    nome=f"Carga {i}",
+                    cpf=f"{900000000 + i:011d}",
+                    telefone=f"119{80000000 + i:08d}",
+                    cadastro_completo=True
+                ))
+        await session.commit()
+
+        result = await session.execute(
+            select(Usuario.telegram_id, Usuario.saldo).where(Usuario.telegram_id.in_(telegram_ids))
+        )
+        return {telegram_id: saldo for telegram_id, saldo in result.all()}
+
+
+async def read_state(telegram_ids: List[int], payment_ids: List[str]):
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Usuario.telegram_id, Usuario.saldo).where(Usuario.telegram_id.in_(telegram_ids))
+        )
+        saldos = {telegram_id: saldo for telegram_id, saldo in result.all()}
+        result = await session.execute(
+            select(Transacao.gateway_id).where(
+                Transacao.gateway_id.in_(payment_ids),
+                Transacao.status == StatusTransacao.PAGO
+            )
+        )
+        pagos = set(result.scalars().all())
+    return saldos, pagos
+
+
+async def cleanup_users(telegram_ids: List[int]):
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(Usuario.id).where(Usuario.telegram_id.in_(telegram_ids)))
+        ids = list(result.scalars().all())
+        await session.execute(delete(Transacao).where(Transacao.usuario_id.in_(ids)))
+        await session.execute(delete(Usuario).where(Usuario.id.in_(ids)))
+        await session.commit()
+
+
+async def run(args):
+    saldo_inicial = await setup_users(args.users)
+    telegram_ids = list(saldo_inicial)
+
+    deposit_ms: List[float] = []
+    pay_ms: List[float] = []
+    status_codes: Dict[int, int] = {}
+    pagamentos: Dict[str, Dict] = {}  # payment_id -> {telegram_id, valor}
+
+    async with httpx.AsyncClient(timeout=30.0, limits=httpx.Limits(max_connections=200)) as client:
+        await client.post(f"{args.fake_url}/_fake/config", json={
+            "webhook_url": f"{args.app_url}/finance/webhook/asaas",
+            "webhook_duplicates": args.duplicates
+        })
+
+        async def scenario(i: int):
+            telegram_id = telegram_ids[i % len(telegram_ids)]
+            valor = round(random.uniform(10, 100), 2)
+
+            started = time.perf_counter()
+            try:
+                response = await client.post(f"{args.app_url}/finance/deposit", json={
+                    "telegram_id": telegram_id, "valor": valor
+                })
+            except httpx.HTTPError:
+                status_codes[0] = status_codes.get(0, 0) + 1
+                return
+            deposit_ms.append((time.perf_counter() - started) * 1000)
+            status_codes[response.status_code] = status_codes.get(response.status_code, 0) + 1
+            if response.status_code != 200:
+                return
+
+            payment_id = response.json()["payment_id"]
+            pagamentos[payment_id] = {"telegram_id": telegram_id, "valor": response.json()["valor"]}
+
+            started = time.perf_counter()
+            await client.post(f"{args.fake_url}/_fake/payments/{payment_id}/pay")
+            pay_ms.append((time.perf_counter() - started) * 1000)
+
+        total = int(args.rps * args.duration)
+        print(f"Disparando {total} depósitos a {args.rps} RPS para {len(telegram_ids)} usuários...")
+        inicio = time.perf_counter()
+        tasks = []
+        for i in range(total):
+            # Carga aberta: o ritmo não depende das respostas anteriores
+            atraso = inicio + i / args.rps - time.perf_counter()
+            if atraso > 0:
+                await asyncio.sleep(atraso)
+            tasks.append(asyncio.create_task(scenario(i)))
+        await asyncio.gather(*tasks)
+        duracao_envio = time.perf_counter() - inicio
+
+        fake_stats = (await client.get(f"{args.fake_url}/_fake/stats")).json()
+
+    # Aguarda o inbox processar todos os webhooks
+    payment_ids = list(pagamentos)
+    espera_inicio = time.perf_counter()
+    while True:
+        saldos, pagos = await read_state(telegram_ids, payment_ids)
+        if len(pagos) == len(payment_ids) or time.perf_counter() - espera_inicio > args.settle_timeout:
+            break
+        await asyncio.sleep(0.5)
+    espera = time.perf_counter() - espera_inicio
+
+    esperado: Dict[int, float] = {telegram_id: 0.0 for telegram_id in telegram_ids}
+    for pagamento in pagamentos.values():
+        esperado[pagamento["telegram_id"]] += pagamento["valor"]
+    divergentes = [
+        telegram_id for telegram_id in telegram_ids
+        if abs((saldos[telegram_id] - saldo_inicial[telegram_id]) - esperado[telegram_id]) > 0.005
+    ]
+
+    print("=" * 60)
+    print(f"Depósitos: {sum(status_codes.values())} em {duracao_envio:.1f}s - status HTTP: {status_codes}")
+    print(f"   criação    p50 {percentile(deposit_ms, 0.5) or 0:.1f} ms | p99 {percentile(deposit_ms, 0.99) or 0:.1f} ms")
+    print(f"   pagamento  p50 {percentile(pay_ms, 0.5) or 0:.1f} ms | p99 {percentile(pay_ms, 0.99) or 0:.1f} ms (webhooks x{args.duplicates})")
+    print(f"   webhook    p50 {fake_stats['webhook_p50_ms'] or 0:.1f} ms | p99 {fake_stats['webhook_p99_ms'] or 0:.1f} ms - erros: {fake_stats['webhooks_erro']}")
+    print(f"Créditos: {len(pagos)}/{len(payment_ids)} cobranças pagas creditadas ({espera:.1f}s após o último pagamento)")
+    if divergentes:
+        print(f"ERRO: saldo divergente para {len(divergentes)} usuário(s): {divergentes[:10]}")
+    else:
+        print("OK: saldo de todos os usuários confere com as cobranças pagas")
+    print("=" * 60)
+
+    if args.cleanup:
+        await cleanup_users(telegram_ids)
+        print("Usuários do teste removidos")
+
+    return not divergentes and len(pagos) == len(payment_ids)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app-url", default="http://localhost:8000")
+    parser.add_argument("--fake-url", default="http://localhost:8090")
+    parser.add_argument("--rps", type=float, default=20)
+    parser.add_argument("--duration", type=float, default=30, help="Segundos de disparo")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--duplicates", type=int, default=1, help="Reentregas de cada webhook")
+    parser.add_argument("--settle-timeout", type=float, default=60, help="Espera máxima pelos créditos")
+    parser.add_argument("--cleanup", action="store_true", help="Remove os usuários sintéticos no final")
+    args = parser.parse_args()
+
+    raise SystemExit(0 if asyncio.run(run(args)) else 1)
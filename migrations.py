@@ -0,0 +1,522 @@
+"""
+Migrações versionadas do banco
+
+Cada migração tem um número de versão; as aplicadas ficam registradas na
+tabela schema_version. No boot, init_db() faz uma única consulta de versão e
+só migra se houver pendências (com MIGRATE_ON_STARTUP=false, recusa subir com
+o schema desatualizado). Um advisory lock do PostgreSQL garante que apenas um
+processo migre por vez; os demais esperam e encontram o schema já atualizado.
+
+Para adicionar uma migração: escreva a função e acrescente-a ao fim de
+MIGRATIONS com o próximo número. O DDL vai escrito na própria migração,
+nunca derivado dos modelos de database.py. Nunca altere uma migração já
+publicada.
+
+Uso:
+    python migrations.py            # aplica as pendentes
+    python migrations.py --status   # versão atual e pendentes
+"""
+import argparse
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Tuple
+
+from sqlalchemy import (
+    BigInteger, Boolean, Column, Date, DateTime, Enum, Float, ForeignKey, Integer, MetaData, String,
+    Table, Text, UniqueConstraint, inspect, select, text
+)
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from config import get_settings
+from database import direct_engine, engine, hash_password, normalize_digits
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+MIGRATION_LOCK_KEY = 7310046  # pg_advisory_lock: uma migração por vez
+
+
+class Migration(NamedTuple):
+    version: int
+    descricao: str
+    apply: Callable[[AsyncConnection], Awaitable[None]]
+
+
+class MigrationError(RuntimeError):
+    """Migração que não pode ser aplicada sem intervenção (ex: dados inconsistentes)"""
+
+
+def _is_postgres(conn: AsyncConnection) -> bool:
+    return conn.dialect.name == "postgresql"
+
+
+async def _optional(conn: AsyncConnection, descricao: str, statements: List[str]):
+    """Executa num savepoint; falha vira aviso (ex: extensão sem permissão)"""
+    try:
+        async with conn.begin_nested():
+            for statement in statements:
+                await conn.execute(text(statement))
+    except Exception as e:
+        logger.warning(f"⚠ {descricao}: {e}")
+
+
+async def _add_columns(conn: AsyncConnection, table: str, columns: List[Tuple[str, str]]):
+    """ADD COLUMN das colunas que a tabela ainda não tem (bancos criados antes delas)"""
+    existentes = await conn.run_sync(lambda sync_conn: {c["name"] for c in inspect(sync_conn).get_columns(table)})
+    for column, column_type in columns:
+        if column not in existentes:
+            await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"))
+
+
+async def _create_tables(conn: AsyncConnection, metadata: MetaData):
+    await conn.run_sync(lambda sync_conn: metadata.create_all(sync_conn, checkfirst=True))
+
+
+# ==================== Migrações ====================
+# O DDL de cada migração é congelado aqui (Table próprias), nunca lido dos
+# modelos de database.py: mudar um modelo não pode mudar uma migração publicada.
+
+def _baseline_metadata() -> MetaData:
+    """Tabelas como estavam antes do versionamento"""
+    metadata = MetaData()
+    Table(
+        "usuarios", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("telegram_id", BigInteger, unique=True, nullable=False, index=True),
+        Column("nome", String(255), nullable=False),
+        Column("saldo", Float, default=0.0, nullable=False),
+        Column("data_cadastro", DateTime),
+        Column("cpf", String(14)),
+        Column("pix", String(255)),
+        Column("telefone", String(20)),
+        Column("cidade", String(100)),
+        Column("estado", String(2)),
+        Column("cadastro_completo", Boolean, nullable=False),
+        Column("is_archived", Boolean, nullable=False),
+        Column("data_arquivamento", DateTime),
+        Column("photo_url", String(255)),
+    )
+    Table(
+        "sorteios", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("data", DateTime),
+        Column("status", Enum("ABERTO", "FECHADO", name="statussorteio"), nullable=False),
+        Column("premio_base", Float),
+        Column("revenue", Float),
+        Column("meta_arrecadacao", Float),
+        Column("taxa_inicial", Float),
+        Column("taxa_pos_meta", Float),
+        Column("numeros_sorteados", Text),
+    )
+    Table(
+        "concursos", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("titulo", String(255), nullable=False),
+        Column("data_criacao", DateTime),
+        Column("data_sorteio_prevista", DateTime),
+        Column("premio_total", Float, nullable=False),
+        Column("preco_cota", Float, nullable=False),
+        Column("status", Enum("ATIVO", "INATIVO", "SORTEADO", name="statusconcurso"), nullable=False),
+        Column("is_active", Boolean, nullable=False),
+        Column("is_drawn", Boolean, nullable=False),
+        Column("numeros_sorteados", Text),
+        Column("data_sorteio_realizado", DateTime),
+    )
+    Table(
+        "promocoes", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("concurso_id", Integer, ForeignKey("concursos.id"), nullable=False),
+        Column("tipo", Enum("FIXO", "PERCENTUAL", name="tipopromocao"), nullable=False),
+        Column("valor", Float, nullable=False),
+        Column("data_inicio", DateTime, nullable=False),
+        Column("data_fim", DateTime, nullable=False),
+        Column("is_active", Boolean, nullable=False),
+    )
+    Table(
+        "transacoes", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("usuario_id", Integer, ForeignKey("usuarios.id"), nullable=False),
+        Column("tipo", Enum("DEPOSITO", "APOSTA", "PREMIO", "SAQUE", name="tipotransacao"), nullable=False),
+        Column("valor", Float, nullable=False),
+        Column("status", Enum("PENDENTE", "PAGO", "FALHA", "CANCELADO", name="statustransacao"), nullable=False),
+        Column("gateway_id", String(255)),
+        Column("descricao", Text),
+        Column("created_at", DateTime, nullable=False),
+        Column("updated_at", DateTime, nullable=False),
+    )
+    Table(
+        "apostas", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("usuario_id", Integer, ForeignKey("usuarios.id"), nullable=False),
+        Column("sorteio_id", Integer, ForeignKey("sorteios.id")),
+        Column("concurso_id", Integer, ForeignKey("concursos.id")),
+        Column("numeros_brancos", Text, nullable=False),
+        Column("numeros_vermelhos", Text, nullable=False),
+        Column("valor_pago", Float, nullable=False),
+        Column("data_aposta", DateTime),
+        Column("is_winner", Boolean, nullable=False),
+        Column("cota_ganhadora", Integer),
+        Column("valor_premio", Float, nullable=False),
+        Column("acertos", Integer, nullable=False),
+    )
+    Table(
+        "admins", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("username", String(100), unique=True, nullable=False),
+        Column("password_hash", String(255), nullable=False),
+    )
+    Table(
+        "system_config", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("default_pack_price", Float, nullable=False),
+        Column("current_discount_percent", Integer, nullable=False),
+        Column("override_price", Float, nullable=False),
+        Column("is_promo_active", Boolean, nullable=False),
+    )
+    return metadata
+
+
+async def m001_baseline(conn: AsyncConnection):
+    """Tabelas e colunas existentes antes do versionamento (o antigo init_db)"""
+    await _create_tables(conn, _baseline_metadata())
+
+    # Bancos criados antes destas colunas existirem (create_all não altera tabelas)
+    await _add_columns(conn, "sorteios", [("revenue", "DOUBLE PRECISION DEFAULT 0.0")])
+    await _add_columns(conn, "apostas", [
+        ("concurso_id", "INTEGER"),
+        ("is_winner", "BOOLEAN DEFAULT FALSE"),
+        ("cota_ganhadora", "INTEGER"),
+        ("valor_premio", "DOUBLE PRECISION DEFAULT 0.0"),
+        ("acertos", "INTEGER DEFAULT 0"),
+    ])
+    await _add_columns(conn, "usuarios", [
+        ("pix", "VARCHAR(255)"),
+        ("telefone", "VARCHAR(20)"),
+        ("cidade", "VARCHAR(100)"),
+        ("estado", "VARCHAR(2)"),
+        ("cadastro_completo", "BOOLEAN DEFAULT FALSE"),
+        ("cpf", "VARCHAR(14)"),
+        ("is_archived", "BOOLEAN DEFAULT FALSE"),
+        ("data_arquivamento", "TIMESTAMP"),
+        ("photo_url", "VARCHAR(255)"),
+    ])
+
+
+async def m002_seed_defaults(conn: AsyncConnection):
+    """Admin padrão e configuração do sistema"""
+    tables = _baseline_metadata().tables
+    admins, system_config = tables["admins"], tables["system_config"]
+    result = await conn.execute(select(admins.c.id).where(admins.c.username == settings.ADMIN_USERNAME))
+    if result.first() is None:
+        await conn.execute(admins.insert().values(
+            username=settings.ADMIN_USERNAME,
+            password_hash=hash_password(settings.ADMIN_PASSWORD)
+        ))
+        logger.info(f"Admin padrão criado: {settings.ADMIN_USERNAME}")
+
+    result = await conn.execute(select(system_config.c.id).limit(1))
+    if result.first() is None:
+        await conn.execute(system_config.insert().values(
+            default_pack_price=25.00,
+            current_discount_percent=0,
+            override_price=0.0,
+            is_promo_active=False
+        ))
+        logger.info("Configuração padrão do sistema criada")
+
+
+async def m003_login_digits(conn: AsyncConnection):
+    """CPF/telefone normalizados (apenas dígitos) para o login, preenchidos nos cadastros existentes"""
+    await _add_columns(conn, "usuarios", [
+        ("cpf_digitos", "VARCHAR(14)"),
+        ("telefone_digitos", "VARCHAR(20)"),
+    ])
+    if _is_postgres(conn):
+        await conn.execute(text("""
+            UPDATE usuarios
+            SET cpf_digitos = NULLIF(regexp_replace(cpf, '\\D', '', 'g'), ''),
+                telefone_digitos = NULLIF(regexp_replace(telefone, '\\D', '', 'g'), '')
+            WHERE (cpf IS NOT NULL AND cpf_digitos IS NULL)
+               OR (telefone IS NOT NULL AND telefone_digitos IS NULL)
+        """))
+        return
+
+    # SQLite (testes locais): sem regexp_replace, normaliza no Python
+    result = await conn.execute(text(
+        "SELECT id, cpf, telefone FROM usuarios WHERE cpf IS NOT NULL OR telefone IS NOT NULL"
+    ))
+    for row in result.all():
+        await conn.execute(
+            text("UPDATE usuarios SET cpf_digitos = :cpf, telefone_digitos = :telefone WHERE id = :id"),
+            {"id": row.id, "cpf": normalize_digits(row.cpf), "telefone": normalize_digits(row.telefone)}
+        )
+
+
+async def m004_login_index(conn: AsyncConnection):
+    """Índice único de login; com CPF/telefone duplicados a migração falha e lista os cadastros"""
+    result = await conn.execute(text("""
+        SELECT u.id, u.cpf_digitos, u.telefone_digitos
+        FROM usuarios u
+        JOIN (
+            SELECT cpf_digitos, telefone_digitos
+            FROM usuarios
+            WHERE cpf_digitos IS NOT NULL AND telefone_digitos IS NOT NULL
+            GROUP BY cpf_digitos, telefone_digitos
+            HAVING count(*) > 1
+        ) d ON d.cpf_digitos = u.cpf_digitos AND d.telefone_digitos = u.telefone_digitos
+        ORDER BY u.cpf_digitos, u.telefone_digitos, u.id
+    """))
+    duplicados: Dict[Tuple[str, str], List[int]] = {}
+    for row in result.all():
+        duplicados.setdefault((row.cpf_digitos, row.telefone_digitos), []).append(row.id)
+    if duplicados:
+        linhas = "\n".join(
+            f"   CPF ***{cpf[-4:]} / telefone ***{telefone[-4:]}: usuários {ids}"
+            for (cpf, telefone), ids in duplicados.items()
+        )
+        raise MigrationError(
+            f"{len(duplicados)} par(es) CPF/telefone duplicados impedem o índice único de login.\n"
+            f"{linhas}\n"
+            "Unifique ou corrija esses cadastros e rode 'python migrations.py' de novo."
+        )
+
+    await conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_usuarios_cpf_telefone_digitos "
+        "ON usuarios (cpf_digitos, telefone_digitos)"
+    ))
+
+
+async def m005_user_search_trigrams(conn: AsyncConnection):
+    """Busca de usuários no admin: índices GIN de trigramas (requer pg_trgm)"""
+    if not _is_postgres(conn):
+        return
+    await _optional(conn, "Índices de trigramas não criados (busca de usuários ficará lenta)", [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS ix_usuarios_nome_trgm ON usuarios USING gin (nome gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_usuarios_cpf_digitos_trgm ON usuarios USING gin (cpf_digitos gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_usuarios_telefone_digitos_trgm ON usuarios USING gin (telefone_digitos gin_trgm_ops)",
+    ])
+
+
+async def m006_hot_query_indexes(conn: AsyncConnection):
+    """Índices das consultas quentes"""
+    for statement in [
+        "CREATE INDEX IF NOT EXISTS ix_transacoes_gateway_id ON transacoes (gateway_id)",
+        "CREATE INDEX IF NOT EXISTS ix_transacoes_usuario_created_at ON transacoes (usuario_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_apostas_usuario_data_aposta ON apostas (usuario_id, data_aposta)",
+        "CREATE INDEX IF NOT EXISTS ix_apostas_concurso_winner ON apostas (concurso_id, is_winner)",
+    ]:
+        await conn.execute(text(statement))
+    if _is_postgres(conn):
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_concursos_ativos_data_criacao ON concursos (data_criacao) "
+            "WHERE is_active AND status = 'ATIVO'"
+        ))
+    else:
+        await conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_concursos_ativos_data_criacao ON concursos (data_criacao)"
+        ))
+
+
+async def m007_pix_qrcode(conn: AsyncConnection):
+    """QR Code Pix guardado com a cobrança (reaproveitamento de depósitos)"""
+    await _add_columns(conn, "transacoes", [
+        ("pix_payload", "TEXT"),
+        ("pix_qrcode", "TEXT"),
+        ("pix_expira_em", "TIMESTAMP"),
+    ])
+
+
+async def m008_asaas_customer_id(conn: AsyncConnection):
+    """Id do cliente Asaas gravado no usuário"""
+    await _add_columns(conn, "usuarios", [("asaas_customer_id", "VARCHAR(64)")])
+
+
+async def m009_webhook_inbox(conn: AsyncConnection):
+    """Inbox de webhooks do Asaas"""
+    metadata = MetaData()
+    Table(
+        "webhook_inbox", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("event", String(50), nullable=False),
+        Column("payment_id", String(255), nullable=False),
+        Column("payload", Text, nullable=False),
+        Column("status", String(20), nullable=False),
+        Column("resultado", String(50)),
+        Column("tentativas", Integer, nullable=False),
+        Column("ultimo_erro", Text),
+        Column("received_at", DateTime, nullable=False),
+        Column("processed_at", DateTime),
+        UniqueConstraint("event", "payment_id", name="uq_webhook_inbox_event_payment"),
+    )
+    await _create_tables(conn, metadata)
+    for statement in [
+        "CREATE INDEX IF NOT EXISTS ix_webhook_inbox_status_id ON webhook_inbox (status, id)",
+        "CREATE INDEX IF NOT EXISTS ix_webhook_inbox_payment_id ON webhook_inbox (payment_id, id)",
+    ]:
+        await conn.execute(text(statement))
+
+
+async def m010_official_draws(conn: AsyncConnection):
+    """Histórico de resultados oficiais da Powerball"""
+    metadata = MetaData()
+    Table(
+        "official_draws", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("draw_date", Date, nullable=False),
+        Column("numeros_brancos", Text, nullable=False),
+        Column("powerball", Integer, nullable=False),
+        Column("multiplier", Integer),
+        Column("fonte", String(50), nullable=False),
+        Column("created_at", DateTime, nullable=False),
+        UniqueConstraint("draw_date", name="uq_official_draws_draw_date"),
+    )
+    await _create_tables(conn, metadata)
+
+
+async def m011_user_search_gist(conn: AsyncConnection):
+    """
+    Busca de usuários com candidatos limitados: índices GiST de trigramas (KNN pelo
+    operador <<->, que o GIN não ordena) no lugar dos GIN, e índice da listagem
+    """
+    await conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_usuarios_data_cadastro_id ON usuarios (data_cadastro, id)"
+    ))
+    if not _is_postgres(conn):
+        return
+    await _optional(conn, "Índices GiST de trigramas não criados (busca de usuários ficará lenta)", [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS ix_usuarios_nome_trgm_gist ON usuarios USING gist (nome gist_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_usuarios_cpf_digitos_trgm_gist ON usuarios USING gist (cpf_digitos gist_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_usuarios_telefone_digitos_trgm_gist ON usuarios USING gist (telefone_digitos gist_trgm_ops)",
+        "DROP INDEX IF EXISTS ix_usuarios_nome_trgm",
+        "DROP INDEX IF EXISTS ix_usuarios_cpf_digitos_trgm",
+        "DROP INDEX IF EXISTS ix_usuarios_telefone_digitos_trgm",
+    ])
+
+
+async def m012_webhook_inbox_backoff(conn: AsyncConnection):
+    """Horário da próxima tentativa de um webhook pendente (backoff)"""
+    await _add_columns(conn, "webhook_inbox", [("proxima_tentativa_em", "TIMESTAMP")])
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Tabelas e colunas existentes antes do versionamento", m001_baseline),
+    Migration(2, "Admin padrão e configuração do sistema", m002_seed_defaults),
+    Migration(3, "CPF/telefone normalizados para o login", m003_login_digits),
+    Migration(4, "Índice único de login por CPF/telefone", m004_login_index),
+    Migration(5, "Índices de trigramas da busca de usuários", m005_user_search_trigrams),
+    Migration(6, "Índices das consultas quentes", m006_hot_query_indexes),
+    Migration(7, "QR Code Pix nas transações", m007_pix_qrcode),
+    Migration(8, "Cliente Asaas no usuário", m008_asaas_customer_id),
+    Migration(9, "Inbox de webhooks do Asaas", m009_webhook_inbox),
+    Migration(10, "Histórico de resultados oficiais", m010_official_draws),
+    Migration(11, "Índices GiST da busca de usuários e índice da listagem", m011_user_search_gist),
+    Migration(12, "Backoff de webhooks do Asaas pendentes", m012_webhook_inbox_backoff),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+# ==================== Runner ====================
+
+class SchemaOutdatedError(RuntimeError):
+    """Schema atrás do código e migração automática desligada"""
+
+
+async def current_version(conn: AsyncConnection) -> int:
+    """Versão aplicada (0 se schema_version ainda não existe)"""
+    try:
+        async with conn.begin_nested() if conn.in_transaction() else conn.begin():
+            result = await conn.execute(text("SELECT max(version) FROM schema_version"))
+            return result.scalar() or 0
+    except Exception:
+        return 0
+
+
+async def migrate() -> List[int]:
+    """Aplica as migrações pendentes, cada uma na sua transação; retorna as versões aplicadas"""
+    aplicadas = []
+    # Conexão direta: o lock de sessão não sobrevive ao PgBouncer em modo transaction
+    async with direct_engine.connect() as conn:
+        postgres = _is_postgres(conn)
+        if postgres:
+            # Bloqueante: quem chega depois espera e encontra tudo aplicado
+            await conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            await conn.commit()
+        try:
+            async with conn.begin():
+                await conn.execute(text(
+                    "CREATE TABLE IF NOT EXISTS schema_version ("
+                    "version INTEGER PRIMARY KEY, "
+                    "descricao VARCHAR(255) NOT NULL, "
+                    "aplicada_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+                ))
+            versao = await current_version(conn)
+
+            for migration in MIGRATIONS:
+                if migration.version <= versao:
+                    continue
+                started = time.perf_counter()
+                async with conn.begin():
+                    await migration.apply(conn)
+                    await conn.execute(
+                        text("INSERT INTO schema_version (version, descricao) VALUES (:version, :descricao)"),
+                        {"version": migration.version, "descricao": migration.descricao}
+                    )
+                aplicadas.append(migration.version)
+                logger.info(f"✓ Migração {migration.version:03d} aplicada em {(time.perf_counter() - started) * 1000:.0f} ms: {migration.descricao}")
+        finally:
+            if postgres:
+                await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+                await conn.commit()
+    return aplicadas
+
+
+async def ensure_schema(auto_migrate: bool) -> int:
+    """
+    Checagem de boot: uma consulta de versão quando o schema está em dia.
+
+    Returns:
+        Número de migrações aplicadas agora.
+    """
+    async with engine.connect() as conn:
+        versao = await current_version(conn)
+    if versao >= LATEST_VERSION:
+        return 0
+    if not auto_migrate:
+        raise SchemaOutdatedError(
+            f"Schema na versão {versao}, código espera {LATEST_VERSION}: rode 'python migrations.py'"
+        )
+    return len(await migrate())
+
+
+async def _status():
+    async with engine.connect() as conn:
+        versao = await current_version(conn)
+    print(f"Versão do schema: {versao} (código: {LATEST_VERSION})")
+    for migration in MIGRATIONS:
+        marca = "aplicada" if migration.version <= versao else "PENDENTE"
+        print(f"   {migration.version:03d} [{marca}] {migration.descricao}")
+
+
+async def _main(args):
+    try:
+        if args.status:
+            await _status()
+        else:
+            aplicadas = await migrate()
+            print(f"{len(aplicadas)} migração(ões) aplicada(s); schema na versão {LATEST_VERSION}")
+    except MigrationError as e:
+        raise SystemExit(f"✗ {e}")
+    finally:
+        await engine.dispose()
+        await direct_engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--status", action="store_true", help="Mostra a versão atual e as migrações pendentes")
+    asyncio.run(_main(parser.parse_args()))
@@ -1,5 +1,6 @@
 # Routers package
-from . import bot, webapp, admin, api, finance, player
+# routers.bot (aiogram) não entra aqui: é importado sob demanda pelo webhook (routers/telegram.py)
+from . import telegram, webapp, admin, api, finance, player, cron
 
-__all__ = ['bot', 'webapp', 'admin', 'api', 'finance', 'player']
+__all__ = ['telegram', 'webapp', 'admin', 'api', 'finance', 'player', 'cron']
 
@@ -1,35 +1,44 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, Form, Query
 from fastapi.responses import HTMLResponse, RedirectResponse, Response
+import asyncio
 import csv
 from io import StringIO
-from sqlalchemy import select, func
+from urllib.parse import urlencode
+from sqlalchemy import select, func, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 import json
-from jose import JWTError, jwt
-import bcrypt
 from database import (
     AsyncSessionLocal, Usuario, Sorteio, Aposta, Admin, StatusSorteio, SystemConfig, 
-    Concurso, Promocao, StatusConcurso, TipoPromocao, get_db, Transacao, TipoTransacao, StatusTransacao
+    Concurso, Promocao, StatusConcurso, TipoPromocao, get_db, Transacao, TipoTransacao, StatusTransacao,
+    OfficialDraw, normalize_digits, verify_password
 )
 from schemas import DrawNumbersSchema
 from pydantic import ValidationError
 from config import get_settings
 from typing import Optional
 from template_config import templates  # Importar templates compartilhado
+from services.balance_cache import balance_cache
+from services.read_replica import read_replica, read_session
+from services.settlement import SettlementError, settle_contest
+from services.user_search import search_users
 
 settings = get_settings()
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
-# Configurações JWT
+# Configurações JWT (python-jose é importado dentro das funções: só o admin paga o import)
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_HOURS = 24
 
 
 def create_access_token(data: dict):
     """Criar JWT token"""
+    from jose import jwt
+    
     to_encode = data.copy()
     expire = datetime.utcnow().timestamp() + (ACCESS_TOKEN_EXPIRE_HOURS * 3600)
     to_encode.update({"exp": expire})
@@ -39,6 +48,8 @@ def create_access_token(data: dict):
 
 def verify_token(token: str) -> Optional[dict]:
     """Verificar e decodificar JWT token"""
+    from jose import JWTError, jwt
+    
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
         return payload
@@ -46,8 +57,8 @@ def verify_token(token: str) -> Optional[dict]:
         return None
 
 
-async def get_current_admin(request: Request, db: AsyncSession = Depends(get_db)):
-    """Dependency para verificar autenticação admin"""
+def _admin_username(request: Request) -> str:
+    """Usuário do token do cookie (401 se ausente ou inválido)"""
     token = request.cookies.get("admin_token")
     if not token:
         raise HTTPException(status_code=401, detail="Not authenticated")
@@ -59,15 +70,46 @@ async def get_current_admin(request: Request, db: AsyncSession = Depends(get_db)
     username = payload.get("sub")
     if not username:
         raise HTTPException(status_code=401, detail="Invalid token")
-    
+    return username
+
+
+async def _load_admin(db: AsyncSession, username: str) -> Admin:
     result = await db.execute(select(Admin).where(Admin.username == username))
     admin = result.scalar_one_or_none()
     if not admin:
         raise HTTPException(status_code=401, detail="Admin not found")
+    return admin
+
+
+async def get_current_admin(request: Request, db: AsyncSession = Depends(get_db)):
+    """Dependency para verificar autenticação admin"""
+    admin = await _load_admin(db, _admin_username(request))
+    
+    # Ações do admin (POST): as próximas páginas dele leem do primário (read-your-writes)
+    if request.method not in ("GET", "HEAD"):
+        await read_replica.mark_write(f"admin:{admin.username}")
     
     return admin
 
 
+async def get_admin_read_db(request: Request):
+    """
+    Dependency das páginas só de leitura: réplica, se configurada e em dia.
+    
+    O admin é autenticado na mesma sessão (admins mudam raramente), sem
+    abrir conexão no primário; use junto com get_read_admin.
+    """
+    username = _admin_username(request)
+    async with read_session(f"admin:{username}") as session:
+        request.state.admin = await _load_admin(session, username)
+        yield session
+
+
+async def get_read_admin(request: Request, db: AsyncSession = Depends(get_admin_read_db)) -> Admin:
+    """Admin autenticado por get_admin_read_db (mesma sessão da página)"""
+    return request.state.admin
+
+
 @router.get("/login", response_class=HTMLResponse)
 async def login_page(request: Request):
     """Página de login"""
@@ -85,7 +127,7 @@ async def login(
     result = await db.execute(select(Admin).where(Admin.username == username))
     admin = result.scalar_one_or_none()
     
-    if not admin or not bcrypt.checkpw(password.encode('utf-8'), admin.password_hash.encode('utf-8')):
+    if not admin or not verify_password(password, admin.password_hash):
         return templates.TemplateResponse(
             "login.html",
             {"request": request, "error": "Usuário ou senha inválidos"}
@@ -118,8 +160,8 @@ async def logout():
 @router.get("/dashboard", response_class=HTMLResponse)
 async def dashboard(
     request: Request,
-    admin: Admin = Depends(get_current_admin),
-    db: AsyncSession = Depends(get_db)
+    admin: Admin = Depends(get_read_admin),
+    db: AsyncSession = Depends(get_admin_read_db)
 ):
     """Dashboard principal"""
     # Buscar concurso ativo (prioridade) ou sorteio (compatibilidade)
@@ -312,8 +354,8 @@ async def encerrar_sorteio(
 
 @router.get("/apostas")
 async def listar_apostas(
-    admin: Admin = Depends(get_current_admin),
-    db: AsyncSession = Depends(get_db)
+    admin: Admin = Depends(get_read_admin),
+    db: AsyncSession = Depends(get_admin_read_db)
 ):
     """API endpoint para listar apostas (JSON)"""
     result = await db.execute(
@@ -461,8 +503,8 @@ async def update_price_config(
 @router.get("/concursos", response_class=HTMLResponse)
 async def listar_concursos(
     request: Request,
-    admin: Admin = Depends(get_current_admin),
-    db: AsyncSession = Depends(get_db)
+    admin: Admin = Depends(get_read_admin),
+    db: AsyncSession = Depends(get_admin_read_db)
 ):
     """Lista todos os concursos"""
     result = await db.execute(
@@ -595,8 +637,8 @@ async def editar_concurso(
 async def detalhes_concurso(
     concurso_id: int,
     request: Request,
-    admin: Admin = Depends(get_current_admin),
-    db: AsyncSession = Depends(get_db)
+    admin: Admin = Depends(get_read_admin),
+    db: AsyncSession = Depends(get_admin_read_db)
 ):
     """Página de detalhes e relatórios do concurso"""
     result = await db.execute(
@@ -715,22 +757,8 @@ async def realizar_sorteio(
     db: AsyncSession = Depends(get_db)
 ):
     """Realizar sorteio e calcular prêmios"""
-    result = await db.execute(
-        select(Concurso).where(Concurso.id == concurso_id)
-    )
-    concurso = result.scalar_one_or_none()
-    
-    if not concurso:
-        raise HTTPException(status_code=404, detail="Concurso não encontrado")
-    
-    if concurso.is_drawn:
-        raise HTTPException(status_code=400, detail="Este concurso já foi sorteado")
-    
-    if not concurso.is_active:
-        raise HTTPException(status_code=400, detail="Este concurso não está ativo")
-    
     try:
-        # Validar e salvar números sorteados com Pydantic
+        # Validar números sorteados com Pydantic
         try:
             numeros_raw = json.loads(numeros_sorteados)
         except json.JSONDecodeError:
@@ -738,78 +766,12 @@ async def realizar_sorteio(
 
         validated_data = DrawNumbersSchema(**numeros_raw)
         
-        white = validated_data.white
-        powerball = validated_data.powerball
-
-        concurso.numeros_sorteados = validated_data.model_dump_json()
-        concurso.is_drawn = True
-        concurso.is_active = False
-        concurso.status = StatusConcurso.SORTEADO
-        concurso.data_sorteio_realizado = datetime.utcnow()
-        
-        # Buscar todas as apostas do concurso
-        result = await db.execute(
-            select(Aposta)
-            .options(selectinload(Aposta.usuario))
-            .where(Aposta.concurso_id == concurso_id)
-            .order_by(Aposta.data_aposta.asc())  # Ordenar por data para distribuir centavos
-        )
-        apostas = result.scalars().all()
-        
-        # Identificar ganhadores
-        # Números oficiais sorteados: 5 brancos + 1 Powerball
-        # Apostas dos jogadores: 20 brancos + 5 Powerballs
-        # Ganhador: acertou os 5 brancos oficiais + o 1 Powerball oficial
-        ganhadores = []
-        numeros_brancos_oficiais = set(white)  # 5 números oficiais
-        powerball_oficial = powerball[0] if powerball else None  # 1 Powerball oficial
-        
-        for aposta in apostas:
-            try:
-                numeros_brancos_aposta = json.loads(aposta.numeros_brancos)  # 20 números do jogador
-                numeros_vermelhos_aposta = json.loads(aposta.numeros_vermelhos)  # 5 Powerballs do jogador
-            except:
-                continue
-            
-            # Calcular acertos: quantos dos 5 brancos oficiais o jogador acertou
-            acertos_brancos = len(set(numeros_brancos_aposta) & numeros_brancos_oficiais)
-            # Verificar se acertou o Powerball oficial
-            acertou_powerball = powerball_oficial in numeros_vermelhos_aposta
-            
-            # Total de acertos: brancos acertados + 1 se acertou Powerball
-            acertos_total = acertos_brancos + (1 if acertou_powerball else 0)
-            
-            aposta.acertos = acertos_total
-            
-            # Ganhador: acertou os 5 brancos oficiais + o Powerball oficial (6 acertos)
-            if acertos_brancos == 5 and acertou_powerball:
-                ganhadores.append(aposta)
-                aposta.is_winner = True
-        
-        # Calcular e distribuir prêmios
-        if ganhadores:
-            premio_por_ganhador = concurso.premio_total / len(ganhadores)
-            premio_base = int(premio_por_ganhador * 100) / 100  # Arredondar para 2 casas decimais
-            centavos_restantes = int((concurso.premio_total - (premio_base * len(ganhadores))) * 100)
-            
-            # Distribuir prêmios
-            for idx, ganhador in enumerate(ganhadores):
-                valor_premio = premio_base
-                if idx < centavos_restantes:
-                    valor_premio += 0.01
-                
-                ganhador.valor_premio = round(valor_premio, 2)
-                ganhador.cota_ganhadora = idx + 1
-                
-                # Atualizar saldo do usuário
-                if ganhador.usuario:
-                    ganhador.usuario.saldo += valor_premio
-        
-        await db.commit()
+        await settle_contest(db, concurso_id, validated_data)
         
         return RedirectResponse(url=f"/admin/concursos/{concurso_id}", status_code=303)
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=400, detail="Formato de números inválido (deve ser JSON)")
+    except SettlementError as e:
+        await db.rollback()
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=400, detail=f"Erro ao realizar sorteio: {str(e)}")
@@ -818,8 +780,8 @@ async def realizar_sorteio(
 @router.get("/concursos/{concurso_id}/exportar-csv")
 async def exportar_csv(
     concurso_id: int,
-    admin: Admin = Depends(get_current_admin),
-    db: AsyncSession = Depends(get_db)
+    admin: Admin = Depends(get_read_admin),
+    db: AsyncSession = Depends(get_admin_read_db)
 ):
     """Exportar apostas do concurso para CSV"""
     result = await db.execute(
@@ -900,8 +862,10 @@ async def get_official_powerball_result(
     """Busca o resultado oficial mais recente da Powerball"""
     from services.powerball_results import powerball_service
     
-    result = await powerball_service.get_latest_result()
-    next_draw = await powerball_service.get_next_drawing()
+    result, next_draw = await asyncio.gather(
+        powerball_service.get_latest_result(),
+        powerball_service.get_next_drawing()
+    )
     
     if not result:
         # Retornar dados simulados em caso de falha (para teste)
@@ -917,48 +881,268 @@ async def get_official_powerball_result(
     }
 
 
+# ==================== MONITORAMENTO ====================
+
+@router.get("/api/metrics/rate-limit")
+async def rate_limit_metrics(admin: Admin = Depends(get_current_admin)):
+    """Contadores do rate limiting e da concorrência por classe de rota (deste worker)"""
+    from services.rate_limit import rate_limiter
+    
+    return rate_limiter.stats()
+
+
+@router.get("/api/metrics/db-pool")
+async def db_pool_metrics(admin: Admin = Depends(get_current_admin)):
+    """Pool de conexões do banco (uso, overflow, espera, vazamentos) e roteamento para a réplica (deste worker)"""
+    from services.db_pool import pool_metrics, replica_pool_metrics
+    
+    return {
+        **pool_metrics.stats(),
+        "replica": {
+            **read_replica.stats(),
+            "pool": replica_pool_metrics.stats() if read_replica.enabled else None
+        }
+    }
+
+
+@router.get("/api/metrics/outbound")
+async def outbound_metrics(admin: Admin = Depends(get_current_admin)):
+    """Estado do circuit breaker, bulkhead e contadores por operação de cada dependência externa (deste worker)"""
+    from services.resilience import outbound_stats
+    
+    return outbound_stats()
+
+
+@router.get("/api/metrics/webhooks")
+async def webhook_inbox_metrics(admin: Admin = Depends(get_current_admin)):
+    """Fila do inbox de webhooks: pendentes, atraso, falhas recentes e contadores do worker"""
+    from services.webhook_inbox import webhook_inbox
+    
+    return await webhook_inbox.stats()
+
+
+@router.post("/api/webhooks/reprocess")
+async def reprocess_webhooks(
+    inbox_id: Optional[int] = Query(None),
+    admin: Admin = Depends(get_current_admin)
+):
+    """Reprocessa um webhook do inbox (inbox_id) ou todos os que estão em FALHA"""
+    from services.webhook_inbox import webhook_inbox
+    
+    total = await webhook_inbox.reprocess(inbox_id)
+    if inbox_id is not None and not total:
+        raise HTTPException(status_code=404, detail="Webhook não encontrado")
+    
+    return {"success": True, "reenfileirados": total}
+
+
+@router.get("/api/metrics/reconciliation")
+async def reconciliation_metrics(admin: Admin = Depends(get_current_admin)):
+    """Última passada e totais da reconciliação de depósitos (deste worker)"""
+    from services.reconciliation import deposit_reconciler
+    
+    return deposit_reconciler.stats()
+
+
+@router.get("/api/metrics/powerball-cache")
+async def powerball_cache_metrics(admin: Admin = Depends(get_current_admin)):
+    """Resultado oficial em cache, validade e revalidações (deste worker)"""
+    from services.powerball_results import powerball_service
+    
+    return powerball_service.cache_stats()
+
+
+@router.get("/api/metrics/balance-cache")
+async def balance_cache_metrics(admin: Admin = Depends(get_current_admin)):
+    """Acertos, faltas e invalidações do cache de saldo (deste worker)"""
+    return balance_cache.stats()
+
+
+@router.post("/api/reconciliation/run")
+async def run_reconciliation(admin: Admin = Depends(get_current_admin)):
+    """Executa uma passada de reconciliação agora"""
+    from services.reconciliation import deposit_reconciler
+    
+    stats = await deposit_reconciler.run_once()
+    if stats is None:
+        raise HTTPException(status_code=409, detail="Reconciliação já em andamento")
+    return {"success": True, **stats}
+
+
+@router.get("/api/metrics/official-draws")
+async def official_draws_metrics(
+    admin: Admin = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """Estado do sync de resultados oficiais e tamanho do histórico"""
+    from services.official_draws import official_draw_sync
+    
+    result = await db.execute(select(func.count(OfficialDraw.id), func.max(OfficialDraw.draw_date)))
+    total, ultimo = result.one()
+    return {
+        **official_draw_sync.stats(),
+        "sorteios": total,
+        "ultimo_sorteio": ultimo.isoformat() if ultimo else None
+    }
+
+
+@router.post("/api/official-draws/sync")
+async def run_official_draws_sync(
+    full: bool = False,
+    admin: Admin = Depends(get_current_admin)
+):
+    """Sincroniza os resultados oficiais agora (full=true recarrega o histórico)"""
+    from services.official_draws import official_draw_sync
+    
+    stats = await official_draw_sync.sync(full=full)
+    if stats is None:
+        raise HTTPException(status_code=409, detail="Sync de resultados oficiais já em andamento")
+    return {"success": True, **stats}
+
+
+@router.get("/api/metrics/auto-settlement")
+async def auto_settlement_metrics(admin: Admin = Depends(get_current_admin)):
+    """Concursos aguardando resultado ou aprovação e apurações recentes (do worker líder)"""
+    from services.auto_settlement import auto_settlement
+    
+    return auto_settlement.stats()
+
+
+@router.post("/api/concursos/{concurso_id}/auto-settlement/approve")
+async def approve_auto_settlement(
+    concurso_id: int,
+    admin: Admin = Depends(get_current_admin)
+):
+    """Aprova a apuração do concurso com o resultado oficial encontrado"""
+    from services.auto_settlement import auto_settlement
+    
+    try:
+        resumo = await auto_settlement.approve(concurso_id, admin.username)
+    except SettlementError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return {"success": True, **resumo}
+
+
+@router.get("/api/concursos/{concurso_id}/official-draw")
+async def get_contest_official_draw(
+    concurso_id: int,
+    admin: Admin = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """Resultado oficial correspondente à data prevista do concurso (do histórico local)"""
+    from services.official_draws import official_draw_for_contest
+    
+    concurso = await db.get(Concurso, concurso_id)
+    if not concurso:
+        raise HTTPException(status_code=404, detail="Concurso não encontrado")
+    
+    draw = await official_draw_for_contest(db, concurso)
+    if not draw:
+        return {"success": False, "message": "Resultado oficial ainda não disponível para a data prevista"}
+    return {
+        "success": True,
+        "draw_date": draw.draw_date.isoformat(),
+        "numeros_sorteados": json.loads(draw.numeros_sorteados()),
+        "multiplier": draw.multiplier
+    }
+
+
 # ==================== GESTÃO DE USUÁRIOS ====================
 
+def _parse_bool_filter(value: Optional[str]) -> Optional[bool]:
+    """Converte filtros 'sim'/'nao' do formulário (vazio = sem filtro)"""
+    if value == "sim":
+        return True
+    if value == "nao":
+        return False
+    return None
+
+
+def _parse_float_filter(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value.replace(",", ".")) if value else None
+    except ValueError:
+        return None
+
+
 @router.get("/users", response_class=HTMLResponse)
 async def users_page(
     request: Request,
-    admin: Admin = Depends(get_current_admin),
-    db: AsyncSession = Depends(get_db),
-    search: Optional[str] = Query(None)
+    admin: Admin = Depends(get_read_admin),
+    db: AsyncSession = Depends(get_admin_read_db),
+    search: Optional[str] = Query(None),
+    arquivado: Optional[str] = Query(None),
+    completo: Optional[str] = Query(None),
+    saldo_min: Optional[str] = Query(None),
+    saldo_max: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None)
 ):
-    """Página de listagem de usuários"""
+    """Página de listagem de usuários (busca por trigramas + paginação por cursor)"""
     try:
-        query = select(Usuario).order_by(Usuario.data_cadastro.desc())
-        
-        if search:
-            search_term = f"%{search}%"
-            query = query.where(
-                (Usuario.nome.ilike(search_term)) |
-                (Usuario.cpf.ilike(search_term)) |
-                (Usuario.telefone.ilike(search_term))
-            )
+        usuarios, next_cursor = await search_users(
+            db,
+            search=search,
+            arquivado=_parse_bool_filter(arquivado),
+            completo=_parse_bool_filter(completo),
+            saldo_min=_parse_float_filter(saldo_min),
+            saldo_max=_parse_float_filter(saldo_max),
+            cursor=cursor
+        )
         
-        result = await db.execute(query)
-        usuarios = result.scalars().all()
+        filtros = {
+            "search": search or "",
+            "arquivado": arquivado or "",
+            "completo": completo or "",
+            "saldo_min": saldo_min or "",
+            "saldo_max": saldo_max or ""
+        }
         
         return templates.TemplateResponse(
             "users.html",
             {
                 "request": request,
                 "usuarios": usuarios,
-                "search": search or ""
+                "search": search or "",
+                "filtros": filtros,
+                "next_query": urlencode({**filtros, "cursor": next_cursor}) if next_cursor else None,
+                "first_query": urlencode(filtros) if cursor else None
             }
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/api/users/search")
+async def users_typeahead(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=50),
+    admin: Admin = Depends(get_read_admin),
+    db: AsyncSession = Depends(get_admin_read_db)
+):
+    """Busca rápida de usuários para type-ahead (JSON)"""
+    usuarios, _ = await search_users(db, search=q, limit=limit)
+    return {
+        "usuarios": [
+            {
+                "id": u.id,
+                "telegram_id": u.telegram_id,
+                "nome": u.nome,
+                "cpf": u.cpf,
+                "telefone": u.telefone,
+                "saldo": u.saldo,
+                "is_archived": u.is_archived
+            }
+            for u in usuarios
+        ]
+    }
+
+
 @router.get("/users/{user_id}", response_class=HTMLResponse)
 async def user_detail(
     user_id: int,
     request: Request,
-    admin: Admin = Depends(get_current_admin),
-    db: AsyncSession = Depends(get_db)
+    admin: Admin = Depends(get_read_admin),
+    db: AsyncSession = Depends(get_admin_read_db)
 ):
     """Página de detalhes do usuário"""
     try:
@@ -1029,21 +1213,25 @@ async def edit_user(
         if nome is not None:
             usuario.nome = nome.strip() if nome else None
         if cpf is not None:
-            usuario.cpf = cpf.replace(".", "").replace("-", "").strip() if cpf else None
+            usuario.cpf = normalize_digits(cpf)
         if pix is not None:
             usuario.pix = pix.strip() if pix else None
         if telefone is not None:
-            usuario.telefone = telefone.replace("(", "").replace(")", "").replace(" ", "").replace("-", "").strip() if telefone else None
+            usuario.telefone = normalize_digits(telefone)
         if cidade is not None:
             usuario.cidade = cidade.strip() if cidade else None
         if estado is not None:
             usuario.estado = estado.strip() if estado else None
         
         await db.commit()
+        await balance_cache.invalidate(usuario.telegram_id)
         
         return RedirectResponse(url=f"/admin/users/{user_id}", status_code=303)
     except HTTPException:
         raise
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="CPF e telefone já pertencem a outro usuário")
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
@@ -1133,8 +1321,14 @@ async def add_balance(
         if not usuario:
             raise HTTPException(status_code=404, detail="Usuário não encontrado")
         
-        # Adicionar saldo
-        usuario.saldo += valor
+        # Adicionar saldo no próprio UPDATE (saldo = saldo + x): não sobrescreve movimentações concorrentes
+        result = await db.execute(
+            update(Usuario)
+            .where(Usuario.id == usuario.id)
+            .values(saldo=Usuario.saldo + valor)
+            .returning(Usuario.saldo)
+        )
+        set_committed_value(usuario, "saldo", result.scalar_one())
         
         # Registrar transação
         transacao = Transacao(
@@ -1147,6 +1341,7 @@ async def add_balance(
         db.add(transacao)
         
         await db.commit()
+        await balance_cache.set(usuario.telegram_id, usuario.nome, usuario.saldo)
         
         return RedirectResponse(url=f"/admin/users/{user_id}", status_code=303)
     except HTTPException:
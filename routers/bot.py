@@ -1,4 +1,3 @@
-from fastapi import APIRouter, Request, HTTPException
 from aiogram import Bot, Dispatcher, types
 from aiogram.filters import Command
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, WebAppInfo
@@ -8,32 +7,31 @@ import os
 from pathlib import Path
 from database import (
     AsyncSessionLocal, Usuario, Sorteio, Aposta, StatusSorteio, SystemConfig, 
-    Transacao, TipoTransacao, StatusTransacao, Concurso, StatusConcurso
+    Transacao, TipoTransacao, StatusTransacao, Concurso, StatusConcurso, normalize_digits
 )
-from sqlalchemy import select
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from config import get_settings
 from services.user_photo import download_user_photo
+from services.balance_cache import balance_cache
+from services.read_replica import read_replica
+from services.realtime import realtime_hub
 
-# Configurar caminho do log
+# Log de depuração (.cursor/, fora do git): o diretório só é criado na primeira escrita
 LOG_DIR = Path(__file__).parent.parent / ".cursor"
-LOG_DIR.mkdir(parents=True, exist_ok=True)
 LOG_PATH = LOG_DIR / "debug.log"
-# #region agent log
-try:
-    import time
-    log_entry = {"id": f"log_{int(time.time() * 1000)}", "timestamp": int(time.time() * 1000), "location": "routers/bot.py:21", "message": "module loaded", "data": {"log_path": str(LOG_PATH)}, "sessionId": "debug-session", "runId": "run1", "hypothesisId": "A"}
-    with open(LOG_PATH, "a", encoding="utf-8") as f: f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
-except Exception as e: 
-    import logging
-    logging.error(f"Erro ao escrever log inicial: {e}")
-# #endregion
+
+
+def _write_debug_log(log_entry: dict):
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    with open(LOG_PATH, "a", encoding="utf-8") as f:
+        f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
-router = APIRouter()
-
 # Bot e Dispatcher
 bot = Bot(token=settings.BOT_TOKEN)
 dp = Dispatcher()
@@ -65,6 +63,7 @@ async def cmd_start(message: types.Message):
                 session.add(usuario)
                 await session.commit()
                 await session.refresh(usuario)
+                await read_replica.mark_write(usuario.telegram_id)
                 logger.info(f"🆕 Usuário criado automaticamente no /start: {usuario.id} (Telegram: {usuario.telegram_id})")
                 
                 # Tentar baixar foto
@@ -148,22 +147,18 @@ async def cmd_start(message: types.Message):
 @dp.message(Command("saldo"))
 async def cmd_saldo(message: types.Message):
     """Mostra o saldo do usuário"""
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(Usuario).where(Usuario.telegram_id == message.from_user.id)
-        )
-        usuario = result.scalar_one_or_none()
-        
-        if not usuario:
-            await message.answer("❌ Usuário não encontrado. Use /start primeiro.")
-            return
-        
-        await message.answer(
-            f"💰 Seu Saldo\n\n"
-            f"Disponível: R$ {usuario.saldo:.2f}\n\n"
-            f"💳 Use /depositar para adicionar créditos\n"
-            f"🎲 Use /apostar para fazer uma aposta"
-        )
+    saldo = await balance_cache.get_or_load(message.from_user.id)
+    
+    if not saldo:
+        await message.answer("❌ Usuário não encontrado. Use /start primeiro.")
+        return
+    
+    await message.answer(
+        f"💰 Seu Saldo\n\n"
+        f"Disponível: R$ {saldo.saldo:.2f}\n\n"
+        f"💳 Use /depositar para adicionar créditos\n"
+        f"🎲 Use /apostar para fazer uma aposta"
+    )
 
 
 @dp.message(Command("depositar"))
@@ -250,7 +245,7 @@ async def handle_web_app_data(message: types.Message):
     try:
         import time
         log_entry = {"id": f"log_{int(time.time() * 1000)}", "timestamp": int(time.time() * 1000), "location": "routers/bot.py:201", "message": "web_app_data received", "data": {"telegram_id": message.from_user.id, "has_data": message.web_app_data is not None}, "sessionId": "debug-session", "runId": "run1", "hypothesisId": "A"}
-        with open(LOG_PATH, "a", encoding="utf-8") as f: f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+        _write_debug_log(log_entry)
     except Exception as e: logger.error(f"Erro ao escrever log: {e}")
     # #endregion
     try:
@@ -260,7 +255,7 @@ async def handle_web_app_data(message: types.Message):
         try:
             import time
             log_entry = {"id": f"log_{int(time.time() * 1000)}", "timestamp": int(time.time() * 1000), "location": "routers/bot.py:206", "message": "data_str parsed", "data": {"telegram_id": message.from_user.id, "data_str_length": len(data_str), "data_str_preview": data_str[:100]}, "sessionId": "debug-session", "runId": "run1", "hypothesisId": "A"}
-            with open(LOG_PATH, "a", encoding="utf-8") as f: f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+            _write_debug_log(log_entry)
         except Exception as e: logger.error(f"Erro ao escrever log: {e}")
         # #endregion
         data = json.loads(data_str)
@@ -270,7 +265,7 @@ async def handle_web_app_data(message: types.Message):
         try:
             import time
             log_entry = {"id": f"log_{int(time.time() * 1000)}", "timestamp": int(time.time() * 1000), "location": "routers/bot.py:208", "message": "action extracted", "data": {"telegram_id": message.from_user.id, "action": action, "data_keys": list(data.keys())}, "sessionId": "debug-session", "runId": "run1", "hypothesisId": "A"}
-            with open(LOG_PATH, "a", encoding="utf-8") as f: f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+            _write_debug_log(log_entry)
         except Exception as e: logger.error(f"Erro ao escrever log: {e}")
         # #endregion
         
@@ -280,7 +275,7 @@ async def handle_web_app_data(message: types.Message):
             try:
                 import time
                 log_entry = {"id": f"log_{int(time.time() * 1000)}", "timestamp": int(time.time() * 1000), "location": "routers/bot.py:211", "message": "calling handle_cadastro_usuario", "data": {"telegram_id": message.from_user.id}, "sessionId": "debug-session", "runId": "run1", "hypothesisId": "A"}
-                with open(LOG_PATH, "a", encoding="utf-8") as f: f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+                _write_debug_log(log_entry)
             except Exception as e: logger.error(f"Erro ao escrever log: {e}")
             # #endregion
             await handle_cadastro_usuario(message, data)
@@ -382,20 +377,30 @@ async def handle_web_app_data(message: types.Message):
             else:
                 valor_aposta = float(valor_aposta)
             
-            # VERIFICAR SALDO DO USUÁRIO (NOVA LÓGICA)
-            if usuario.saldo < valor_aposta:
-                saldo_faltante = valor_aposta - usuario.saldo
+            # DEDUZIR DO SALDO (ATOMICIDADE): débito no próprio UPDATE, só se ainda houver
+            # saldo; não sobrescreve um crédito concorrente e o cache recebe o valor do banco
+            result = await session.execute(
+                update(Usuario)
+                .where(Usuario.id == usuario.id, Usuario.saldo >= valor_aposta)
+                .values(saldo=Usuario.saldo - valor_aposta)
+                .returning(Usuario.saldo)
+            )
+            novo_saldo = result.scalar_one_or_none()
+            if novo_saldo is None:
+                await session.rollback()
+                saldo_atual = (await session.execute(
+                    select(Usuario.saldo).where(Usuario.id == usuario.id)
+                )).scalar_one()
+                saldo_faltante = valor_aposta - saldo_atual
                 await message.answer(
                     f"❌ Saldo insuficiente!\n\n"
-                    f"💰 Seu saldo: R$ {usuario.saldo:.2f}\n"
+                    f"💰 Seu saldo: R$ {saldo_atual:.2f}\n"
                     f"💵 Valor da aposta: R$ {valor_aposta:.2f}\n"
                     f"📉 Falta: R$ {saldo_faltante:.2f}\n\n"
                     f"💳 Use /depositar para adicionar saldo à sua carteira."
                 )
                 return
-            
-            # DEDUZIR DO SALDO (ATOMICIDADE)
-            usuario.saldo -= valor_aposta
+            set_committed_value(usuario, "saldo", novo_saldo)
             
             # Registrar transação de aposta
             if concurso_atual:
@@ -424,6 +429,16 @@ async def handle_web_app_data(message: types.Message):
             session.add(aposta)
             await session.commit()
             
+            await balance_cache.set(usuario.telegram_id, usuario.nome, usuario.saldo)
+            await read_replica.mark_write(usuario.telegram_id)
+            await realtime_hub.publish(usuario.telegram_id, "bet_placed", {
+                "aposta_id": aposta.id,
+                "concurso_id": aposta.concurso_id,
+                "sorteio_id": aposta.sorteio_id,
+                "valor": valor_aposta,
+                "saldo": usuario.saldo
+            })
+            
             total_numeros = len(white_numbers) + len(red_numbers)
             await message.answer(
                 f"✅ Aposta registrada com sucesso!\n\n"
@@ -449,14 +464,14 @@ async def handle_cadastro_usuario(message: types.Message, data: dict):
     try:
         import time
         log_entry = {"id": f"log_{int(time.time() * 1000)}", "timestamp": int(time.time() * 1000), "location": "routers/bot.py:406", "message": "handle_cadastro_usuario entry", "data": {"telegram_id": message.from_user.id, "data_keys": list(data.keys())}, "sessionId": "debug-session", "runId": "run1", "hypothesisId": "A"}
-        with open(LOG_PATH, "a", encoding="utf-8") as f: f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+        _write_debug_log(log_entry)
     except Exception as e: logger.error(f"Erro ao escrever log: {e}")
     # #endregion
     try:
         nome = data.get("nome", "").strip()
-        cpf = data.get("cpf", "").strip()
+        cpf = normalize_digits(data.get("cpf", "")) or ""
         pix = data.get("pix", "").strip()
-        telefone = data.get("telefone", "").strip()
+        telefone = normalize_digits(data.get("telefone", "")) or ""
         cidade = data.get("cidade", "").strip() or None
         estado = data.get("estado", "").strip() or None
         
@@ -464,7 +479,7 @@ async def handle_cadastro_usuario(message: types.Message, data: dict):
         try:
             import time
             log_entry = {"id": f"log_{int(time.time() * 1000)}", "timestamp": int(time.time() * 1000), "location": "routers/bot.py:380", "message": "data extracted", "data": {"nome": bool(nome), "cpf": bool(cpf), "pix": bool(pix), "telefone": bool(telefone), "cidade": cidade is not None, "estado": estado is not None}, "sessionId": "debug-session", "runId": "run1", "hypothesisId": "C"}
-            with open(LOG_PATH, "a", encoding="utf-8") as f: f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+            _write_debug_log(log_entry)
         except: pass
         # #endregion
         
@@ -474,7 +489,7 @@ async def handle_cadastro_usuario(message: types.Message, data: dict):
             try:
                 import time
                 log_entry = {"id": f"log_{int(time.time() * 1000)}", "timestamp": int(time.time() * 1000), "location": "routers/bot.py:383", "message": "validation failed", "data": {"nome": bool(nome), "cpf": bool(cpf), "pix": bool(pix), "telefone": bool(telefone)}, "sessionId": "debug-session", "runId": "run1", "hypothesisId": "C"}
-                with open(LOG_PATH, "a", encoding="utf-8") as f: f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+                _write_debug_log(log_entry)
             except: pass
             # #endregion
             await message.answer("❌ Erro: Nome, CPF, PIX e Telefone são obrigatórios.")
@@ -484,7 +499,7 @@ async def handle_cadastro_usuario(message: types.Message, data: dict):
         try:
             import time
             log_entry = {"id": f"log_{int(time.time() * 1000)}", "timestamp": int(time.time() * 1000), "location": "routers/bot.py:386", "message": "before database session", "data": {"telegram_id": message.from_user.id}, "sessionId": "debug-session", "runId": "run1", "hypothesisId": "A"}
-            with open(LOG_PATH, "a", encoding="utf-8") as f: f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+            _write_debug_log(log_entry)
         except: pass
         # #endregion
         
@@ -494,7 +509,7 @@ async def handle_cadastro_usuario(message: types.Message, data: dict):
                 try:
                     import time
                     log_entry = {"id": f"log_{int(time.time() * 1000)}", "timestamp": int(time.time() * 1000), "location": "routers/bot.py:389", "message": "database session created", "data": {"telegram_id": message.from_user.id}, "sessionId": "debug-session", "runId": "run1", "hypothesisId": "A"}
-                    with open(LOG_PATH, "a", encoding="utf-8") as f: f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+                    _write_debug_log(log_entry)
                 except: pass
                 # #endregion
                 # Buscar usuário existente
@@ -507,7 +522,7 @@ async def handle_cadastro_usuario(message: types.Message, data: dict):
                 try:
                     import time
                     log_entry = {"id": f"log_{int(time.time() * 1000)}", "timestamp": int(time.time() * 1000), "location": "routers/bot.py:393", "message": "user lookup result", "data": {"telegram_id": message.from_user.id, "usuario_exists": usuario is not None, "usuario_id": usuario.id if usuario else None}, "sessionId": "debug-session", "runId": "run1", "hypothesisId": "D"}
-                    with open(LOG_PATH, "a", encoding="utf-8") as f: f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+                    _write_debug_log(log_entry)
                 except: pass
                 # #endregion
                 
@@ -516,7 +531,7 @@ async def handle_cadastro_usuario(message: types.Message, data: dict):
                     try:
                         import time
                         log_entry = {"id": f"log_{int(time.time() * 1000)}", "timestamp": int(time.time() * 1000), "location": "routers/bot.py:395", "message": "creating new user", "data": {"telegram_id": message.from_user.id, "nome": nome[:20], "cpf_len": len(cpf), "pix_len": len(pix)}, "sessionId": "debug-session", "runId": "run1", "hypothesisId": "B"}
-                        with open(LOG_PATH, "a", encoding="utf-8") as f: f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+                        _write_debug_log(log_entry)
                     except: pass
                     # #endregion
                     # Criar novo usuário
@@ -535,7 +550,7 @@ async def handle_cadastro_usuario(message: types.Message, data: dict):
                     try:
                         import time
                         log_entry = {"id": f"log_{int(time.time() * 1000)}", "timestamp": int(time.time() * 1000), "location": "routers/bot.py:407", "message": "before flush", "data": {"telegram_id": message.from_user.id}, "sessionId": "debug-session", "runId": "run1", "hypothesisId": "B"}
-                        with open(LOG_PATH, "a", encoding="utf-8") as f: f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+                        _write_debug_log(log_entry)
                     except: pass
                     # #endregion
                     await session.flush()  # Para obter o ID antes do commit
@@ -543,7 +558,7 @@ async def handle_cadastro_usuario(message: types.Message, data: dict):
                     try:
                         import time
                         log_entry = {"id": f"log_{int(time.time() * 1000)}", "timestamp": int(time.time() * 1000), "location": "routers/bot.py:407", "message": "after flush", "data": {"telegram_id": message.from_user.id, "usuario_id": usuario.id if hasattr(usuario, 'id') else None}, "sessionId": "debug-session", "runId": "run1", "hypothesisId": "B"}
-                        with open(LOG_PATH, "a", encoding="utf-8") as f: f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+                        _write_debug_log(log_entry)
                     except: pass
                     # #endregion
                 else:
@@ -551,7 +566,7 @@ async def handle_cadastro_usuario(message: types.Message, data: dict):
                     try:
                         import time
                         log_entry = {"id": f"log_{int(time.time() * 1000)}", "timestamp": int(time.time() * 1000), "location": "routers/bot.py:409", "message": "updating existing user", "data": {"telegram_id": message.from_user.id, "usuario_id": usuario.id}, "sessionId": "debug-session", "runId": "run1", "hypothesisId": "B"}
-                        with open(LOG_PATH, "a", encoding="utf-8") as f: f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+                        _write_debug_log(log_entry)
                     except: pass
                     # #endregion
                     # Atualizar dados do usuário existente
@@ -577,7 +592,7 @@ async def handle_cadastro_usuario(message: types.Message, data: dict):
                 try:
                     import time
                     log_entry = {"id": f"log_{int(time.time() * 1000)}", "timestamp": int(time.time() * 1000), "location": "routers/bot.py:428", "message": "before commit", "data": {"telegram_id": message.from_user.id, "usuario_id": usuario.id if hasattr(usuario, 'id') else None}, "sessionId": "debug-session", "runId": "run1", "hypothesisId": "B"}
-                    with open(LOG_PATH, "a", encoding="utf-8") as f: f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+                    _write_debug_log(log_entry)
                 except: pass
                 # #endregion
                 await session.commit()
@@ -585,17 +600,19 @@ async def handle_cadastro_usuario(message: types.Message, data: dict):
                 try:
                     import time
                     log_entry = {"id": f"log_{int(time.time() * 1000)}", "timestamp": int(time.time() * 1000), "location": "routers/bot.py:428", "message": "after commit", "data": {"telegram_id": message.from_user.id, "usuario_id": usuario.id if hasattr(usuario, 'id') else None}, "sessionId": "debug-session", "runId": "run1", "hypothesisId": "B"}
-                    with open(LOG_PATH, "a", encoding="utf-8") as f: f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+                    _write_debug_log(log_entry)
                 except: pass
                 # #endregion
                 
                 # Refresh para garantir que os dados estão atualizados
                 await session.refresh(usuario)
+                await balance_cache.invalidate(usuario.telegram_id)
+                await read_replica.mark_write(usuario.telegram_id)
                 # #region agent log
                 try:
                     import time
                     log_entry = {"id": f"log_{int(time.time() * 1000)}", "timestamp": int(time.time() * 1000), "location": "routers/bot.py:431", "message": "after refresh", "data": {"telegram_id": message.from_user.id, "usuario_id": usuario.id, "cadastro_completo": usuario.cadastro_completo, "nome": usuario.nome[:20] if usuario.nome else None}, "sessionId": "debug-session", "runId": "run1", "hypothesisId": "B"}
-                    with open(LOG_PATH, "a", encoding="utf-8") as f: f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+                    _write_debug_log(log_entry)
                 except: pass
                 # #endregion
                 
@@ -612,16 +629,20 @@ async def handle_cadastro_usuario(message: types.Message, data: dict):
                 try:
                     import time
                     log_entry = {"id": f"log_{int(time.time() * 1000)}", "timestamp": int(time.time() * 1000), "location": "routers/bot.py:441", "message": "registration success", "data": {"telegram_id": message.from_user.id, "usuario_id": usuario.id}, "sessionId": "debug-session", "runId": "run1", "hypothesisId": "B"}
-                    with open(LOG_PATH, "a", encoding="utf-8") as f: f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+                    _write_debug_log(log_entry)
                 except: pass
                 # #endregion
                 
+            except IntegrityError:
+                await session.rollback()
+                await message.answer("❌ Este CPF e telefone já estão cadastrados em outra conta.")
+                return
             except Exception as e:
                 # #region agent log
                 try:
                     import time
                     log_entry = {"id": f"log_{int(time.time() * 1000)}", "timestamp": int(time.time() * 1000), "location": "routers/bot.py:443", "message": "exception in session", "data": {"telegram_id": message.from_user.id, "error_type": type(e).__name__, "error_message": str(e)[:200]}, "sessionId": "debug-session", "runId": "run1", "hypothesisId": "E"}
-                    with open(LOG_PATH, "a", encoding="utf-8") as f: f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+                    _write_debug_log(log_entry)
                 except: pass
                 # #endregion
                 await session.rollback()
@@ -634,67 +655,7 @@ async def handle_cadastro_usuario(message: types.Message, data: dict):
         try:
             import time
             log_entry = {"id": f"log_{int(time.time() * 1000)}", "timestamp": int(time.time() * 1000), "location": "routers/bot.py:449", "message": "external exception", "data": {"telegram_id": message.from_user.id if message and message.from_user else None, "error_type": type(e).__name__, "error_message": str(e)[:200]}, "sessionId": "debug-session", "runId": "run1", "hypothesisId": "E"}
-            with open(LOG_PATH, "a", encoding="utf-8") as f: f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+            _write_debug_log(log_entry)
         except: pass
         # #endregion
         logger.error(f"Erro externo ao processar cadastro: {e}", exc_info=True)
-
-
-@router.post("/webhook/{token}")
-async def webhook_handler(token: str, request: Request):
-    """Endpoint para receber updates do Telegram"""
-    # #region agent log
-    try:
-        import time
-        log_entry = {"id": f"log_{int(time.time() * 1000)}", "timestamp": int(time.time() * 1000), "location": "routers/bot.py:603", "message": "webhook received", "data": {"token_received": token[:10] + "..." if len(token) > 10 else token}, "sessionId": "debug-session", "runId": "run1", "hypothesisId": "A"}
-        with open(LOG_PATH, "a", encoding="utf-8") as f: f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
-    except Exception as e: logger.error(f"Erro ao escrever log: {e}")
-    # #endregion
-    if token != settings.BOT_TOKEN:
-        # #region agent log
-        try:
-            import time
-            log_entry = {"id": f"log_{int(time.time() * 1000)}", "timestamp": int(time.time() * 1000), "location": "routers/bot.py:607", "message": "invalid token", "data": {}, "sessionId": "debug-session", "runId": "run1", "hypothesisId": "A"}
-            with open(LOG_PATH, "a", encoding="utf-8") as f: f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
-        except Exception as e: logger.error(f"Erro ao escrever log: {e}")
-        # #endregion
-        raise HTTPException(status_code=403, detail="Invalid token")
-    
-    try:
-        update_data = await request.json()
-        # #region agent log
-        try:
-            import time
-            has_web_app_data = "message" in update_data and "web_app_data" in update_data.get("message", {})
-            log_entry = {"id": f"log_{int(time.time() * 1000)}", "timestamp": int(time.time() * 1000), "location": "routers/bot.py:612", "message": "update_data parsed", "data": {"update_id": update_data.get("update_id"), "has_message": "message" in update_data, "has_web_app_data": has_web_app_data}, "sessionId": "debug-session", "runId": "run1", "hypothesisId": "A"}
-            with open(LOG_PATH, "a", encoding="utf-8") as f: f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
-        except Exception as e: logger.error(f"Erro ao escrever log: {e}")
-        # #endregion
-        update = types.Update(**update_data)
-        # #region agent log
-        try:
-            import time
-            log_entry = {"id": f"log_{int(time.time() * 1000)}", "timestamp": int(time.time() * 1000), "location": "routers/bot.py:614", "message": "before feed_update", "data": {}, "sessionId": "debug-session", "runId": "run1", "hypothesisId": "A"}
-            with open(LOG_PATH, "a", encoding="utf-8") as f: f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
-        except Exception as e: logger.error(f"Erro ao escrever log: {e}")
-        # #endregion
-        await dp.feed_update(bot=bot, update=update)
-        # #region agent log
-        try:
-            import time
-            log_entry = {"id": f"log_{int(time.time() * 1000)}", "timestamp": int(time.time() * 1000), "location": "routers/bot.py:614", "message": "after feed_update", "data": {}, "sessionId": "debug-session", "runId": "run1", "hypothesisId": "A"}
-            with open(LOG_PATH, "a", encoding="utf-8") as f: f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
-        except Exception as e: logger.error(f"Erro ao escrever log: {e}")
-        # #endregion
-        return {"ok": True}
-    except Exception as e:
-        # #region agent log
-        try:
-            import time
-            log_entry = {"id": f"log_{int(time.time() * 1000)}", "timestamp": int(time.time() * 1000), "location": "routers/bot.py:616", "message": "webhook exception", "data": {"error_type": type(e).__name__, "error_message": str(e)[:200]}, "sessionId": "debug-session", "runId": "run1", "hypothesisId": "E"}
-            with open(LOG_PATH, "a", encoding="utf-8") as f: f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
-        except Exception as e2: logger.error(f"Erro ao escrever log: {e2}")
-        # #endregion
-        logger.error(f"Erro no webhook: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail="Webhook processing failed")
-
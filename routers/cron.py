@@ -0,0 +1,54 @@
+"""
+Tarefas periódicas no perfil serverless (Vercel Cron).
+
+Sem processo de longa duração, o lifespan não inicia as tarefas em segundo
+plano; cada chamada de /api/cron/tick roda uma passada de cada uma (inbox de
+webhooks, reconciliação de depósitos, resultados oficiais e apuração
+automática), com os mesmos advisory locks dos workers. A Vercel envia
+"Authorization: Bearer <CRON_SECRET>"; sem CRON_SECRET o endpoint fica
+desligado.
+"""
+from fastapi import APIRouter, Header, HTTPException
+from typing import Any, Dict, Optional
+import hmac
+import logging
+import time
+
+from config import get_settings
+from services.webhook_inbox import webhook_inbox
+from services.reconciliation import deposit_reconciler
+from services.official_draws import official_draw_sync
+from services.auto_settlement import auto_settlement
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/cron", tags=["cron"])
+
+
+@router.get("/tick")
+async def cron_tick(authorization: Optional[str] = Header(None)):
+    """Uma passada de cada tarefa periódica habilitada"""
+    esperado = f"Bearer {settings.CRON_SECRET}"
+    if not settings.CRON_SECRET or not hmac.compare_digest(authorization or "", esperado):
+        raise HTTPException(status_code=403, detail="Não autorizado")
+
+    tarefas = [("webhook_inbox", webhook_inbox.process_batch)]
+    if settings.RECONCILE_ENABLED:
+        tarefas.append(("reconciliacao", deposit_reconciler.run_once))
+    if settings.OFFICIAL_DRAWS_SYNC_ENABLED:
+        tarefas.append(("resultados_oficiais", official_draw_sync.sync))
+    if settings.AUTO_SETTLEMENT_MODE != "off":
+        tarefas.append(("apuracao_automatica", auto_settlement.run_once))
+
+    resultado: Dict[str, Any] = {}
+    for nome, tarefa in tarefas:
+        started = time.perf_counter()
+        try:
+            # None/False: outro worker (ou instância) já está rodando a tarefa
+            resultado[nome] = {"resultado": await tarefa()}
+        except Exception as e:
+            logger.error(f"Erro na tarefa periódica {nome}: {e}", exc_info=True)
+            resultado[nome] = {"erro": str(e)}
+        resultado[nome]["duracao_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return resultado
@@ -1,20 +1,28 @@
 from fastapi import APIRouter, HTTPException, Depends, Request, Header
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, update, or_
 from database import (
     AsyncSessionLocal, Usuario, Transacao, TipoTransacao, StatusTransacao, get_db
 )
 from pydantic import BaseModel, Field
 from typing import Optional
+import asyncio
 import logging
-import secrets
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import json
+import weakref
 
+from config import get_settings
 from services.asaas import asaas_service
+from services.asaas_customers import get_or_create_customer_id
+from services.balance_cache import balance_cache
+from services.read_replica import read_replica, read_session
+from services.resilience import OutboundUnavailableError
+from services.serialization import FastJSONResponse, ResponseAdapter
+from services.webhook_inbox import webhook_inbox
 
 router = APIRouter(prefix="/finance", tags=["finance"])
 logger = logging.getLogger(__name__)
+settings = get_settings()
 
 
 # ==================== Schemas (Pydantic Models) ====================
@@ -35,18 +43,112 @@ class DepositResponse(BaseModel):
     created_at: datetime
 
 
-class WebhookPixPayload(BaseModel):
-    gateway_id: str
-    status: str  # "PAID", "FAILED", etc
-    valor: float
-
-
 class BalanceResponse(BaseModel):
     telegram_id: int
     nome: str
     saldo: float
 
 
+deposit_adapter = ResponseAdapter(DepositResponse)
+balance_adapter = ResponseAdapter(BalanceResponse)
+
+
+# ==================== Depósito Pix ====================
+
+# Um depósito por vez por usuário neste worker (entre workers: lock na linha do usuário)
+_deposit_locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+# Margem mínima de validade para reaproveitar um QR Code pendente
+PIX_REUSE_MARGIN = timedelta(minutes=5)
+# Depósito sem QR Code mais novo que isso: outra requisição ainda está criando a cobrança
+DEPOSIT_IN_PROGRESS_WINDOW = timedelta(minutes=2)
+
+try:
+    from zoneinfo import ZoneInfo
+    ASAAS_TZ = ZoneInfo("America/Sao_Paulo")
+except Exception:  # Sem base de fusos: horário de Brasília fixo
+    ASAAS_TZ = timezone(timedelta(hours=-3))
+
+
+def _parse_pix_expiration(value: Optional[str]) -> Optional[datetime]:
+    """expirationDate do Asaas ('YYYY-MM-DD HH:MM:SS', horário de Brasília) em UTC, como created_at"""
+    if not value:
+        return None
+    try:
+        local = datetime.strptime(value, "%Y-%m-%d %H:%M:%S").replace(tzinfo=ASAAS_TZ)
+    except ValueError:
+        return None
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _format_expiration(value: Optional[datetime]) -> Optional[str]:
+    """Data de vencimento no horário de Brasília (como o dueDate do Asaas)"""
+    if not value:
+        return None
+    return value.replace(tzinfo=timezone.utc).astimezone(ASAAS_TZ).strftime("%Y-%m-%d")
+
+
+def _deposit_response(transacao: Transacao, expires_at: Optional[str] = None):
+    return deposit_adapter.response(DepositResponse(
+        transaction_id=transacao.id,
+        pix_code=transacao.pix_payload or "",
+        qr_code_base64=transacao.pix_qrcode,
+        valor=transacao.valor,
+        status=transacao.status.value,
+        payment_id=transacao.gateway_id,
+        expires_at=expires_at or _format_expiration(transacao.pix_expira_em),
+        created_at=transacao.created_at
+    ))
+
+
+async def _find_reusable_deposit(session, usuario_id: int, valor: float) -> Optional[Transacao]:
+    """
+    Cobrança pendente recente do mesmo usuário e valor, com QR Code ainda válido
+    ou ainda sem QR Code (a busca falhou; quem reaproveita busca de novo)
+    """
+    agora = datetime.utcnow()
+    result = await session.execute(
+        select(Transacao)
+        .where(
+            Transacao.usuario_id == usuario_id,
+            Transacao.tipo == TipoTransacao.DEPOSITO,
+            Transacao.status == StatusTransacao.PENDENTE,
+            Transacao.valor == valor,
+            Transacao.gateway_id != "",
+            Transacao.created_at >= agora - timedelta(minutes=settings.DEPOSIT_REUSE_MINUTES),
+            or_(Transacao.pix_expira_em.is_(None), Transacao.pix_expira_em > agora + PIX_REUSE_MARGIN)
+        )
+        .order_by(Transacao.created_at.desc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+async def _find_deposit_in_progress(session, usuario_id: int) -> Optional[Transacao]:
+    """Depósito registrado por outra requisição que ainda espera a cobrança do Asaas"""
+    result = await session.execute(
+        select(Transacao)
+        .where(
+            Transacao.usuario_id == usuario_id,
+            Transacao.tipo == TipoTransacao.DEPOSITO,
+            Transacao.status == StatusTransacao.PENDENTE,
+            Transacao.gateway_id == "",
+            Transacao.created_at >= datetime.utcnow() - DEPOSIT_IN_PROGRESS_WINDOW
+        )
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+async def _update_deposit(session, transacao_id: int, **values):
+    await session.execute(
+        update(Transacao)
+        .where(Transacao.id == transacao_id)
+        .values(updated_at=datetime.utcnow(), **values)
+    )
+    await session.commit()
+
+
 # ==================== Endpoints ====================
 
 @router.post("/deposit", response_model=DepositResponse)
@@ -54,14 +156,20 @@ async def create_deposit(deposit: DepositRequest):
     """
     Cria uma solicitação de depósito via Pix usando Asaas.
     
-    - Cria/busca cliente no Asaas
-    - Cria cobrança Pix
-    - Gera QR Code
-    - Registra transação localmente
+    - Reaproveita a cobrança pendente do mesmo usuário e valor, se ainda válida
+    - Usa o cliente Asaas gravado no usuário (cria/busca no primeiro depósito)
+    - Registra a transação na mesma transação do lock do usuário e libera o lock
+      antes de qualquer chamada ao Asaas
+    - Cria a cobrança com a transação como externalReference, grava o gateway_id
+      e busca o QR Code, guardado junto com a transação
+    
+    A transação é gravada antes da cobrança (e não em paralelo a ela): o insert
+    entra no commit que já libera o lock do usuário, sem ida extra ao banco, e o
+    id vira o externalReference que liga a cobrança à transação mesmo que a
+    gravação do gateway_id falhe.
     """
     async with AsyncSessionLocal() as session:
         try:
-            # Buscar ou criar usuário
             result = await session.execute(
                 select(Usuario).where(Usuario.telegram_id == deposit.telegram_id)
             )
@@ -77,71 +185,104 @@ async def create_deposit(deposit: DepositRequest):
                     detail="CPF não cadastrado. Complete seu cadastro no Mini App."
                 )
             
-            # Buscar ou criar cliente no Asaas
-            asaas_customer = await asaas_service.get_customer_by_external_reference(
-                str(deposit.telegram_id)
-            )
-            
-            if not asaas_customer:
-                # Remover formatação do CPF (apenas números)
-                cpf_limpo = usuario.cpf.replace(".", "").replace("-", "")
-                
-                asaas_customer = await asaas_service.create_customer(
-                    name=usuario.nome,
-                    cpf_cnpj=cpf_limpo,
-                    phone=usuario.telefone.replace("(", "").replace(")", "").replace(" ", "").replace("-", "") if usuario.telefone else None,
-                    external_reference=str(deposit.telegram_id)
-                )
-            
-            customer_id = asaas_customer.get("id")
-            
-            # Criar transação local primeiro
-            transacao = Transacao(
-                usuario_id=usuario.id,
-                tipo=TipoTransacao.DEPOSITO,
-                valor=deposit.valor,
-                status=StatusTransacao.PENDENTE,
-                gateway_id="",  # Será atualizado após criar no Asaas
-                descricao=f"Depósito via Pix - R$ {deposit.valor:.2f}"
-            )
-            session.add(transacao)
+            # Nenhuma conexão fica presa durante as chamadas ao Asaas
             await session.commit()
-            await session.refresh(transacao)
             
-            # Criar cobrança Pix no Asaas
-            payment = await asaas_service.create_pix_payment(
-                customer_id=customer_id,
-                value=deposit.valor,
-                description=f"Depósito PowerPix - {usuario.nome}",
-                external_reference=str(transacao.id)
-            )
+            # Cliente Asaas gravado no usuário (só o primeiro depósito consulta o gateway)
+            customer_id = await get_or_create_customer_id(usuario)
+            usuario_id = usuario.id
+            nome = usuario.nome
             
-            payment_id = payment.get("id")
+            lock = _deposit_locks.get(usuario_id)
+            if lock is None:
+                lock = _deposit_locks[usuario_id] = asyncio.Lock()
+            async with lock:
+                # Reaproveitamento e registro da transação serializados entre workers pelo lock
+                # da linha do usuário, liberado no commit. FOR NO KEY UPDATE não bloqueia
+                # inserts com FK para o usuário.
+                await session.execute(
+                    select(Usuario.id).where(Usuario.id == usuario_id).with_for_update(key_share=True)
+                )
+                
+                transacao = await _find_reusable_deposit(session, usuario_id, deposit.valor)
+                if transacao is None:
+                    if await _find_deposit_in_progress(session, usuario_id):
+                        # Mesmo usuário em outra requisição: a cobrança ainda está sendo criada
+                        await session.commit()
+                        raise HTTPException(
+                            status_code=409,
+                            detail="Depósito em processamento. Tente novamente em instantes.",
+                            headers={"Retry-After": "2"}
+                        )
+                    
+                    transacao = Transacao(
+                        usuario_id=usuario_id,
+                        tipo=TipoTransacao.DEPOSITO,
+                        valor=deposit.valor,
+                        status=StatusTransacao.PENDENTE,
+                        gateway_id="",  # Será atualizado após criar no Asaas
+                        descricao=f"Depósito via Pix - R$ {deposit.valor:.2f}"
+                    )
+                    session.add(transacao)
+                    novo = True
+                else:
+                    novo = False
+                await session.commit()
             
-            # Atualizar transação com ID do Asaas
-            transacao.gateway_id = payment_id
-            await session.commit()
+            # Lock liberado: chamadas ao Asaas sem conexão nem lock presos
+            if not novo and transacao.pix_payload:
+                logger.info(f"Depósito reaproveitado: Transaction ID {transacao.id} - Payment ID {transacao.gateway_id}")
+                return _deposit_response(transacao)
             
-            # Obter QR Code Pix
-            qr_code_data = await asaas_service.get_pix_qrcode(payment_id)
-            pix_code = qr_code_data.get("payload", "")
-            qr_code_base64 = qr_code_data.get("encodedImage")
+            due_date = None
+            if novo:
+                try:
+                    payment = await asaas_service.create_pix_payment(
+                        customer_id=customer_id,
+                        value=deposit.valor,
+                        description=f"Depósito PowerPix - {nome}",
+                        external_reference=str(transacao.id)
+                    )
+                except Exception:
+                    await _update_deposit(session, transacao.id, status=StatusTransacao.FALHA)
+                    raise
+                transacao.gateway_id = payment.get("id")
+                due_date = payment.get("dueDate")
+                
+                # gateway_id gravado antes de buscar o QR Code: o webhook já encontra a transação
+                await _update_deposit(session, transacao.id, gateway_id=transacao.gateway_id)
+            else:
+                logger.info(f"Depósito reaproveitado sem QR Code, buscando de novo: Transaction ID {transacao.id}")
             
-            logger.info(f"Depósito Asaas criado: Transaction ID {transacao.id} - Payment ID {payment_id} - Valor R$ {deposit.valor:.2f}")
+            # Se a busca falhar a transação fica com o gateway_id e sem QR Code:
+            # o próximo depósito do mesmo valor reaproveita a cobrança e busca de novo
+            qr_code_data = await asaas_service.get_pix_qrcode(transacao.gateway_id)
+            transacao.pix_payload = qr_code_data.get("payload", "")
+            transacao.pix_qrcode = qr_code_data.get("encodedImage")
+            transacao.pix_expira_em = _parse_pix_expiration(qr_code_data.get("expirationDate"))
             
-            return DepositResponse(
-                transaction_id=transacao.id,
-                pix_code=pix_code,
-                qr_code_base64=qr_code_base64,
-                valor=transacao.valor,
-                status=transacao.status.value,
-                payment_id=payment_id,
-                expires_at=payment.get("dueDate"),
-                created_at=transacao.created_at
+            await _update_deposit(
+                session,
+                transacao.id,
+                pix_payload=transacao.pix_payload,
+                pix_qrcode=transacao.pix_qrcode,
+                pix_expira_em=transacao.pix_expira_em
             )
             
+            await read_replica.mark_write(deposit.telegram_id)
+            logger.info(f"Depósito Asaas criado: Transaction ID {transacao.id} - Payment ID {transacao.gateway_id} - Valor R$ {deposit.valor:.2f}")
+            
+            return _deposit_response(transacao, expires_at=due_date)
+            
         except HTTPException:
             raise
+        except OutboundUnavailableError as e:
+            logger.warning(f"Asaas indisponível ao criar depósito: {e}")
+            raise HTTPException(
+                status_code=503,
+                detail="Pagamentos temporariamente indisponíveis. Tente novamente em instantes.",
+                headers={"Retry-After": "30"}
+            )
         except Exception as e:
             logger.error(f"Erro ao criar depósito: {e}", exc_info=True)
             raise HTTPException(status_code=500, detail=f"Erro ao processar depósito: {str(e)}")
@@ -152,6 +293,9 @@ async def webhook_asaas(request: Request, asaas_access_token: Optional[str] = He
     """
     Webhook do Asaas para notificações de pagamento.
     
+    Apenas grava o evento no inbox (tabela webhook_inbox) e responde; o
+    crédito é feito pelos workers do inbox (services/webhook_inbox.py).
+    
     Eventos suportados:
     - PAYMENT_RECEIVED: Pagamento recebido
     - PAYMENT_CONFIRMED: Pagamento confirmado
@@ -160,128 +304,67 @@ async def webhook_asaas(request: Request, asaas_access_token: Optional[str] = He
     
     SEGURANÇA:
     - Valida token de acesso (se configurado)
-    - Verifica se a transação já foi processada (evita duplicação)
-    - Usa transação atômica para garantir consistência
+    - Reentregas do mesmo evento/pagamento são descartadas (chave única)
+    - Transação já creditada nunca é creditada de novo
     """
-    async with AsyncSessionLocal() as session:
-        try:
-            # Ler corpo da requisição
-            body = await request.body()
-            body_str = body.decode('utf-8')
-            webhook_data = json.loads(body_str)
-            
-            # Log do webhook recebido
-            logger.info(f"Webhook Asaas recebido: {webhook_data.get('event')}")
-            
-            # Validar token (se configurado)
-            # Note: Asaas permite configurar um token customizado no painel
-            # if asaas_access_token != settings.ASAAS_WEBHOOK_TOKEN:
-            #     logger.warning("Token de webhook inválido")
-            #     raise HTTPException(status_code=403, detail="Token inválido")
-            
-            event = webhook_data.get("event")
-            payment_data = webhook_data.get("payment", {})
-            payment_id = payment_data.get("id")
-            
-            if not payment_id:
-                logger.warning("Webhook sem payment ID")
-                return {"status": "ignored", "message": "Sem payment ID"}
-            
-            # Buscar transação pelo gateway_id (payment_id do Asaas)
-            result = await session.execute(
-                select(Transacao)
-                .options(selectinload(Transacao.usuario))
-                .where(Transacao.gateway_id == payment_id)
-            )
-            transacao = result.scalar_one_or_none()
-            
-            if not transacao:
-                logger.warning(f"Transação não encontrada para payment_id: {payment_id}")
-                # Não retorna erro para não fazer o Asaas reenviar
-                return {"status": "ignored", "message": "Transação não encontrada"}
-            
-            # Verificar se já foi processada (SEGURANÇA CRÍTICA)
-            if transacao.status == StatusTransacao.PAGO:
-                logger.warning(f"Transação {transacao.id} já foi processada anteriormente")
-                return {"status": "already_processed", "message": "Transação já foi creditada"}
-            
-            # Processar eventos de pagamento recebido/confirmado
-            if event in ["PAYMENT_RECEIVED", "PAYMENT_CONFIRMED"]:
-                # Atualizar status da transação
-                transacao.status = StatusTransacao.PAGO
-                transacao.updated_at = datetime.utcnow()
-                
-                # ATOMICIDADE: Creditar saldo do usuário
-                usuario = transacao.usuario
-                usuario.saldo += transacao.valor
-                
-                await session.commit()
-                
-                logger.info(f"✓ Depósito Asaas confirmado: Transaction ID {transacao.id} - Payment ID {payment_id} - Usuário {usuario.nome} - Valor R$ {transacao.valor:.2f} - Novo saldo: R$ {usuario.saldo:.2f}")
-                
-                return {
-                    "status": "success",
-                    "transaction_id": transacao.id,
-                    "novo_saldo": usuario.saldo,
-                    "message": "Depósito creditado com sucesso"
-                }
-            
-            elif event == "PAYMENT_OVERDUE":
-                transacao.status = StatusTransacao.FALHA
-                transacao.updated_at = datetime.utcnow()
-                await session.commit()
-                
-                logger.warning(f"Pagamento vencido: Transaction ID {transacao.id}")
-                return {"status": "expired", "message": "Pagamento vencido"}
-            
-            elif event == "PAYMENT_REFUNDED":
-                transacao.status = StatusTransacao.CANCELADO
-                transacao.updated_at = datetime.utcnow()
-                await session.commit()
-                
-                logger.warning(f"Pagamento estornado: Transaction ID {transacao.id}")
-                return {"status": "refunded", "message": "Pagamento estornado"}
-            
-            else:
-                logger.info(f"Evento não processado: {event}")
-                return {"status": "ignored", "message": f"Evento {event} não requer ação"}
-        
-        except json.JSONDecodeError:
-            logger.error("Erro ao decodificar JSON do webhook")
-            raise HTTPException(status_code=400, detail="JSON inválido")
-        except Exception as e:
-            await session.rollback()
-            logger.error(f"Erro ao processar webhook Asaas: {e}", exc_info=True)
-            # Não lança exceção para não fazer o Asaas reenviar indefinidamente
-            return {"status": "error", "message": str(e)}
+    try:
+        body = await request.body()
+        body_str = body.decode('utf-8')
+        webhook_data = json.loads(body_str)
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        logger.error("Erro ao decodificar JSON do webhook")
+        raise HTTPException(status_code=400, detail="JSON inválido")
+    
+    # Validar token (se configurado)
+    # Note: Asaas permite configurar um token customizado no painel
+    # if asaas_access_token != settings.ASAAS_WEBHOOK_TOKEN:
+    #     logger.warning("Token de webhook inválido")
+    #     raise HTTPException(status_code=403, detail="Token inválido")
+    
+    event = webhook_data.get("event")
+    payment_id = (webhook_data.get("payment") or {}).get("id")
+    logger.info(f"Webhook Asaas recebido: {event} {payment_id}")
+    
+    if not event or not payment_id:
+        logger.warning("Webhook sem evento ou payment ID")
+        return {"status": "ignored", "message": "Sem evento ou payment ID"}
+    
+    try:
+        novo = await webhook_inbox.enqueue(event, payment_id, body_str)
+    except Exception as e:
+        # Sem gravar não há como processar depois: erro faz o Asaas reenviar
+        logger.error(f"Erro ao gravar webhook Asaas no inbox: {e}", exc_info=True)
+        raise HTTPException(status_code=503, detail="Não foi possível registrar o webhook")
+    
+    if not novo:
+        return {"status": "duplicate", "message": "Evento já recebido"}
+    if settings.SERVERLESS:
+        # Sem workers em segundo plano: processa antes de responder (a instância congela depois)
+        await webhook_inbox.process_inline()
+    return {"status": "received", "message": "Evento registrado para processamento"}
 
 
 @router.get("/balance/{telegram_id}", response_model=BalanceResponse)
 async def get_balance(telegram_id: int):
     """
     Retorna o saldo atual do usuário.
+    
+    Servido pelo cache de saldo; só abre sessão com o banco na falta.
     """
-    async with AsyncSessionLocal() as session:
-        try:
-            result = await session.execute(
-                select(Usuario).where(Usuario.telegram_id == telegram_id)
-            )
-            usuario = result.scalar_one_or_none()
-            
-            if not usuario:
-                raise HTTPException(status_code=404, detail="Usuário não encontrado")
-            
-            return BalanceResponse(
-                telegram_id=usuario.telegram_id,
-                nome=usuario.nome,
-                saldo=usuario.saldo
-            )
-        
-        except HTTPException:
-            raise
-        except Exception as e:
-            logger.error(f"Erro ao buscar saldo: {e}", exc_info=True)
-            raise HTTPException(status_code=500, detail="Erro ao buscar saldo")
+    try:
+        saldo = await balance_cache.get_or_load(telegram_id)
+    except Exception as e:
+        logger.error(f"Erro ao buscar saldo: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Erro ao buscar saldo")
+    
+    if not saldo:
+        raise HTTPException(status_code=404, detail="Usuário não encontrado")
+    
+    return balance_adapter.response(BalanceResponse(
+        telegram_id=saldo.telegram_id,
+        nome=saldo.nome,
+        saldo=saldo.saldo
+    ))
 
 
 @router.get("/transactions/{telegram_id}")
@@ -289,7 +372,7 @@ async def get_transactions(telegram_id: int, limit: int = 20):
     """
     Retorna o histórico de transações do usuário.
     """
-    async with AsyncSessionLocal() as session:
+    async with read_session(telegram_id) as session:
         try:
             result = await session.execute(
                 select(Usuario).where(Usuario.telegram_id == telegram_id)
@@ -307,7 +390,7 @@ async def get_transactions(telegram_id: int, limit: int = 20):
             )
             transacoes = result.scalars().all()
             
-            return {
+            return FastJSONResponse({
                 "telegram_id": telegram_id,
                 "transactions": [
                     {
@@ -321,26 +404,10 @@ async def get_transactions(telegram_id: int, limit: int = 20):
                     }
                     for t in transacoes
                 ]
-            }
+            })
         
         except HTTPException:
             raise
         except Exception as e:
             logger.error(f"Erro ao buscar transações: {e}", exc_info=True)
             raise HTTPException(status_code=500, detail="Erro ao buscar transações")
-
-
-# Endpoint de teste para simular pagamento (REMOVER EM PRODUÇÃO)
-@router.post("/test/simulate-payment/{gateway_id}")
-async def simulate_payment(gateway_id: str):
-    """
-    APENAS PARA TESTES - Simula o pagamento de um Pix.
-    REMOVER EM PRODUÇÃO!
-    """
-    payload = WebhookPixPayload(
-        gateway_id=gateway_id,
-        status="PAID",
-        valor=0.0  # O valor já está na transação
-    )
-    return await webhook_pix(payload, None)
-
@@ -1,19 +1,31 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Header
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy import select, and_, desc
 from sqlalchemy.orm import selectinload
+from sqlalchemy.exc import IntegrityError
 from database import (
-    AsyncSessionLocal, Usuario, Aposta, Sorteio, StatusSorteio, Concurso, Transacao, TipoTransacao
+    AsyncSessionLocal, Usuario, Aposta, Sorteio, StatusSorteio, Concurso, Transacao, TipoTransacao,
+    normalize_digits
 )
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
+import asyncio
 import json
 import logging
 from pydantic import BaseModel as PydanticBaseModel
 
+from services.balance_cache import balance_cache
+from services.next_drawing import next_drawing_feed
+from services.read_replica import read_replica, read_session
+from services.realtime import realtime_hub, format_sse
+from services.serialization import FastJSONResponse, raw_json_array
+
 router = APIRouter(prefix="/api/player", tags=["player"])
 logger = logging.getLogger(__name__)
 
+NEXT_DRAWING_MAX_AGE = 60  # Segundos de cache no cliente/CDN para /next-drawing
+
 
 # ==================== Schemas ====================
 
@@ -36,6 +48,27 @@ class BetResponse(BaseModel):
     status_display: str  # "ATIVO", "GANHOU", "PERDEU", "AGUARDANDO"
 
 
+def bet_payload(aposta: Aposta, sorteio_status: Optional[str], status_display: str) -> dict:
+    """
+    Monta uma aposta no formato de BetResponse sem instanciar o modelo.
+
+    Os números já estão gravados como JSON e entram na resposta sem decodificar.
+    """
+    return {
+        "id": aposta.id,
+        "numeros_brancos": raw_json_array(aposta.numeros_brancos),
+        "numeros_vermelhos": raw_json_array(aposta.numeros_vermelhos),
+        "valor_pago": aposta.valor_pago,
+        "data_aposta": aposta.data_aposta.isoformat(),
+        "sorteio_id": aposta.sorteio_id,
+        "sorteio_status": sorteio_status,
+        "is_winner": aposta.is_winner,
+        "acertos": aposta.acertos,
+        "valor_premio": aposta.valor_premio,
+        "status_display": status_display
+    }
+
+
 class DrawResultResponse(BaseModel):
     sorteio_id: int
     data_sorteio: str
@@ -89,17 +122,20 @@ async def login(request: LoginRequest):
     async with AsyncSessionLocal() as session:
         try:
             # Limpar formatação
-            cpf_limpo = request.cpf.replace(".", "").replace("-", "").strip()
-            telefone_limpo = request.telefone.replace("(", "").replace(")", "").replace(" ", "").replace("-", "").strip()
-            
-            # Buscar usuário por CPF e telefone
-            result = await session.execute(
-                select(Usuario).where(
-                    Usuario.cpf == cpf_limpo,
-                    Usuario.telefone == telefone_limpo
+            cpf_limpo = normalize_digits(request.cpf)
+            telefone_limpo = normalize_digits(request.telefone)
+            
+            usuario = None
+            # Sem dígitos o filtro viraria "IS NULL" e casaria usuários sem CPF/telefone
+            if cpf_limpo and telefone_limpo:
+                # Buscar usuário por CPF e telefone normalizados (índice único)
+                result = await session.execute(
+                    select(Usuario).where(
+                        Usuario.cpf_digitos == cpf_limpo,
+                        Usuario.telefone_digitos == telefone_limpo
+                    )
                 )
-            )
-            usuario = result.scalar_one_or_none()
+                usuario = result.scalar_one_or_none()
             
             if not usuario:
                 return LoginResponse(
@@ -167,16 +203,11 @@ async def register(request: RegisterRequest):
             usuario = result.scalar_one_or_none()
             
             if usuario:
-                # Atualizar existente
                 # Atualizar existente
                 usuario.nome = request.nome
-                usuario.cpf = request.cpf.replace(".", "").replace("-", "").strip() if request.cpf else None
+                usuario.cpf = normalize_digits(request.cpf)
                 usuario.pix = request.pix
-                usuario.telefone = request.telefone.replace("(", "").replace(")", "").replace(" ", "").replace("-", "").strip() if request.telefone else None
-                usuario.cidade = request.cidade
-                usuario.estado = request.estado
-                usuario.cadastro_completo = True
-                usuario.telefone = request.telefone
+                usuario.telefone = normalize_digits(request.telefone)
                 usuario.cidade = request.cidade
                 usuario.estado = request.estado
                 usuario.cadastro_completo = True
@@ -190,9 +221,9 @@ async def register(request: RegisterRequest):
                 usuario = Usuario(
                     telegram_id=request.telegram_id,
                     nome=request.nome,
-                    cpf=request.cpf.replace(".", "").replace("-", "").strip() if request.cpf else None,
+                    cpf=normalize_digits(request.cpf),
                     pix=request.pix,
-                    telefone=request.telefone.replace("(", "").replace(")", "").replace(" ", "").replace("-", "").strip() if request.telefone else None,
+                    telefone=normalize_digits(request.telefone),
                     cidade=request.cidade,
                     estado=request.estado,
                     cadastro_completo=True,
@@ -203,6 +234,9 @@ async def register(request: RegisterRequest):
             
             await session.commit()
             await session.refresh(usuario)
+            await balance_cache.invalidate(usuario.telegram_id)
+            # Leituras roteadas (apostas, estatísticas) do recém-cadastrado vão ao primário
+            await read_replica.mark_write(usuario.telegram_id)
             
             return LoginResponse(
                 success=True,
@@ -214,6 +248,9 @@ async def register(request: RegisterRequest):
             
         except HTTPException:
             raise
+        except IntegrityError:
+            await session.rollback()
+            raise HTTPException(status_code=409, detail="CPF e telefone já cadastrados em outra conta")
         except Exception as e:
             logger.error(f"Erro ao registrar: {e}", exc_info=True)
             raise HTTPException(status_code=500, detail="Erro ao processar cadastro")
@@ -244,6 +281,7 @@ async def update_pix(request: UpdatePixRequest):
                 usuario.cadastro_completo = True
             
             await session.commit()
+            await read_replica.mark_write(request.telegram_id)
             
             return {"success": True, "message": "Chave PIX atualizada com sucesso"}
             
@@ -308,7 +346,7 @@ async def get_my_bets(telegram_id: int, limit: int = 50):
     - jogos_ativos: Apostas em sorteios ainda ABERTOS
     - historico: Apostas em sorteios FECHADOS (já sorteados)
     """
-    async with AsyncSessionLocal() as session:
+    async with read_session(telegram_id) as session:
         try:
             # Buscar usuário
             result = await session.execute(
@@ -344,18 +382,10 @@ async def get_my_bets(telegram_id: int, limit: int = 50):
                 else:
                     status_display = "AGUARDANDO"
                 
-                bet_data = BetResponse(
-                    id=aposta.id,
-                    numeros_brancos=json.loads(aposta.numeros_brancos),
-                    numeros_vermelhos=json.loads(aposta.numeros_vermelhos),
-                    valor_pago=aposta.valor_pago,
-                    data_aposta=aposta.data_aposta.isoformat(),
-                    sorteio_id=aposta.sorteio_id,
-                    sorteio_status=aposta.sorteio.status.value if aposta.sorteio else None,
-                    is_winner=aposta.is_winner,
-                    acertos=aposta.acertos,
-                    valor_premio=aposta.valor_premio,
-                    status_display=status_display
+                bet_data = bet_payload(
+                    aposta,
+                    aposta.sorteio.status.value if aposta.sorteio else None,
+                    status_display
                 )
                 
                 # Separar entre ativos e histórico
@@ -364,13 +394,13 @@ async def get_my_bets(telegram_id: int, limit: int = 50):
                 else:
                     historico.append(bet_data)
             
-            return {
+            return FastJSONResponse({
                 "telegram_id": telegram_id,
                 "nome": usuario.nome,
                 "total_apostas": len(apostas),
                 "jogos_ativos": jogos_ativos,
                 "historico": historico
-            }
+            })
         
         except HTTPException:
             raise
@@ -384,7 +414,7 @@ async def get_draw_results(draw_id: int, telegram_id: int):
     """
     Mostra os resultados de um sorteio específico e destaca os acertos do usuário.
     """
-    async with AsyncSessionLocal() as session:
+    async with read_session(telegram_id) as session:
         try:
             # Buscar usuário
             result = await session.execute(
@@ -433,28 +463,17 @@ async def get_draw_results(draw_id: int, telegram_id: int):
                 if sorteio.status == StatusSorteio.ABERTO:
                     status_display = "AGUARDANDO"
                 
-                apostas_response.append(BetResponse(
-                    id=aposta.id,
-                    numeros_brancos=json.loads(aposta.numeros_brancos),
-                    numeros_vermelhos=json.loads(aposta.numeros_vermelhos),
-                    valor_pago=aposta.valor_pago,
-                    data_aposta=aposta.data_aposta.isoformat(),
-                    sorteio_id=aposta.sorteio_id,
-                    sorteio_status=sorteio.status.value,
-                    is_winner=aposta.is_winner,
-                    acertos=aposta.acertos,
-                    valor_premio=aposta.valor_premio,
-                    status_display=status_display
-                ))
-            
-            return DrawResultResponse(
-                sorteio_id=sorteio.id,
-                data_sorteio=sorteio.data.isoformat(),
-                status=sorteio.status.value,
-                numeros_sorteados_brancos=numeros_brancos_sorteados,
-                numeros_sorteados_vermelhos=numeros_vermelhos_sorteados,
-                apostas_usuario=apostas_response
-            )
+                apostas_response.append(bet_payload(aposta, sorteio.status.value, status_display))
+            
+            # Resposta já codificada (o response_model fica apenas para a documentação)
+            return FastJSONResponse({
+                "sorteio_id": sorteio.id,
+                "data_sorteio": sorteio.data.isoformat(),
+                "status": sorteio.status.value,
+                "numeros_sorteados_brancos": numeros_brancos_sorteados,
+                "numeros_sorteados_vermelhos": numeros_vermelhos_sorteados,
+                "apostas_usuario": apostas_response
+            })
         
         except HTTPException:
             raise
@@ -468,7 +487,7 @@ async def get_player_stats(telegram_id: int):
     """
     Retorna estatísticas gerais do jogador.
     """
-    async with AsyncSessionLocal() as session:
+    async with read_session(telegram_id) as session:
         try:
             # Buscar usuário
             result = await session.execute(
@@ -524,7 +543,7 @@ async def get_bet_history(telegram_id: int, limit: int = 20):
     """
     Retorna histórico de apostas do jogador (últimas 20 por padrão).
     """
-    async with AsyncSessionLocal() as session:
+    async with read_session(telegram_id) as session:
         try:
             # Buscar usuário
             result = await session.execute(
@@ -595,7 +614,7 @@ async def get_transaction_history(telegram_id: int, limit: int = 20):
     """
     Retorna histórico de transações (depósitos, saques, apostas, prêmios).
     """
-    async with AsyncSessionLocal() as session:
+    async with read_session(telegram_id) as session:
         try:
             # Buscar usuário
             result = await session.execute(
@@ -610,7 +629,7 @@ async def get_transaction_history(telegram_id: int, limit: int = 20):
             result = await session.execute(
                 select(Transacao)
                 .where(Transacao.usuario_id == usuario.id)
-                .order_by(desc(Transacao.data_criacao))
+                .order_by(desc(Transacao.created_at))
                 .limit(limit)
             )
             transacoes = result.scalars().all()
@@ -646,7 +665,7 @@ async def get_transaction_history(telegram_id: int, limit: int = 20):
                     "descricao": descricao,
                     "icone": icone,
                     "cor": cor,
-                    "data": t.data_criacao.strftime("%d/%m/%Y %H:%M") if t.data_criacao else "",
+                    "data": t.created_at.strftime("%d/%m/%Y %H:%M") if t.created_at else "",
                     "status": t.status
                 })
             
@@ -708,6 +727,24 @@ async def get_bet_price():
             }
 
 
+@router.get("/next-drawing")
+async def get_next_drawing(if_none_match: Optional[str] = Header(None)):
+    """
+    Próximo sorteio oficial e jackpot estimado (público).
+    
+    Servido do snapshot em memória (services/next_drawing.py), sem consultar
+    a fonte por requisição. O countdown é calculado no cliente a partir de draw_at.
+    """
+    await next_drawing_feed.ensure_fresh()
+    headers = {
+        "Cache-Control": f"public, max-age={NEXT_DRAWING_MAX_AGE}, stale-while-revalidate={NEXT_DRAWING_MAX_AGE * 5}",
+        "ETag": next_drawing_feed.etag
+    }
+    if if_none_match == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(next_drawing_feed.snapshot(), headers=headers)
+
+
 # ==================== PERFIL DO USUÁRIO ====================
 
 class ProfileResponse(BaseModel):
@@ -793,6 +830,7 @@ async def archive_account(request: ArchiveAccountRequest):
             usuario.data_arquivamento = datetime.utcnow()
             
             await session.commit()
+            await read_replica.mark_write(request.telegram_id)
             
             return {
                 "message": "Conta arquivada com sucesso. O administrador pode reativá-la a qualquer momento.",
@@ -805,3 +843,60 @@ async def archive_account(request: ArchiveAccountRequest):
             logger.error(f"Erro ao arquivar conta: {e}", exc_info=True)
             raise HTTPException(status_code=500, detail="Erro ao arquivar conta")
 
+
+
+# ==================== EVENTOS EM TEMPO REAL ====================
+
+SSE_HEARTBEAT_SECONDS = 15.0
+
+
+@router.get("/events/{telegram_id}")
+async def stream_events(telegram_id: int, request: Request, last_event_id: Optional[str] = Header(None)):
+    """
+    Canal SSE com eventos do usuário (saldo, apostas e resultados).
+
+    Eventos:
+    - deposit_credited: depósito Pix confirmado
+    - bet_placed: aposta registrada
+    - contest_settled: concurso sorteado com o resultado das apostas do usuário
+    - resync: eventos perdidos; o cliente deve recarregar os dados
+
+    Suporta retomada pelo header Last-Event-ID (enviado automaticamente pelo EventSource).
+    """
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Usuario.id).where(Usuario.telegram_id == telegram_id)
+        )
+        if result.scalar_one_or_none() is None:
+            raise HTTPException(status_code=404, detail="Usuário não encontrado")
+
+    subscription, backlog = realtime_hub.subscribe(telegram_id, last_event_id)
+
+    async def event_stream():
+        try:
+            # Orienta o EventSource a reconectar em 3s se a conexão cair
+            yield "retry: 3000\n\n"
+            for message in backlog:
+                yield format_sse(message)
+            
+            while True:
+                if subscription.overflowed and subscription.queue.empty():
+                    break
+                try:
+                    message = await asyncio.wait_for(subscription.queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                    yield format_sse(message)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+        finally:
+            realtime_hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
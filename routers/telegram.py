@@ -0,0 +1,35 @@
+"""
+Webhook do Telegram.
+
+O aiogram, o Bot e os handlers (routers/bot.py) só são importados no
+primeiro update recebido: processos que servem apenas a API e o admin não
+pagam esse import no cold start.
+"""
+from fastapi import APIRouter, HTTPException, Request
+import logging
+
+from config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.post("/webhook/{token}")
+async def webhook_handler(token: str, request: Request):
+    """Endpoint para receber updates do Telegram"""
+    if token != settings.BOT_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid token")
+
+    try:
+        from aiogram import types
+        from routers.bot import bot, dp
+
+        update_data = await request.json()
+        update = types.Update(**update_data)
+        await dp.feed_update(bot=bot, update=update)
+        return {"ok": True}
+    except Exception as e:
+        logger.error(f"Erro no webhook: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Webhook processing failed")
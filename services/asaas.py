@@ -7,6 +7,8 @@ import logging
 from typing import Optional, Dict, Any
 from datetime import datetime
 from config import get_settings
+from services.http_client import http_clients
+from services.resilience import asaas_policy
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
@@ -15,6 +17,24 @@ logger = logging.getLogger(__name__)
 class AsaasService:
     """Serviço para integração com Asaas"""
     
+    # Timeout de cada tentativa (segundos); a conexão tem limite próprio de 5s
+    TIMEOUTS = {
+        "create_pix_payment": 15.0,
+        "get_pix_qrcode": 10.0,
+        "get_payment_status": 10.0,
+        "create_customer": 15.0,
+        "get_customer": 10.0
+    }
+    
+    # Deadline total por operação, incluindo retentativas (só as consultas GET são retentadas)
+    DEADLINES = {
+        "create_pix_payment": 15.0,
+        "get_pix_qrcode": 20.0,
+        "get_payment_status": 20.0,
+        "create_customer": 15.0,
+        "get_customer": 20.0
+    }
+    
     def __init__(self):
         self.api_url = settings.ASAAS_API_URL
         self.api_key = settings.ASAAS_API_KEY
@@ -23,6 +43,22 @@ class AsaasService:
             "Content-Type": "application/json"
         }
     
+    async def _request(self, operation: str, method: str, url: str, idempotent: bool = False, **kwargs) -> httpx.Response:
+        """Requisição ao Asaas sob a política de resiliência (deadline, retentativas, breaker, bulkhead)"""
+        async def send() -> httpx.Response:
+            client = http_clients.get("asaas")
+            response = await client.request(
+                method,
+                url,
+                headers=self.headers,
+                timeout=self.TIMEOUTS[operation],
+                **kwargs
+            )
+            response.raise_for_status()
+            return response
+        
+        return await asaas_policy.call(operation, send, deadline=self.DEADLINES[operation], idempotent=idempotent)
+    
     async def create_pix_payment(
         self,
         customer_id: str,
@@ -54,18 +90,11 @@ class AsaasService:
         }
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    url,
-                    json=payload,
-                    headers=self.headers,
-                    timeout=30.0
-                )
-                response.raise_for_status()
-                data = response.json()
+            response = await self._request("create_pix_payment", "POST", url, json=payload, idempotent=False)
+            data = response.json()
                 
-                logger.info(f"Cobrança Pix criada no Asaas: {data.get('id')}")
-                return data
+            logger.info(f"Cobrança Pix criada no Asaas: {data.get('id')}")
+            return data
         
         except httpx.HTTPStatusError as e:
             logger.error(f"Erro HTTP ao criar cobrança Pix: {e.response.status_code} - {e.response.text}")
@@ -87,17 +116,11 @@ class AsaasService:
         url = f"{self.api_url}/payments/{payment_id}/pixQrCode"
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    url,
-                    headers=self.headers,
-                    timeout=30.0
-                )
-                response.raise_for_status()
-                data = response.json()
+            response = await self._request("get_pix_qrcode", "GET", url, idempotent=True)
+            data = response.json()
                 
-                logger.info(f"QR Code Pix obtido para cobrança: {payment_id}")
-                return data
+            logger.info(f"QR Code Pix obtido para cobrança: {payment_id}")
+            return data
         
         except httpx.HTTPStatusError as e:
             logger.error(f"Erro ao obter QR Code: {e.response.status_code} - {e.response.text}")
@@ -119,16 +142,10 @@ class AsaasService:
         url = f"{self.api_url}/payments/{payment_id}"
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    url,
-                    headers=self.headers,
-                    timeout=30.0
-                )
-                response.raise_for_status()
-                data = response.json()
+            response = await self._request("get_payment_status", "GET", url, idempotent=True)
+            data = response.json()
                 
-                return data
+            return data
         
         except httpx.HTTPStatusError as e:
             logger.error(f"Erro ao consultar status: {e.response.status_code} - {e.response.text}")
@@ -173,18 +190,11 @@ class AsaasService:
             payload["phone"] = phone
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    url,
-                    json=payload,
-                    headers=self.headers,
-                    timeout=30.0
-                )
-                response.raise_for_status()
-                data = response.json()
+            response = await self._request("create_customer", "POST", url, json=payload, idempotent=False)
+            data = response.json()
                 
-                logger.info(f"Cliente criado no Asaas: {data.get('id')}")
-                return data
+            logger.info(f"Cliente criado no Asaas: {data.get('id')}")
+            return data
         
         except httpx.HTTPStatusError as e:
             logger.error(f"Erro ao criar cliente: {e.response.status_code} - {e.response.text}")
@@ -193,12 +203,18 @@ class AsaasService:
             logger.error(f"Erro ao criar cliente: {e}")
             raise
     
-    async def get_customer_by_external_reference(self, external_reference: str) -> Optional[Dict[str, Any]]:
+    async def get_customer_by_external_reference(
+        self,
+        external_reference: str,
+        strict: bool = False
+    ) -> Optional[Dict[str, Any]]:
         """
         Busca cliente por referência externa
         
         Args:
             external_reference: Referência externa (ex: telegram_id)
+            strict: Propaga erros em vez de retornar None (evita criar
+                cliente duplicado quando a busca falha)
         
         Returns:
             Dict com dados do cliente ou None
@@ -207,22 +223,17 @@ class AsaasService:
         params = {"externalReference": external_reference}
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    url,
-                    headers=self.headers,
-                    params=params,
-                    timeout=30.0
-                )
-                response.raise_for_status()
-                data = response.json()
+            response = await self._request("get_customer", "GET", url, params=params, idempotent=True)
+            data = response.json()
                 
-                if data.get("data") and len(data["data"]) > 0:
-                    return data["data"][0]
-                return None
+            if data.get("data") and len(data["data"]) > 0:
+                return data["data"][0]
+            return None
         
         except Exception as e:
             logger.error(f"Erro ao buscar cliente: {e}")
+            if strict:
+                raise
             return None
     
     def validate_webhook_signature(self, payload: str, signature: str) -> bool:
@@ -0,0 +1,160 @@
+"""
+Cliente Asaas persistido no usuário.
+
+O id do cliente Asaas fica em Usuario.asaas_customer_id: só o primeiro
+depósito (ou o backfill em lote) consulta/cria o cliente no gateway.
+
+Single-flight:
+- no processo, depósitos simultâneos do mesmo usuário aguardam a mesma tarefa
+- entre workers, advisory lock por usuário (pg_advisory_lock(namespace, id))
+  numa conexão direta, fora do pool da aplicação: quem chega depois espera e
+  encontra o id já gravado, sem criar outro cliente no Asaas
+"""
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from sqlalchemy import select, text, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm.attributes import set_committed_value
+
+from config import get_settings
+from database import AsyncSessionLocal, Usuario, direct_engine, normalize_digits
+from services.asaas import asaas_service
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+CUSTOMER_LOCK_NAMESPACE = 7310032  # pg_advisory_lock(namespace, usuario_id): um cliente por usuário
+
+_inflight: Dict[int, asyncio.Task] = {}
+
+
+async def _resolve_customer_id(usuario_id: int) -> str:
+    if make_url(settings.DATABASE_URL).get_backend_name() != "postgresql":
+        return await _link_customer_id(usuario_id)
+
+    # Conexão dedicada segura o lock do usuário durante as chamadas ao Asaas
+    async with direct_engine.connect() as conn:
+        await conn.execute(
+            text("SELECT pg_advisory_lock(:namespace, :usuario_id)"),
+            {"namespace": CUSTOMER_LOCK_NAMESPACE, "usuario_id": usuario_id}
+        )
+        # O lock é da sessão: encerra a transação para a conexão não ficar "idle in transaction"
+        await conn.commit()
+        try:
+            return await _link_customer_id(usuario_id)
+        finally:
+            await conn.execute(
+                text("SELECT pg_advisory_unlock(:namespace, :usuario_id)"),
+                {"namespace": CUSTOMER_LOCK_NAMESPACE, "usuario_id": usuario_id}
+            )
+            await conn.commit()
+
+
+async def _link_customer_id(usuario_id: int) -> str:
+    """Busca/cria o cliente no Asaas e grava no usuário (chamado com o lock do usuário)"""
+    async with AsyncSessionLocal() as session:
+        usuario = await session.get(Usuario, usuario_id)
+        if not usuario:
+            raise ValueError(f"Usuário {usuario_id} não encontrado")
+        if usuario.asaas_customer_id:
+            return usuario.asaas_customer_id
+        nome = usuario.nome
+        cpf_cnpj = usuario.cpf_digitos or normalize_digits(usuario.cpf)
+        phone = usuario.telefone_digitos or normalize_digits(usuario.telefone)
+        external_reference = str(usuario.telegram_id)
+
+    # Nenhuma conexão do pool aberta durante as chamadas ao gateway
+    customer = await asaas_service.get_customer_by_external_reference(external_reference, strict=True)
+    if not customer:
+        customer = await asaas_service.create_customer(
+            name=nome,
+            cpf_cnpj=cpf_cnpj,
+            phone=phone,
+            external_reference=external_reference
+        )
+
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            update(Usuario)
+            .where(Usuario.id == usuario_id, Usuario.asaas_customer_id.is_(None))
+            .values(asaas_customer_id=customer["id"])
+        )
+        await session.commit()
+        if result.rowcount:
+            logger.info(f"Cliente Asaas {customer['id']} vinculado ao usuário {usuario_id}")
+            return customer["id"]
+
+        # Gravado por fora do lock (ex.: admin): o id já gravado vale
+        return (await session.execute(
+            select(Usuario.asaas_customer_id).where(Usuario.id == usuario_id)
+        )).scalar_one()
+
+
+async def get_or_create_customer_id(usuario: Usuario) -> str:
+    """
+    Retorna o id do cliente Asaas do usuário, buscando/criando apenas se
+    ainda não estiver gravado.
+    """
+    if usuario.asaas_customer_id:
+        return usuario.asaas_customer_id
+
+    usuario_id = usuario.id
+    task = _inflight.get(usuario_id)
+    # Tarefa de outro event loop (invocação serverless anterior) não pode ser aguardada aqui
+    if task is None or task.get_loop() is not asyncio.get_running_loop():
+        task = asyncio.ensure_future(_resolve_customer_id(usuario_id))
+        _inflight[usuario_id] = task
+        task.add_done_callback(lambda _: _inflight.pop(usuario_id, None))
+
+    # shield: o cancelamento de um chamador não derruba a tarefa dos outros
+    customer_id = await asyncio.shield(task)
+    # Já gravado pela tarefa; só atualiza a instância do chamador sem gerar outro UPDATE
+    set_committed_value(usuario, "asaas_customer_id", customer_id)
+    return customer_id
+
+
+async def backfill_customer_ids(batch_size: int = 100, concurrency: int = 5, limit: Optional[int] = None) -> Dict[str, int]:
+    """
+    Preenche asaas_customer_id de usuários com CPF que ainda não têm o id,
+    em lotes por id crescente (keyset) e com concorrência limitada no gateway.
+    """
+    stats = {"processados": 0, "vinculados": 0, "erros": 0}
+    semaphore = asyncio.Semaphore(concurrency)
+    last_id = 0
+
+    async def process(usuario_id: int):
+        async with semaphore:
+            try:
+                await _resolve_customer_id(usuario_id)
+                stats["vinculados"] += 1
+            except Exception as e:
+                stats["erros"] += 1
+                logger.error(f"Erro no backfill do cliente Asaas (usuário {usuario_id}): {e}")
+
+    while limit is None or stats["processados"] < limit:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(Usuario.id)
+                .where(
+                    Usuario.asaas_customer_id.is_(None),
+                    Usuario.cpf.isnot(None),
+                    Usuario.id > last_id
+                )
+                .order_by(Usuario.id)
+                .limit(batch_size)
+            )
+            ids = list(result.scalars().all())
+
+        if not ids:
+            break
+        if limit is not None:
+            ids = ids[:limit - stats["processados"]]
+
+        await asyncio.gather(*(process(usuario_id) for usuario_id in ids))
+        stats["processados"] += len(ids)
+        last_id = ids[-1]
+        logger.info(f"Backfill clientes Asaas: {stats}")
+
+    return stats
@@ -0,0 +1,304 @@
+"""
+Apuração automática dos concursos na hora do sorteio oficial.
+
+A partir de Concurso.data_sorteio_prevista o agendador procura o resultado
+oficial do sorteio correspondente (primeiro no histórico official_draws,
+depois nas fontes ao vivo) e apura o concurso com services/settlement.py.
+
+- Enquanto o resultado não aparece, novas tentativas com backoff exponencial
+- AUTO_SETTLEMENT_MODE="hold": o resultado encontrado fica aguardando a
+  aprovação do admin; "auto": apura sozinho, mas só com o resultado do
+  official_draws ou com duas fontes ao vivo (com a data publicada, não
+  inferida) trazendo os mesmos números. Fontes divergentes sempre aguardam
+  aprovação
+- Apenas um worker apura por vez (advisory lock do PostgreSQL)
+"""
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import select, text
+from sqlalchemy.engine import make_url
+
+from config import get_settings
+from database import AsyncSessionLocal, Concurso, StatusConcurso, direct_engine
+from schemas import DrawNumbersSchema
+from services.official_draws import contest_draw_at, contest_draw_date, find_official_draw
+from services.powerball_results import powerball_service, result_date
+from services.settlement import SettlementError, settle_contest
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+LEADER_LOCK_KEY = 7310043  # pg_advisory_lock: um agendador por vez
+
+# (números, fonte, divergências entre fontes, confirmado: pode ser apurado sem aprovação)
+OfficialResult = Tuple[DrawNumbersSchema, str, List[Dict], bool]
+
+
+class AutoSettlementScheduler:
+    """Apura concursos vencidos assim que o resultado oficial é publicado"""
+
+    MAX_RECENT = 20
+
+    def __init__(self, mode: str, poll_interval: float, backoff_base: float, backoff_max: float):
+        self.mode = mode
+        self.poll_interval = poll_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._task: Optional[asyncio.Task] = None
+        self._running = asyncio.Lock()
+        self._attempts: Dict[int, Dict] = {}  # concurso_id -> tentativas sem resultado
+        self._awaiting: Dict[int, Dict] = {}  # concurso_id -> resultado aguardando aprovação
+        self._recent: List[Dict] = []
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+            logger.info(f"Apuração automática iniciada (modo {self.mode})")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erro na apuração automática: {e}", exc_info=True)
+            await asyncio.sleep(self.poll_interval)
+
+    async def run_once(self) -> bool:
+        """Verifica os concursos vencidos; False se outro worker já estiver verificando"""
+        if self._running.locked():
+            return False
+        async with self._running:
+            if make_url(settings.DATABASE_URL).get_backend_name() != "postgresql":
+                await self._check_due_contests()
+                return True
+
+            # Conexão dedicada segura o advisory lock durante a verificação
+            async with direct_engine.connect() as conn:
+                result = await conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": LEADER_LOCK_KEY})
+                adquirido = result.scalar()
+                # O lock é da sessão: encerra a transação para a conexão não ficar
+                # "idle in transaction" (e ser derrubada pelo servidor) durante a passada
+                await conn.commit()
+                if not adquirido:
+                    return False
+                try:
+                    await self._check_due_contests()
+                    return True
+                finally:
+                    await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": LEADER_LOCK_KEY})
+                    await conn.commit()
+
+    async def _check_due_contests(self):
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(Concurso).where(
+                    Concurso.is_active == True,
+                    Concurso.is_drawn == False,
+                    Concurso.status == StatusConcurso.ATIVO,
+                    Concurso.data_sorteio_prevista.isnot(None)
+                )
+            )
+            concursos = result.scalars().all()
+
+        agora = datetime.now(timezone.utc)
+        ativos = set()
+        for concurso in concursos:
+            ativos.add(concurso.id)
+            if contest_draw_at(concurso) > agora or concurso.id in self._awaiting:
+                continue
+            tentativa = self._attempts.get(concurso.id)
+            if tentativa and time.monotonic() < tentativa["proxima_em"]:
+                continue
+            await self._process(concurso)
+
+        # Concursos apurados manualmente, cancelados ou editados saem do acompanhamento
+        for concurso_id in set(self._attempts) - ativos:
+            del self._attempts[concurso_id]
+        for concurso_id in set(self._awaiting) - ativos:
+            del self._awaiting[concurso_id]
+
+    async def _process(self, concurso: Concurso):
+        try:
+            encontrado = await self.find_result(concurso)
+        except Exception as e:
+            logger.error(f"Apuração automática: erro ao buscar resultado do concurso #{concurso.id}: {e}", exc_info=True)
+            encontrado = None
+
+        if encontrado is None:
+            self._backoff(concurso.id)
+            return
+
+        numeros, fonte, divergencias, confirmado = encontrado
+        if self.mode == "auto" and not divergencias and not confirmado:
+            # Uma fonte só (ou data inferida): espera o histórico oficial ou outra fonte confirmar
+            self._backoff(concurso.id)
+            self._attempts[concurso.id]["nao_confirmado"] = {"numeros_sorteados": numeros.model_dump(), "fonte": fonte}
+            logger.info(f"Concurso #{concurso.id}: resultado de {fonte} ainda sem confirmação de outra fonte")
+            return
+
+        self._attempts.pop(concurso.id, None)
+        if self.mode != "auto" or divergencias:
+            self._awaiting[concurso.id] = {
+                "concurso_id": concurso.id,
+                "titulo": concurso.titulo,
+                "numeros_sorteados": numeros.model_dump(),
+                "fonte": fonte,
+                "divergencias": divergencias,
+                "encontrado_em": datetime.utcnow().isoformat()
+            }
+            logger.warning(f"Concurso #{concurso.id}: resultado oficial encontrado ({fonte}), aguardando aprovação do admin")
+            return
+
+        try:
+            await self._settle(concurso.id, numeros, fonte, aprovado_por=None)
+        except SettlementError:
+            pass
+        except Exception as e:
+            logger.error(f"Apuração automática: erro ao apurar o concurso #{concurso.id}: {e}", exc_info=True)
+            self._backoff(concurso.id)
+
+    def _backoff(self, concurso_id: int):
+        tentativa = self._attempts.setdefault(concurso_id, {"tentativas": 0, "desde": datetime.utcnow().isoformat()})
+        tentativa["tentativas"] += 1
+        espera = min(self.backoff_max, self.backoff_base * 2 ** (tentativa["tentativas"] - 1))
+        tentativa["proxima_em"] = time.monotonic() + espera
+        tentativa["proxima_em_segundos"] = round(espera)
+
+    async def find_result(self, concurso: Concurso) -> Optional[OfficialResult]:
+        """Resultado oficial do sorteio do concurso (None se ainda não publicado)"""
+        draw_date = contest_draw_date(concurso)
+        if draw_date is None:
+            return None
+
+        async with AsyncSessionLocal() as session:
+            draw = await find_official_draw(session, draw_date)
+        if draw:
+            return self._validate(concurso.id, json.loads(draw.numeros_sorteados()), "official_draws", [], True)
+
+        latest = await powerball_service.get_latest_result()
+        if latest and result_date(latest) != draw_date:
+            # O cache ainda tem o sorteio anterior: força a consulta às fontes
+            latest = await powerball_service.get_latest_result(force_refresh=True)
+        if not latest or result_date(latest) != draw_date:
+            return None
+
+        divergencias = latest.get("divergencias", [])
+        confirmado = False
+        if self.mode == "auto" and not divergencias:
+            confirmado, divergencias = await self._confirm(latest, draw_date)
+        return self._validate(
+            concurso.id,
+            {"white": latest["white"], "powerball": latest["powerball"]},
+            latest.get("fonte", "powerball"),
+            divergencias,
+            confirmado
+        )
+
+    async def _confirm(self, latest: Dict, draw_date) -> Tuple[bool, List[Dict]]:
+        """
+        Confere o resultado ao vivo em todas as fontes. Confirmado quando ao
+        menos duas, com a data do sorteio publicada (não inferida pelo
+        calendário), trazem os mesmos números e nenhuma diverge.
+        """
+        por_fonte = await powerball_service.results_by_source()
+        datados = {
+            nome: r for nome, r in por_fonte.items()
+            if not r.get("data_inferida") and result_date(r) == draw_date
+        }
+        iguais = [
+            nome for nome, r in datados.items()
+            if r["white"] == latest["white"] and r["powerball"] == latest["powerball"]
+        ]
+        divergencias = [
+            {"fonte": nome, "white": r["white"], "powerball": r["powerball"]}
+            for nome, r in datados.items() if nome not in iguais
+        ]
+        return len(iguais) >= 2 and not divergencias, divergencias
+
+    def _validate(
+        self,
+        concurso_id: int,
+        numeros: Dict,
+        fonte: str,
+        divergencias: List[Dict],
+        confirmado: bool
+    ) -> Optional[OfficialResult]:
+        try:
+            return DrawNumbersSchema(**numeros), fonte, divergencias, confirmado
+        except ValidationError as e:
+            logger.error(f"Concurso #{concurso_id}: resultado de {fonte} inválido para apuração: {e}")
+            return None
+
+    async def approve(self, concurso_id: int, admin_username: str) -> Dict:
+        """Apura com o resultado oficial aprovado pelo admin (busca de novo, em qualquer worker)"""
+        async with AsyncSessionLocal() as session:
+            concurso = await session.get(Concurso, concurso_id)
+        if not concurso:
+            raise SettlementError("Concurso não encontrado", status_code=404)
+
+        encontrado = await self.find_result(concurso)
+        if encontrado is None:
+            raise SettlementError("Resultado oficial ainda não disponível para a data prevista", status_code=409)
+
+        numeros, fonte, _, _ = encontrado
+        return await self._settle(concurso_id, numeros, fonte, aprovado_por=admin_username)
+
+    async def _settle(self, concurso_id: int, numeros: DrawNumbersSchema, fonte: str, aprovado_por: Optional[str]) -> Dict:
+        async with AsyncSessionLocal() as session:
+            try:
+                resumo = await settle_contest(session, concurso_id, numeros)
+            except SettlementError as e:
+                await session.rollback()
+                # Já apurado (ex: manualmente) ou desativado: nada mais a fazer
+                self._attempts.pop(concurso_id, None)
+                self._awaiting.pop(concurso_id, None)
+                logger.info(f"Apuração automática do concurso #{concurso_id} ignorada: {e}")
+                raise
+            except Exception:
+                await session.rollback()
+                raise
+
+        self._awaiting.pop(concurso_id, None)
+        resumo = {**resumo, "fonte": fonte, "aprovado_por": aprovado_por, "apurado_em": datetime.utcnow().isoformat()}
+        self._recent = [resumo] + self._recent[:self.MAX_RECENT - 1]
+        logger.info(f"✓ Concurso #{concurso_id} apurado automaticamente ({fonte}): {resumo['ganhadores']} ganhador(es)")
+        return resumo
+
+    def stats(self) -> Dict:
+        return {
+            "modo": self.mode,
+            "ativo": self._task is not None,
+            "em_execucao": self._running.locked(),
+            "aguardando_resultado": {
+                concurso_id: {k: v for k, v in tentativa.items() if k != "proxima_em"}
+                for concurso_id, tentativa in self._attempts.items()
+            },
+            "aguardando_aprovacao": list(self._awaiting.values()),
+            "apurados_recentes": self._recent
+        }
+
+
+# Instância global
+auto_settlement = AutoSettlementScheduler(
+    mode=settings.AUTO_SETTLEMENT_MODE,
+    poll_interval=settings.AUTO_SETTLEMENT_POLL_SECONDS,
+    backoff_base=settings.AUTO_SETTLEMENT_BACKOFF_SECONDS,
+    backoff_max=settings.AUTO_SETTLEMENT_BACKOFF_MAX_SECONDS
+)
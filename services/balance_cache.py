@@ -0,0 +1,162 @@
+"""
+Cache de saldo por usuário (write-through).
+
+O saldo é lido muito mais do que muda (/finance/balance, /saldo do bot).
+Cada caminho que altera o saldo grava o novo valor aqui logo após o commit:
+crédito de depósito (services/payments.py), débito de aposta (bot),
+saldo adicionado pelo admin e prêmio do sorteio. Na leitura, um acerto não
+abre sessão com o banco; só a falta vai ao banco.
+
+Entre workers, cada gravação envia um NOTIFY que invalida a entrada nos
+demais (que relêem do banco na próxima consulta). O TTL limita o tempo de
+uma entrada desatualizada caso um NOTIFY se perca (ponte reconectando).
+"""
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from sqlalchemy import select
+
+from config import get_settings
+from database import AsyncSessionLocal, Usuario
+from services.pg_notify import pg_bridge, PgNotifyBridge
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedBalance:
+    telegram_id: int
+    nome: Optional[str]
+    saldo: float
+    expires_at: float
+
+
+class BalanceCache:
+    """Saldo por telegram_id, com invalidação entre workers via LISTEN/NOTIFY"""
+
+    CHANNEL = "balance_cache"
+
+    def __init__(self, bridge: PgNotifyBridge, ttl: float, max_users: int):
+        self.bridge = bridge
+        self.ttl = ttl
+        self.max_users = max_users
+        self._entries: "OrderedDict[int, CachedBalance]" = OrderedDict()
+        # Geração por usuário: uma leitura do banco iniciada antes de uma
+        # gravação não pode sobrescrever o valor mais novo
+        self._generations: Dict[int, int] = {}
+        self._origin = uuid.uuid4().hex
+        self._stats = {"acertos": 0, "faltas": 0, "gravacoes": 0, "invalidacoes_remotas": 0}
+        bridge.subscribe(self.CHANNEL, self._on_notify)
+
+    def get(self, telegram_id: int) -> Optional[CachedBalance]:
+        """Entrada válida do cache, sem acessar o banco"""
+        entry = self._entries.get(telegram_id)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            del self._entries[telegram_id]
+            return None
+        self._entries.move_to_end(telegram_id)
+        return entry
+
+    async def get_or_load(self, telegram_id: int) -> Optional[CachedBalance]:
+        """Saldo do cache ou, na falta, do banco (None se o usuário não existe)"""
+        entry = self.get(telegram_id)
+        if entry is not None:
+            self._stats["acertos"] += 1
+            return entry
+
+        self._stats["faltas"] += 1
+        generation = self._generations.get(telegram_id, 0)
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(Usuario.nome, Usuario.saldo).where(Usuario.telegram_id == telegram_id)
+            )
+            row = result.one_or_none()
+        if row is None:
+            return None
+
+        entry = self._build(telegram_id, row.nome, row.saldo)
+        if self._generations.get(telegram_id, 0) == generation:
+            self._put(entry)
+        return entry
+
+    async def set(self, telegram_id: int, nome: Optional[str], saldo: float):
+        """
+        Grava o saldo já commitado e invalida a entrada nos outros workers.
+
+        Deve ser chamado após o commit; falhas são registradas e nunca
+        propagadas para o fluxo principal.
+        """
+        self._bump(telegram_id)
+        self._put(self._build(telegram_id, nome, saldo))
+        self._stats["gravacoes"] += 1
+        await self._broadcast(telegram_id)
+
+    async def invalidate(self, telegram_id: int):
+        """Descarta a entrada (ex: nome alterado) neste e nos outros workers"""
+        self._bump(telegram_id)
+        self._entries.pop(telegram_id, None)
+        await self._broadcast(telegram_id)
+
+    def _build(self, telegram_id: int, nome: Optional[str], saldo: Optional[float]) -> CachedBalance:
+        return CachedBalance(
+            telegram_id=telegram_id,
+            nome=nome,
+            saldo=float(saldo or 0.0),
+            expires_at=time.monotonic() + self.ttl
+        )
+
+    def _put(self, entry: CachedBalance):
+        self._entries[entry.telegram_id] = entry
+        self._entries.move_to_end(entry.telegram_id)
+        while len(self._entries) > self.max_users:
+            evicted, _ = self._entries.popitem(last=False)
+            self._generations.pop(evicted, None)
+
+    def _bump(self, telegram_id: int):
+        self._generations[telegram_id] = self._generations.get(telegram_id, 0) + 1
+
+    async def _broadcast(self, telegram_id: int):
+        try:
+            payload = json.dumps({"origin": self._origin, "telegram_id": telegram_id})
+            await self.bridge.notify(self.CHANNEL, payload)
+        except Exception as e:
+            logger.error(f"Erro ao invalidar saldo em cache de {telegram_id}: {e}", exc_info=True)
+
+    def _on_notify(self, payload: str):
+        try:
+            message = json.loads(payload)
+        except Exception as e:
+            logger.error(f"Payload de invalidação de saldo inválido: {e}")
+            return
+        if message.get("origin") == self._origin:
+            return
+        telegram_id = message["telegram_id"]
+        self._bump(telegram_id)
+        if self._entries.pop(telegram_id, None) is not None:
+            self._stats["invalidacoes_remotas"] += 1
+
+    def stats(self) -> Dict:
+        consultas = self._stats["acertos"] + self._stats["faltas"]
+        return {
+            **self._stats,
+            "usuarios": len(self._entries),
+            "taxa_acerto": round(self._stats["acertos"] / consultas, 3) if consultas else None,
+            "ttl_segundos": self.ttl,
+            "invalidacao_entre_workers": self.bridge.connected
+        }
+
+
+# Instância global
+balance_cache = BalanceCache(
+    pg_bridge,
+    ttl=settings.BALANCE_CACHE_TTL_SECONDS,
+    max_users=settings.BALANCE_CACHE_MAX_USERS
+)
@@ -0,0 +1,223 @@
+"""
+Pool de conexões do SQLAlchemy: configuração e métricas.
+
+- Tamanho, overflow, timeout, recycle, pre-ping e cache de prepared
+  statements do asyncpg vêm de config.Settings (DB_*)
+- DB_PGBOUNCER=true: compatível com PgBouncer em modo transaction (NullPool,
+  sem cache de prepared statements e nomes únicos por statement); o pool de
+  verdade fica no PgBouncer. Nesse modo cada transação pode cair numa
+  conexão diferente do servidor: LISTEN/NOTIFY e os advisory locks de sessão
+  (migrações, reconciliação, resultados oficiais, apuração automática)
+  precisam de DATABASE_DIRECT_URL apontando para o PostgreSQL (ou um
+  PgBouncer em modo session)
+- SERVERLESS=true: NullPool também; cada invocação abre e fecha as suas
+  conexões (uma instância parada ou com event loop novo não herda conexões
+  de invocações anteriores). Com um pooler externo (PgBouncer, Supavisor,
+  pooler do Neon) em modo transaction, use junto DB_PGBOUNCER=true e
+  DATABASE_DIRECT_URL
+- Métricas por worker: checkouts, histograma do tempo de espera por uma
+  conexão, uso de overflow, timeouts e conexões vazadas (sessões
+  AsyncSessionLocal() nunca fechadas: a conexão só volta pelo garbage
+  collector, que no asyncio a descarta)
+"""
+import logging
+import time
+from typing import Any, Dict
+from uuid import uuid4
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+
+from config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class PoolMetrics:
+    """Contadores do pool de conexões (deste worker)"""
+
+    WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+    CHECKOUT_KEY = "checkout_em"
+
+    def __init__(self, leak_threshold: float):
+        self.leak_threshold = leak_threshold
+        self._engine = None
+        self._in_use: Dict[int, Any] = {}  # id(connection_record) -> connection_record
+        self.checkouts = 0
+        self.checkouts_em_overflow = 0
+        self.pico_em_uso = 0
+        self.pico_overflow = 0
+        self.timeouts = 0
+        self.conexoes_abertas = 0
+        self.conexoes_invalidadas = 0
+        self.vazamentos = 0
+        self._wait_counts = [0] * (len(self.WAIT_BUCKETS_MS) + 1)
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def attach(self, engine):
+        """Registra os listeners no pool do engine (sobrevivem a engine.dispose())"""
+        self._engine = engine
+        sync_engine = engine.sync_engine
+        event.listen(sync_engine, "connect", self._on_connect)
+        event.listen(sync_engine, "checkout", self._on_checkout)
+        event.listen(sync_engine, "checkin", self._on_checkin)
+        event.listen(sync_engine, "detach", self._on_detach)
+        event.listen(sync_engine, "invalidate", self._on_invalidate)
+
+    def observe_wait(self, seconds: float, timed_out: bool = False):
+        """Tempo até o pool entregar uma conexão (inclui abrir uma nova)"""
+        if timed_out:
+            self.timeouts += 1
+        ms = seconds * 1000
+        bucket = next((i for i, limite in enumerate(self.WAIT_BUCKETS_MS) if ms <= limite), len(self.WAIT_BUCKETS_MS))
+        self._wait_counts[bucket] += 1
+        self._wait_total += seconds
+        self._wait_max = max(self._wait_max, seconds)
+
+    def _overflow_in_use(self) -> int:
+        pool = self._engine.sync_engine.pool if self._engine else None
+        return max(0, pool.overflow()) if isinstance(pool, AsyncAdaptedQueuePool) else 0
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        self.conexoes_abertas += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.checkouts += 1
+        connection_record.info[self.CHECKOUT_KEY] = time.monotonic()
+        self._in_use[id(connection_record)] = connection_record
+        self.pico_em_uso = max(self.pico_em_uso, len(self._in_use))
+        overflow = self._overflow_in_use()
+        if overflow:
+            self.checkouts_em_overflow += 1
+            self.pico_overflow = max(self.pico_overflow, overflow)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        if connection_record is not None:
+            connection_record.info.pop(self.CHECKOUT_KEY, None)
+            self._in_use.pop(id(connection_record), None)
+
+    def _on_detach(self, dbapi_connection, connection_record):
+        # Sessões do app nunca chamam detach(): conexão ainda em uso aqui foi coletada pelo GC
+        desde = connection_record.info.pop(self.CHECKOUT_KEY, None)
+        self._in_use.pop(id(connection_record), None)
+        if desde is not None:
+            self.vazamentos += 1
+            logger.warning(
+                f"Conexão do pool vazada (sessão não fechada) após {time.monotonic() - desde:.1f}s em uso"
+            )
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        self.conexoes_invalidadas += 1
+
+    def stats(self) -> Dict:
+        agora = time.monotonic()
+        idades = [agora - record.info.get(self.CHECKOUT_KEY, agora) for record in list(self._in_use.values())]
+        pool = self._engine.sync_engine.pool if self._engine else None
+        observadas = sum(self._wait_counts)
+        histograma = {f"<={limite}ms": n for limite, n in zip(self.WAIT_BUCKETS_MS, self._wait_counts)}
+        histograma[f">{self.WAIT_BUCKETS_MS[-1]}ms"] = self._wait_counts[-1]
+        return {
+            "pool": type(pool).__name__ if pool else None,
+            "status": pool.status() if pool else None,
+            "configuracao": {
+                "pgbouncer": settings.DB_PGBOUNCER,
+                "serverless": settings.SERVERLESS,
+                "conexao_direta": bool(settings.DATABASE_DIRECT_URL),
+                "pool_size": settings.DB_POOL_SIZE,
+                "max_overflow": settings.DB_MAX_OVERFLOW,
+                "timeout_segundos": settings.DB_POOL_TIMEOUT_SECONDS,
+                "recycle_segundos": settings.DB_POOL_RECYCLE_SECONDS,
+                "pre_ping": settings.DB_POOL_PRE_PING,
+                "statement_cache_size": 0 if settings.DB_PGBOUNCER else settings.DB_STATEMENT_CACHE_SIZE
+            },
+            "em_uso": len(idades),
+            "pico_em_uso": self.pico_em_uso,
+            "overflow_em_uso": self._overflow_in_use(),
+            "pico_overflow": self.pico_overflow,
+            "checkouts": self.checkouts,
+            "checkouts_em_overflow": self.checkouts_em_overflow,
+            "espera": {
+                "media_ms": round(self._wait_total / observadas * 1000, 2) if observadas else 0.0,
+                "max_ms": round(self._wait_max * 1000, 2),
+                "histograma": histograma
+            },
+            "timeouts": self.timeouts,
+            "conexoes_abertas": self.conexoes_abertas,
+            "conexoes_invalidadas": self.conexoes_invalidadas,
+            "vazamentos": self.vazamentos,
+            # Sessões abertas há mais que DB_POOL_LEAK_SECONDS: provável bloco sem fechar
+            "suspeitas_de_vazamento": sum(1 for idade in idades if idade > self.leak_threshold),
+            "uso_mais_longo_segundos": round(max(idades), 1) if idades else 0.0
+        }
+
+
+# Instâncias globais (a da réplica só recebe dados com DATABASE_REPLICA_URL)
+pool_metrics = PoolMetrics(leak_threshold=settings.DB_POOL_LEAK_SECONDS)
+replica_pool_metrics = PoolMetrics(leak_threshold=settings.DB_POOL_LEAK_SECONDS)
+
+
+class _TimedCheckoutMixin:
+    """Mede quanto cada checkout esperou pelo pool"""
+
+    metrics: PoolMetrics = pool_metrics
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.observe_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        self.metrics.observe_wait(time.perf_counter() - started)
+        return connection
+
+
+class InstrumentedQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+class InstrumentedNullPool(_TimedCheckoutMixin, NullPool):
+    pass
+
+
+def engine_options(database_url: str, metrics: PoolMetrics = pool_metrics) -> Dict[str, Any]:
+    """Argumentos do create_async_engine para o pool configurado em Settings"""
+    postgres = make_url(database_url).get_backend_name() == "postgresql"
+
+    if settings.DB_PGBOUNCER and postgres and not settings.DATABASE_DIRECT_URL:
+        logger.warning(
+            "DB_PGBOUNCER=true sem DATABASE_DIRECT_URL: LISTEN/NOTIFY e advisory locks "
+            "passam pelo PgBouncer em modo transaction e deixam de funcionar"
+        )
+
+    if settings.DB_PGBOUNCER or settings.SERVERLESS:
+        options: Dict[str, Any] = {
+            "poolclass": type("InstrumentedNullPool", (InstrumentedNullPool,), {"metrics": metrics})
+        }
+        if postgres and settings.DB_PGBOUNCER:
+            options["connect_args"] = {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__"
+            }
+        return options
+
+    if not postgres:
+        return {}  # SQLite (testes locais): pool padrão do dialeto
+
+    return {
+        "poolclass": type("InstrumentedQueuePool", (InstrumentedQueuePool,), {"metrics": metrics}),
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "connect_args": {
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE
+        }
+    }
@@ -0,0 +1,89 @@
+"""
+Clientes HTTP compartilhados (keep-alive, pool de conexões e HTTP/2).
+
+Cada integração externa usa um cliente nomeado de longa duração em vez de
+abrir um httpx.AsyncClient por chamada, evitando um handshake TCP/TLS a cada
+requisição. Os clientes são fechados no shutdown da aplicação (lifespan).
+"""
+import asyncio
+import logging
+from typing import Any, Dict, Tuple
+
+import httpx
+
+from config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class HTTPClientManager:
+    """Registro de clientes httpx nomeados, criados sob demanda"""
+
+    def __init__(self):
+        # Cliente, loop em que foi criado e a tarefa que o fecha quando esse loop termina
+        self._clients: Dict[str, Tuple[httpx.AsyncClient, asyncio.AbstractEventLoop, asyncio.Task]] = {}
+        self._options: Dict[str, Dict[str, Any]] = {}
+
+    def configure(self, name: str, **options):
+        """Define as opções (base_url, headers, verify...) de um cliente nomeado"""
+        self._options[name] = options
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """Retorna o cliente compartilhado, criando-o no primeiro uso"""
+        loop = asyncio.get_running_loop()
+        entry = self._clients.get(name)
+        if entry is not None:
+            client, client_loop, closer = entry
+            # Um cliente fica preso ao event loop em que foi criado
+            if not client.is_closed and client_loop is loop:
+                return client
+            if client_loop is not loop and not client_loop.is_closed():
+                # Loop anterior ainda vivo: o cliente é fechado nele, não aqui
+                client_loop.call_soon_threadsafe(closer.cancel)
+
+        client = httpx.AsyncClient(
+            http2=settings.HTTP_CLIENT_HTTP2,
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_CLIENT_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_CLIENT_MAX_KEEPALIVE,
+                keepalive_expiry=settings.HTTP_CLIENT_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(30.0, connect=5.0),
+            **self._options.get(name, {})
+        )
+        closer = loop.create_task(self._close_when_cancelled(name, client))
+        self._clients[name] = (client, loop, closer)
+        return client
+
+    async def _close_when_cancelled(self, name: str, client: httpx.AsyncClient):
+        """
+        Fecha o cliente no próprio loop quando a tarefa é cancelada: no fim do
+        asyncio.run (cada invocação serverless), na troca de loop ou no shutdown
+        """
+        try:
+            await asyncio.get_running_loop().create_future()
+        finally:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"Erro ao fechar cliente HTTP '{name}': {e}")
+
+    async def aclose(self):
+        """Fecha todos os clientes (chamado no shutdown)"""
+        loop = asyncio.get_running_loop()
+        for name, (client, client_loop, closer) in list(self._clients.items()):
+            if client_loop is not loop:
+                if not client_loop.is_closed():
+                    client_loop.call_soon_threadsafe(closer.cancel)
+                continue
+            closer.cancel()
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"Erro ao fechar cliente HTTP '{name}': {e}")
+        self._clients.clear()
+
+
+# Instância global
+http_clients = HTTPClientManager()
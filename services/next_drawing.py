@@ -0,0 +1,163 @@
+"""
+Próximo sorteio oficial e jackpot estimado, para o cabeçalho do Mini App.
+
+Uma tarefa em segundo plano consulta o powerball.com a cada
+NEXT_DRAWING_REFRESH_SECONDS (e logo depois de cada sorteio) e guarda o
+snapshot em memória. /api/player/next-drawing serve esse snapshot sem
+consultar a fonte por requisição. No perfil serverless não há tarefa em
+segundo plano: ensure_fresh() atualiza o snapshot da instância na própria
+requisição quando ele vence.
+
+Sem resposta da fonte, a data vem do calendário de sorteios e o jackpot do
+último valor conhecido (ou None).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from config import get_settings
+from services.powerball_results import RESULT_PUBLISH_DELAY, EASTERN, DRAW_TIME, next_draw_at, powerball_service
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+def _parse_jackpot(value: Any) -> Optional[float]:
+    """Jackpot da API ("$1.2 Billion", "450000000", 450000000) em dólares"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not isinstance(value, str):
+        return None
+    texto = value.replace("$", "").replace(",", "").strip().lower()
+    multiplicador = 1.0
+    for sufixo, fator in (("billion", 1e9), ("million", 1e6)):
+        if texto.endswith(sufixo):
+            texto, multiplicador = texto[:-len(sufixo)].strip(), fator
+    try:
+        return float(texto) * multiplicador
+    except ValueError:
+        return None
+
+
+class NextDrawingFeed:
+    """Snapshot em memória do próximo sorteio, atualizado em segundo plano"""
+
+    RETRY_AFTER_FAILURE = 120.0
+
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._etag: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._refresh_at = 0.0  # monotonic da próxima atualização sob demanda
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                atualizado = await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erro ao atualizar o próximo sorteio: {e}", exc_info=True)
+                atualizado = False
+            await asyncio.sleep(self._next_wait(atualizado))
+
+    async def ensure_fresh(self):
+        """Sem a tarefa em segundo plano: atualiza o snapshot se já passou da hora"""
+        if self._task is not None or time.monotonic() < self._refresh_at:
+            return
+        # Requisições simultâneas na mesma instância não disparam outra consulta
+        self._refresh_at = time.monotonic() + self.RETRY_AFTER_FAILURE
+        try:
+            atualizado = await self.refresh()
+        except Exception as e:
+            logger.error(f"Erro ao atualizar o próximo sorteio: {e}", exc_info=True)
+            atualizado = False
+        self._refresh_at = time.monotonic() + self._next_wait(atualizado)
+
+    def _next_wait(self, atualizado: bool) -> float:
+        """Intervalo normal, mais curto após falha ou quando o sorteio anunciado já passou"""
+        if not atualizado:
+            return min(self.refresh_interval, self.RETRY_AFTER_FAILURE)
+        agora = datetime.now(timezone.utc)
+        depois_do_sorteio = (next_draw_at(agora) + RESULT_PUBLISH_DELAY - agora).total_seconds()
+        return max(1.0, min(self.refresh_interval, depois_do_sorteio))
+
+    async def refresh(self) -> bool:
+        """Consulta a fonte e troca o snapshot; False se a fonte não respondeu"""
+        agora = datetime.now(timezone.utc)
+        proximo = await powerball_service.get_next_drawing()
+
+        draw_at = next_draw_at(agora)
+        jackpot = self._snapshot["jackpot"] if self._snapshot else None
+        jackpot_texto = self._snapshot["jackpot_texto"] if self._snapshot else None
+        fonte = "calendario"
+        if proximo:
+            fonte = "powerball"
+            jackpot_texto = proximo.get("jackpot")
+            jackpot = _parse_jackpot(jackpot_texto)
+            draw_at = self._draw_at(proximo.get("date")) or draw_at
+
+        self._set({
+            "draw_at": draw_at.isoformat(),
+            "draw_date": draw_at.date().isoformat(),
+            "jackpot": jackpot,
+            "jackpot_texto": jackpot_texto,
+            "fonte": fonte,
+            "atualizado_em": agora.isoformat()
+        })
+        return proximo is not None
+
+    def _draw_at(self, value: Optional[str]) -> Optional[datetime]:
+        """Data anunciada pela fonte + horário do sorteio (Nova York); ignora datas passadas"""
+        try:
+            dia = datetime.fromisoformat(str(value)[:10])
+        except ValueError:
+            return None
+        draw_at = dia.replace(hour=DRAW_TIME[0], minute=DRAW_TIME[1], tzinfo=EASTERN)
+        return draw_at if draw_at > datetime.now(timezone.utc) else None
+
+    def _set(self, snapshot: Dict[str, Any]):
+        conteudo = {k: v for k, v in snapshot.items() if k != "atualizado_em"}
+        self._etag = '"' + hashlib.sha1(json.dumps(conteudo, sort_keys=True).encode()).hexdigest()[:16] + '"'
+        self._snapshot = snapshot
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Snapshot atual (calculado pelo calendário se a tarefa ainda não rodou)"""
+        if self._snapshot is None:
+            draw_at = next_draw_at(datetime.now(timezone.utc))
+            self._set({
+                "draw_at": draw_at.isoformat(),
+                "draw_date": draw_at.date().isoformat(),
+                "jackpot": None,
+                "jackpot_texto": None,
+                "fonte": "calendario",
+                "atualizado_em": datetime.now(timezone.utc).isoformat()
+            })
+        return self._snapshot
+
+    @property
+    def etag(self) -> str:
+        self.snapshot()
+        return self._etag
+
+
+# Instância global
+next_drawing_feed = NextDrawingFeed(refresh_interval=settings.NEXT_DRAWING_REFRESH_SECONDS)
@@ -0,0 +1,262 @@
+"""
+Histórico de resultados oficiais da Powerball (tabela official_draws).
+
+Fonte: dataset aberto do estado de Nova York (data.ny.gov, d6yy-54nr), com
+todos os sorteios desde 2010. Na primeira execução o histórico inteiro é
+carregado; depois só são buscados sorteios posteriores ao último gravado.
+
+- Sync periódico: logo após cada sorteio (mais o atraso de publicação), com
+  nova tentativa a cada OFFICIAL_DRAWS_RETRY_SECONDS enquanto o resultado
+  não aparece
+- Apenas um worker sincroniza por vez (advisory lock do PostgreSQL)
+- Modo fixture (OFFICIAL_DRAWS_FIXTURE): lê as linhas de um arquivo JSON no
+  formato do dataset, sem rede (testes e desenvolvimento). Essas linhas ficam
+  com fonte "fixture" e são ignoradas na apuração (find_official_draw)
+"""
+import asyncio
+import json
+import logging
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import httpx
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import get_settings
+from database import AsyncSessionLocal, Concurso, OfficialDraw, direct_engine
+from services.http_client import http_clients
+from services.powerball_results import EASTERN, RESULT_PUBLISH_DELAY, last_draw_at, next_draw_at
+from services.resilience import ny_open_data_policy
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+LEADER_LOCK_KEY = 7310042  # pg_advisory_lock: um sync por vez
+
+try:
+    from zoneinfo import ZoneInfo
+    CONTEST_TZ = ZoneInfo(settings.CONTEST_TIMEZONE)
+except Exception:  # Sem base de fusos: horário de Brasília fixo
+    CONTEST_TZ = timezone(timedelta(hours=-3))
+
+
+def parse_draw_row(row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Linha do dataset -> valores de OfficialDraw (None se malformada)"""
+    try:
+        draw_date = datetime.fromisoformat(row["draw_date"][:10]).date()
+        numbers = [int(n) for n in row["winning_numbers"].split()]
+    except (KeyError, ValueError, AttributeError):
+        return None
+    # Regras mudaram ao longo dos anos (faixas de números): valida só a estrutura
+    if len(numbers) != 6 or len(set(numbers[:5])) != 5:
+        return None
+    multiplier = row.get("multiplier")
+    return {
+        "draw_date": draw_date,
+        "numeros_brancos": json.dumps(sorted(numbers[:5])),
+        "powerball": numbers[5],
+        "multiplier": int(multiplier) if multiplier and str(multiplier).isdigit() else None,
+    }
+
+
+async def find_official_draw(session: AsyncSession, draw_date: date) -> Optional[OfficialDraw]:
+    """Sorteio oficial da data; linhas do modo fixture (dados sintéticos) nunca valem para concursos"""
+    result = await session.execute(
+        select(OfficialDraw).where(OfficialDraw.draw_date == draw_date, OfficialDraw.fonte != "fixture")
+    )
+    return result.scalar_one_or_none()
+
+
+def contest_draw_at(concurso: Concurso) -> Optional[datetime]:
+    """Data prevista do concurso, timezone-aware (o admin informa no horário de CONTEST_TIMEZONE)"""
+    prevista = concurso.data_sorteio_prevista
+    if not prevista:
+        return None
+    if prevista.tzinfo is None:
+        prevista = prevista.replace(tzinfo=CONTEST_TZ)
+    return prevista
+
+
+def contest_draw_date(concurso: Concurso) -> Optional[date]:
+    """Data do sorteio oficial (horário de Nova York) correspondente ao concurso"""
+    prevista = contest_draw_at(concurso)
+    return prevista.astimezone(EASTERN).date() if prevista else None
+
+
+async def official_draw_for_contest(session: AsyncSession, concurso: Concurso) -> Optional[OfficialDraw]:
+    """Sorteio oficial correspondente ao concurso (pela data prevista)"""
+    draw_date = contest_draw_date(concurso)
+    if draw_date is None:
+        return None
+    return await find_official_draw(session, draw_date)
+
+
+class OfficialDrawSync:
+    """Backfill e sync incremental da tabela official_draws"""
+
+    TIMEOUT = 30.0
+    DEADLINE = 60.0
+    PAGE_SIZE = 1000
+
+    def __init__(self, source_url: str, fixture_path: str, retry_interval: float):
+        self.source_url = source_url
+        self.fixture_path = fixture_path
+        self.retry_interval = retry_interval
+        self._task: Optional[asyncio.Task] = None
+        self._running = asyncio.Lock()
+        self._last_run: Optional[Dict] = None
+
+    @property
+    def fonte(self) -> str:
+        return "fixture" if self.fixture_path else "ny_open_data"
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.sync()
+                async with AsyncSessionLocal() as session:
+                    ultimo = await self.latest_draw_date(session)
+                espera = self._next_wait(datetime.now(timezone.utc), ultimo)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erro no sync de resultados oficiais: {e}", exc_info=True)
+                espera = self.retry_interval
+            await asyncio.sleep(espera)
+
+    def _next_wait(self, agora: datetime, ultimo: Optional[date]) -> float:
+        """Segundos até o próximo sync: curto enquanto o último sorteio realizado não foi gravado"""
+        realizado = last_draw_at(agora)
+        if (ultimo is None or ultimo < realizado.date()) and agora >= realizado + RESULT_PUBLISH_DELAY:
+            return self.retry_interval
+        return max(self.retry_interval, (next_draw_at(agora) + RESULT_PUBLISH_DELAY - agora).total_seconds())
+
+    async def latest_draw_date(self, session: AsyncSession) -> Optional[date]:
+        result = await session.execute(select(func.max(OfficialDraw.draw_date)))
+        return result.scalar()
+
+    async def sync(self, full: bool = False) -> Optional[Dict]:
+        """
+        Grava os sorteios novos. Com full=True (ou tabela vazia) carrega o
+        histórico inteiro. None se outro worker já estiver sincronizando.
+        """
+        if self._running.locked():
+            return None
+        async with self._running:
+            if make_url(settings.DATABASE_URL).get_backend_name() != "postgresql":
+                return await self._sync(full)
+
+            async with direct_engine.connect() as conn:
+                result = await conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": LEADER_LOCK_KEY})
+                adquirido = result.scalar()
+                # O lock é da sessão: encerra a transação para a conexão não ficar
+                # "idle in transaction" (e ser derrubada pelo servidor) durante a passada
+                await conn.commit()
+                if not adquirido:
+                    return None
+                try:
+                    return await self._sync(full)
+                finally:
+                    await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": LEADER_LOCK_KEY})
+                    await conn.commit()
+
+    async def _sync(self, full: bool) -> Dict:
+        started = time.perf_counter()
+        async with AsyncSessionLocal() as session:
+            desde = None if full else await self.latest_draw_date(session)
+
+        linhas = await self._fetch_rows(desde)
+        valores = [v for v in (parse_draw_row(row) for row in linhas) if v]
+        invalidas = len(linhas) - len(valores)
+        if desde:
+            valores = [v for v in valores if v["draw_date"] > desde]
+
+        inseridos = 0
+        agora = datetime.utcnow()
+        for i in range(0, len(valores), self.PAGE_SIZE):
+            lote = [{**v, "fonte": self.fonte, "created_at": agora} for v in valores[i:i + self.PAGE_SIZE]]
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    insert(OfficialDraw)
+                    .values(lote)
+                    .on_conflict_do_nothing(constraint="uq_official_draws_draw_date")
+                    .returning(OfficialDraw.id)
+                )
+                inseridos += len(result.all())
+                await session.commit()
+
+        stats = {
+            "modo": "completo" if desde is None else "incremental",
+            "desde": desde.isoformat() if desde else None,
+            "linhas_recebidas": len(linhas),
+            "invalidas": invalidas,
+            "inseridos": inseridos,
+            "duracao_segundos": round(time.perf_counter() - started, 2),
+            "finalizado_em": datetime.utcnow().isoformat()
+        }
+        self._last_run = stats
+        if inseridos:
+            logger.info(f"Resultados oficiais sincronizados: {stats}")
+        return stats
+
+    async def _fetch_rows(self, desde: Optional[date]) -> List[Dict[str, Any]]:
+        """Linhas do dataset (do fixture ou da API), em ordem de data"""
+        if self.fixture_path:
+            with open(self.fixture_path, "r", encoding="utf-8") as f:
+                linhas = json.load(f)
+            return sorted(linhas, key=lambda row: row.get("draw_date", ""))
+
+        linhas: List[Dict[str, Any]] = []
+        offset = 0
+        while True:
+            params = {"$order": "draw_date ASC", "$limit": self.PAGE_SIZE, "$offset": offset}
+            if desde:
+                params["$where"] = f"draw_date > '{desde.isoformat()}T00:00:00'"
+            pagina = await self._get_page(params)
+            linhas.extend(pagina)
+            if len(pagina) < self.PAGE_SIZE:
+                return linhas
+            offset += self.PAGE_SIZE
+
+    async def _get_page(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        async def send() -> httpx.Response:
+            client = http_clients.get("powerball")
+            response = await client.get(self.source_url, params=params, timeout=self.TIMEOUT)
+            response.raise_for_status()
+            return response
+
+        response = await ny_open_data_policy.call("official_draws_page", send, deadline=self.DEADLINE, idempotent=True)
+        return response.json()
+
+    def stats(self) -> Dict:
+        return {
+            "ativo": self._task is not None,
+            "em_execucao": self._running.locked(),
+            "fonte": self.fonte,
+            "ultima_execucao": self._last_run
+        }
+
+
+# Instância global
+official_draw_sync = OfficialDrawSync(
+    source_url=settings.OFFICIAL_DRAWS_SOURCE_URL,
+    fixture_path=settings.OFFICIAL_DRAWS_FIXTURE,
+    retry_interval=settings.OFFICIAL_DRAWS_RETRY_SECONDS
+)
@@ -0,0 +1,126 @@
+"""
+Aplicação de eventos de pagamento do Asaas às transações locais.
+
+Código único de crédito usado pelo worker do inbox de webhooks e pela
+reconciliação. Exatamente uma vez: a transação é travada (FOR UPDATE) e só
+uma transição PENDENTE -> PAGO credita o saldo, na mesma transação do banco
+que registra o processamento.
+"""
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import StatusTransacao, Transacao, Usuario
+from services.balance_cache import balance_cache
+from services.read_replica import read_replica
+from services.realtime import realtime_hub
+
+logger = logging.getLogger(__name__)
+
+CREDIT_EVENTS = {"PAYMENT_RECEIVED", "PAYMENT_CONFIRMED"}
+EXPIRED_EVENTS = {"PAYMENT_OVERDUE"}
+REFUNDED_EVENTS = {"PAYMENT_REFUNDED"}
+
+
+class PaymentResult:
+    """Resultado de um evento aplicado (resultado: creditado, vencido, estornado, ...)"""
+
+    def __init__(self, resultado: str, transacao: Optional[Transacao] = None):
+        self.resultado = resultado
+        self.transacao = transacao
+
+    @property
+    def credita(self) -> bool:
+        return self.resultado == "creditado"
+
+
+async def apply_payment_event(session: AsyncSession, payment_id: str, event: str) -> PaymentResult:
+    """
+    Aplica o evento à transação do pagamento, sem commit.
+
+    O crédito em si fica para credit_balances, para que um lote de eventos
+    vire um único UPDATE por usuário.
+    """
+    result = await session.execute(
+        select(Transacao)
+        .where(Transacao.gateway_id == payment_id)
+        .with_for_update()
+    )
+    transacao = result.scalar_one_or_none()
+
+    if not transacao:
+        logger.warning(f"Transação não encontrada para payment_id: {payment_id}")
+        return PaymentResult("nao_encontrada")
+
+    # Verificar se já foi processada (SEGURANÇA CRÍTICA)
+    if transacao.status == StatusTransacao.PAGO:
+        return PaymentResult("ja_processada", transacao)
+
+    if event in CREDIT_EVENTS:
+        transacao.status = StatusTransacao.PAGO
+        transacao.updated_at = datetime.utcnow()
+        return PaymentResult("creditado", transacao)
+
+    if event in EXPIRED_EVENTS:
+        if transacao.status == StatusTransacao.PENDENTE:
+            transacao.status = StatusTransacao.FALHA
+            transacao.updated_at = datetime.utcnow()
+        logger.warning(f"Pagamento vencido: Transaction ID {transacao.id}")
+        return PaymentResult("vencido", transacao)
+
+    if event in REFUNDED_EVENTS:
+        transacao.status = StatusTransacao.CANCELADO
+        transacao.updated_at = datetime.utcnow()
+        logger.warning(f"Pagamento estornado: Transaction ID {transacao.id}")
+        return PaymentResult("estornado", transacao)
+
+    logger.info(f"Evento não processado: {event}")
+    return PaymentResult("ignorado", transacao)
+
+
+async def credit_balances(session: AsyncSession, transacoes: List[Transacao]) -> Dict[int, Dict]:
+    """
+    Credita o saldo das transações (já marcadas PAGO), somando por usuário.
+
+    O incremento é feito no próprio UPDATE (saldo = saldo + x), sem ler e
+    regravar o saldo. Retorna {usuario_id: {"telegram_id", "nome", "saldo", "transacoes"}}.
+    """
+    totais: Dict[int, float] = {}
+    por_usuario: Dict[int, List[Transacao]] = {}
+    for transacao in transacoes:
+        totais[transacao.usuario_id] = totais.get(transacao.usuario_id, 0.0) + transacao.valor
+        por_usuario.setdefault(transacao.usuario_id, []).append(transacao)
+
+    creditos = {}
+    for usuario_id in sorted(totais):  # Ordem fixa evita deadlock entre lotes concorrentes
+        result = await session.execute(
+            update(Usuario)
+            .where(Usuario.id == usuario_id)
+            .values(saldo=Usuario.saldo + totais[usuario_id])
+            .returning(Usuario.telegram_id, Usuario.nome, Usuario.saldo)
+        )
+        telegram_id, nome, saldo = result.one()
+        creditos[usuario_id] = {
+            "telegram_id": telegram_id,
+            "nome": nome,
+            "saldo": saldo,
+            "transacoes": por_usuario[usuario_id]
+        }
+    return creditos
+
+
+async def publish_credits(creditos: Dict[int, Dict]):
+    """Atualiza o cache de saldo e avisa o Mini App dos depósitos creditados (após o commit)"""
+    for credito in creditos.values():
+        await balance_cache.set(credito["telegram_id"], credito["nome"], credito["saldo"])
+        await read_replica.mark_write(credito["telegram_id"])
+        for transacao in credito["transacoes"]:
+            logger.info(f"✓ Depósito Asaas confirmado: Transaction ID {transacao.id} - Payment ID {transacao.gateway_id} - Valor R$ {transacao.valor:.2f} - Novo saldo: R$ {credito['saldo']:.2f}")
+            await realtime_hub.publish(credito["telegram_id"], "deposit_credited", {
+                "transaction_id": transacao.id,
+                "valor": transacao.valor,
+                "saldo": credito["saldo"]
+            })
@@ -0,0 +1,119 @@
+"""
+Ponte LISTEN/NOTIFY do PostgreSQL para comunicação entre workers.
+
+Mantém uma conexão asyncpg dedicada (fora do pool do SQLAlchemy) que escuta
+os canais registrados e repassa cada payload para os callbacks locais.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Union
+
+from sqlalchemy.engine import make_url
+
+from config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+NotifyCallback = Callable[[str], Union[None, Awaitable[None]]]
+
+
+class PgNotifyBridge:
+    """Conexão dedicada para LISTEN/NOTIFY com reconexão automática"""
+
+    RECONNECT_DELAY = 5.0
+
+    def __init__(self, database_url: str):
+        self.database_url = database_url
+        self._callbacks: Dict[str, List[NotifyCallback]] = {}
+        self._conn = None
+        self._lock = asyncio.Lock()
+        self._supervisor: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        """LISTEN/NOTIFY só existe no PostgreSQL"""
+        return make_url(self.database_url).get_backend_name() == "postgresql"
+
+    @property
+    def connected(self) -> bool:
+        return self._conn is not None and not self._conn.is_closed()
+
+    def subscribe(self, channel: str, callback: NotifyCallback):
+        """Registra um callback para um canal (pode ser chamado antes do start)"""
+        is_new_channel = channel not in self._callbacks
+        self._callbacks.setdefault(channel, []).append(callback)
+        if is_new_channel and self.connected:
+            asyncio.create_task(self._conn.add_listener(channel, self._on_notify))
+
+    async def start(self):
+        """Inicia o supervisor da conexão de escuta"""
+        if not self.enabled or self._supervisor:
+            return
+        self._supervisor = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._supervisor:
+            self._supervisor.cancel()
+            try:
+                await self._supervisor
+            except asyncio.CancelledError:
+                pass
+            self._supervisor = None
+        if self.connected:
+            await self._conn.close()
+        self._conn = None
+
+    async def notify(self, channel: str, payload: str) -> bool:
+        """
+        Envia um NOTIFY pela conexão dedicada.
+
+        Returns:
+            True se enviado, False se a ponte não estiver conectada
+            (o chamador deve então entregar localmente).
+        """
+        if not self.connected:
+            return False
+        try:
+            async with self._lock:
+                await self._conn.execute("SELECT pg_notify($1, $2)", channel, payload)
+            return True
+        except Exception as e:
+            logger.warning(f"Falha ao enviar NOTIFY em '{channel}': {e}")
+            return False
+
+    async def _connect(self):
+        import asyncpg
+
+        dsn = make_url(self.database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+        conn = await asyncpg.connect(dsn)
+        for channel in self._callbacks:
+            await conn.add_listener(channel, self._on_notify)
+        self._conn = conn
+        logger.info(f"LISTEN ativo nos canais: {', '.join(self._callbacks) or 'nenhum'}")
+
+    def _on_notify(self, connection, pid, channel, payload):
+        for callback in self._callbacks.get(channel, []):
+            try:
+                result = callback(payload)
+                if asyncio.iscoroutine(result):
+                    asyncio.create_task(result)
+            except Exception as e:
+                logger.error(f"Erro no callback do canal '{channel}': {e}", exc_info=True)
+
+    async def _run(self):
+        while True:
+            try:
+                if not self.connected:
+                    await self._connect()
+                await asyncio.sleep(self.RECONNECT_DELAY)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Conexão LISTEN indisponível, nova tentativa em {self.RECONNECT_DELAY}s: {e}")
+                self._conn = None
+                await asyncio.sleep(self.RECONNECT_DELAY)
+
+
+# Instância global
+pg_bridge = PgNotifyBridge(settings.DATABASE_DIRECT_URL or settings.DATABASE_URL)
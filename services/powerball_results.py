@@ -1,71 +1,473 @@
+import asyncio
+import json
+import os
+import time
 import httpx
-from bs4 import BeautifulSoup
 import logging
-from typing import Dict, Any, Optional
-from datetime import datetime
+from lxml import html as lxml_html
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
+from datetime import date, datetime, timedelta, timezone
 
+from config import get_settings
+from services.http_client import http_clients
+from services.resilience import OutboundPolicy, lotteryusa_policy, ny_open_data_policy, powerball_policy
+
+try:
+    from zoneinfo import ZoneInfo
+    EASTERN = ZoneInfo("America/New_York")
+except Exception:  # Sem base de fusos (ex: Windows sem tzdata): horário padrão fixo
+    EASTERN = timezone(timedelta(hours=-5))
+
+settings = get_settings()
 logger = logging.getLogger(__name__)
 
+# Sorteios: segunda, quarta e sábado às 22:59 (horário de Nova York)
+DRAW_WEEKDAYS = (0, 2, 5)
+DRAW_TIME = (22, 59)
+# Tempo até o resultado aparecer nas fontes depois do sorteio
+RESULT_PUBLISH_DELAY = timedelta(minutes=30)
+# Página do lotteryusa sem data: por este tempo após o sorteio ela pode ainda mostrar o anterior
+LOTTERYUSA_UNDATED_BLACKOUT = timedelta(hours=12)
+
+
+def last_draw_at(now: datetime) -> datetime:
+    """Último sorteio já realizado (timezone-aware, America/New_York)"""
+    local = now.astimezone(EASTERN)
+    for days_back in range(8):
+        day = local - timedelta(days=days_back)
+        if day.weekday() not in DRAW_WEEKDAYS:
+            continue
+        draw = day.replace(hour=DRAW_TIME[0], minute=DRAW_TIME[1], second=0, microsecond=0)
+        if draw <= local:
+            return draw
+    raise RuntimeError("Calendário de sorteios inválido")
+
+
+def next_draw_at(now: datetime) -> datetime:
+    """Próximo sorteio a partir de now (timezone-aware, America/New_York)"""
+    local = now.astimezone(EASTERN)
+    for days_ahead in range(8):
+        day = local + timedelta(days=days_ahead)
+        if day.weekday() not in DRAW_WEEKDAYS:
+            continue
+        draw = day.replace(hour=DRAW_TIME[0], minute=DRAW_TIME[1], second=0, microsecond=0)
+        if draw > local:
+            return draw
+    raise RuntimeError("Calendário de sorteios inválido")
+
+
+def result_date(result: Dict[str, Any]) -> Optional[date]:
+    try:
+        return datetime.fromisoformat(str(result.get("data", ""))[:10]).date()
+    except ValueError:
+        return None
+
+
+# Container dos números do último sorteio, em ordem de preferência (a classe mudou entre versões do site)
+_DRAW_RESULT_XPATHS = (
+    "//ul[contains(concat(' ', normalize-space(@class), ' '), ' draw-result ')]",
+    "//*[contains(concat(' ', normalize-space(@class), ' '), ' c-draw-result ')]",
+)
+
+
+def _draw_date_near(container) -> Optional[str]:
+    """Data do sorteio no <time datetime> mais próximo do container (ele mesmo ou ancestrais)"""
+    for elemento in [container, *container.iterancestors()]:
+        for valor in elemento.xpath(".//time/@datetime"):
+            try:
+                return datetime.fromisoformat(str(valor).strip()[:10]).date().isoformat()
+            except ValueError:
+                continue
+    return None
+
+
+def parse_lotteryusa_html(html: Union[str, bytes]) -> Optional[Dict[str, Any]]:
+    """
+    Extrai {"white", "powerball"} da página da Powerball no lotteryusa.com,
+    mais "data" quando a página traz a data do sorteio (<time datetime>).
+    
+    Parser C do lxml com XPath direto no container do resultado, em vez de
+    montar a árvore inteira do BeautifulSoup e percorrer todos os <li>.
+    """
+    if not html:
+        return None
+    documento = lxml_html.fromstring(html)
+    itens = []
+    data = None
+    for xpath in _DRAW_RESULT_XPATHS:
+        containers = documento.xpath(xpath)
+        if containers:
+            itens = containers[0].iter("li")
+            data = _draw_date_near(containers[0])
+            break
+    
+    white_numbers = []
+    powerball = None
+    for item in itens:
+        text = item.text_content().strip()
+        if not text.isdigit():
+            continue
+        classes = (item.get("class") or "").split()
+        if "powerball" in classes or "bonus" in classes:
+            powerball = int(text)
+        else:
+            white_numbers.append(int(text))
+    
+    if not white_numbers or not powerball:
+        return None
+    resultado = {"white": sorted(white_numbers[:5]), "powerball": [powerball]}
+    if data:
+        resultado["data"] = data
+    return resultado
+
+
+def is_valid_result(result: Dict[str, Any]) -> bool:
+    """5 brancos distintos em 1..69, um Powerball em 1..26 e data do sorteio"""
+    white = result.get("white") or []
+    powerball = result.get("powerball") or []
+    return (
+        len(white) == 5
+        and len(set(white)) == 5
+        and all(isinstance(n, int) and 1 <= n <= 69 for n in white)
+        and len(powerball) == 1
+        and isinstance(powerball[0], int)
+        and 1 <= powerball[0] <= 26
+        and result_date(result) is not None
+    )
+
+# Os sites de resultados usam cadeias de certificado que falham com frequência
+http_clients.configure("powerball", verify=False)
+
 class PowerballScraper:
     """Serviço para buscar resultados oficiais da Powerball"""
     
     BASE_URL = "https://www.powerball.com"
     
-    async def get_latest_result(self) -> Optional[Dict[str, Any]]:
+    # Timeout de cada tentativa e deadline total (com retentativas) das consultas
+    TIMEOUT = 10.0
+    DEADLINE = 20.0
+    
+    # Intervalo mínimo entre revalidações que falharam (não martelar fontes fora do ar)
+    RETRY_AFTER_FAILURE = 60.0
+    
+    def __init__(
+        self,
+        cache_file: str,
+        pending_ttl: float,
+        hedge_delay: float,
+        extra_source_url: str = "",
+        background_revalidate: bool = True
+    ):
+        self.cache_file = cache_file
+        self.pending_ttl = pending_ttl
+        self.hedge_delay = hedge_delay
+        self.extra_source_url = extra_source_url
+        # Serverless: a instância congela após a resposta, a revalidação precisa terminar nela
+        self.background_revalidate = background_revalidate
+        self._source_stats: Dict[str, Dict[str, Any]] = {}
+        self._source_results: Dict[str, Dict[str, Any]] = {}  # Último resultado válido de cada fonte
+        self._cached: Optional[Dict[str, Any]] = None
+        self._fresh_until = 0.0  # time.time() até quando o resultado em cache vale
+        self._loaded = False
+        self._inflight: Optional[asyncio.Task] = None
+        self._last_failure = 0.0
+        self._stats = {"acertos": 0, "obsoletos": 0, "faltas": 0, "buscas": 0, "falhas": 0, "divergencias": 0}
+    
+    async def get_latest_result(self, force_refresh: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Resultado mais recente, com cache stale-while-revalidate.
+        
+        - Em cache e válido: retorna sem consultar as fontes
+        - Em cache mas vencido: retorna o valor antigo e revalida em segundo plano
+          (com background_revalidate=False aguarda a revalidação)
+        - Sem cache (ou force_refresh): aguarda a busca
+        
+        Chamadas simultâneas compartilham a mesma busca em andamento.
+        """
+        self._load_persisted()
+        
+        if self._cached and not force_refresh:
+            if time.time() < self._fresh_until:
+                self._stats["acertos"] += 1
+                return self._cached
+            self._stats["obsoletos"] += 1
+            if time.time() - self._last_failure >= self.RETRY_AFTER_FAILURE:
+                task = self._revalidate()
+                if not self.background_revalidate:
+                    return (await asyncio.shield(task)) or self._cached
+            return self._cached
+        
+        self._stats["faltas"] += 1
+        result = await asyncio.shield(self._revalidate())
+        return result or self._cached
+    
+    def _revalidate(self) -> asyncio.Task:
+        """Busca única em andamento (single-flight)"""
+        # Uma tarefa fica presa ao event loop em que foi criada (serverless pode trocar de loop entre invocações)
+        if (
+            self._inflight is None
+            or self._inflight.done()
+            or self._inflight.get_loop() is not asyncio.get_running_loop()
+        ):
+            self._inflight = asyncio.create_task(self._refresh())
+        return self._inflight
+    
+    async def _refresh(self) -> Optional[Dict[str, Any]]:
+        self._stats["buscas"] += 1
+        try:
+            result = await self._fetch_latest_result()
+        except Exception as e:
+            logger.error(f"Erro ao revalidar resultado da Powerball: {e}", exc_info=True)
+            result = None
+        
+        if not result:
+            self._stats["falhas"] += 1
+            self._last_failure = time.time()
+            return None
+        
+        self._store(result)
+        self._persist(result)
+        return result
+    
+    def _store(self, result: Dict[str, Any]):
+        self._cached = result
+        self._fresh_until = self._compute_fresh_until(result)
+    
+    def _compute_fresh_until(self, result: Dict[str, Any]) -> float:
         """
-        Busca o resultado mais recente da Powerball.
+        Validade do resultado conforme o calendário de sorteios.
+        
+        Se ele já é do último sorteio, nada muda até o próximo (mais o atraso
+        de publicação). Se ainda é de um sorteio anterior, o novo resultado
+        está para sair: revalida a cada pending_ttl.
+        """
+        now = datetime.now(timezone.utc)
+        draw_date = result_date(result)
+        ultimo = last_draw_at(now)
+        if draw_date is not None and draw_date >= ultimo.date():
+            return (next_draw_at(now) + RESULT_PUBLISH_DELAY).timestamp()
+        return now.timestamp() + self.pending_ttl
+    
+    def _load_persisted(self):
+        """Último resultado bom salvo em disco (sobrevive a reinícios)"""
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                result = json.load(f)
+            if result.get("white") and result.get("powerball"):
+                self._store(result)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Cache do resultado da Powerball ignorado ({self.cache_file}): {e}")
+    
+    def _persist(self, result: Dict[str, Any]):
+        try:
+            directory = os.path.dirname(self.cache_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.cache_file}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(result, f)
+            os.replace(tmp_path, self.cache_file)  # Troca atômica: nunca deixa um arquivo pela metade
+        except OSError as e:
+            logger.warning(f"Não foi possível salvar o resultado da Powerball em {self.cache_file}: {e}")
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "resultado": self._cached,
+            "valido_ate": (
+                datetime.fromtimestamp(self._fresh_until, timezone.utc).isoformat()
+                if self._cached else None
+            ),
+            "revalidando": self._inflight is not None and not self._inflight.done(),
+            "fontes": self._source_stats
+        }
+    
+    async def _get(self, operation: str, url: str, policy: OutboundPolicy = powerball_policy, **kwargs) -> httpx.Response:
+        """GET sob a política de resiliência (consultas são idempotentes: podem ser retentadas)"""
+        async def send() -> httpx.Response:
+            client = http_clients.get("powerball")
+            response = await client.get(url, timeout=self.TIMEOUT, **kwargs)
+            response.raise_for_status()
+            return response
+        
+        return await policy.call(operation, send, deadline=self.DEADLINE, idempotent=True)
+    
+    def _sources(self) -> List[Tuple[str, Callable[[], Awaitable[Optional[Dict[str, Any]]]]]]:
+        """Fontes na ordem de preferência (as seguintes entram com atraso de hedge)"""
+        sources = [
+            ("powerball", self._fetch_powerball_api),
+            ("lotteryusa", self._scrape_fallback),
+        ]
+        if self.extra_source_url:
+            sources.append(("ny_open_data", self._fetch_ny_open_data))
+        return sources
+    
+    async def _fetch_latest_result(self) -> Optional[Dict[str, Any]]:
+        """
+        Busca o resultado mais recente disputando as fontes (sem cache).
+        
+        A primeira fonte começa na hora; cada seguinte entra após hedge_delay
+        (ou assim que uma fonte em andamento falha). O primeiro resultado
+        válido vence e as demais buscas são canceladas. Resultados do mesmo
+        sorteio que não batem com o vencedor são sinalizados em "divergencias".
+        """
+        sources = self._sources()
+        names: Dict[asyncio.Task, str] = {}
+        started: Dict[str, float] = {}
+        pending: Set[asyncio.Task] = set()
+        winner: Optional[Dict[str, Any]] = None
+        next_index = 0
+        
+        def launch():
+            nonlocal next_index
+            name, fetch = sources[next_index]
+            next_index += 1
+            task = asyncio.create_task(fetch())
+            names[task] = name
+            started[name] = time.perf_counter()
+            pending.add(task)
+        
+        try:
+            launch()
+            while pending:
+                hedge = self.hedge_delay if next_index < len(sources) else None
+                done, _ = await asyncio.wait(pending, timeout=hedge, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launch()  # Fonte lenta: dispara a próxima sem cancelar a atual
+                    continue
+                
+                for task in done:
+                    pending.discard(task)
+                    name = names[task]
+                    result = self._evaluate(name, task, started[name])
+                    if result and winner is None:
+                        winner = {**result, "fonte": name}
+                
+                if winner:
+                    break
+                if next_index < len(sources):
+                    launch()  # Fonte falhou: a próxima não espera o atraso
+        finally:
+            for task in pending:
+                task.cancel()
+        
+        if winner:
+            self._source_stats[winner["fonte"]]["vitorias"] += 1
+            divergencias = self._disagreements(winner)
+            if divergencias:
+                winner["divergencias"] = divergencias
+        return winner
+    
+    async def results_by_source(self) -> Dict[str, Dict[str, Any]]:
+        """Consulta todas as fontes em paralelo, sem cache nem hedge: {fonte: resultado válido}"""
+        started = time.perf_counter()
+        tasks = {name: asyncio.create_task(fetch()) for name, fetch in self._sources()}
+        await asyncio.wait(tasks.values())
+        resultados = {}
+        for name, task in tasks.items():
+            result = self._evaluate(name, task, started)
+            if result:
+                resultados[name] = result
+        return resultados
+    
+    def _evaluate(self, name: str, task: asyncio.Task, started: float) -> Optional[Dict[str, Any]]:
+        """Resultado validado de uma fonte concluída (None se falhou ou é inválido)"""
+        stats = self._source_stats.setdefault(name, {"vitorias": 0, "validos": 0, "invalidos": 0, "erros": 0})
+        stats["latencia_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        try:
+            result = task.result()
+        except Exception as e:
+            stats["erros"] += 1
+            logger.warning(f"Fonte de resultado {name} falhou: {e}")
+            return None
+        
+        if not result:
+            stats["erros"] += 1
+            return None
+        if not is_valid_result(result):
+            stats["invalidos"] += 1
+            logger.warning(f"Fonte de resultado {name} retornou dados inválidos: {result}")
+            return None
+        
+        stats["validos"] += 1
+        self._source_results[name] = result
+        return result
+    
+    def _disagreements(self, winner: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Últimos resultados de outras fontes para o mesmo sorteio que não batem"""
+        divergencias = []
+        for name, result in self._source_results.items():
+            if name == winner["fonte"] or result["data"][:10] != winner["data"][:10]:
+                continue
+            if result["white"] != winner["white"] or result["powerball"] != winner["powerball"]:
+                divergencias.append({"fonte": name, "white": result["white"], "powerball": result["powerball"]})
+        if divergencias:
+            self._stats["divergencias"] += 1
+            logger.warning(f"Fontes divergentes para o sorteio de {winner['data']}: {winner['fonte']}={winner['white']}+{winner['powerball']} vs {divergencias}")
+        return divergencias
+    
+    async def _fetch_powerball_api(self) -> Optional[Dict[str, Any]]:
+        """
+        Busca o resultado mais recente na API JSON do powerball.com.
         Retorna um dicionário com:
         - data: Data do sorteio
         - white: Lista de 5 números brancos
         - powerball: Número vermelho (Powerball)
         """
-        try:
-            # Usar uma API pública alternativa se o scraping direto falhar ou for bloqueado
-            # A API oficial do powerball.com é protegida, mas eles tem um endpoint JSON público
-            # Endpoint: https://www.powerball.com/api/v1/numbers/powerball/recent?_format=json
-            
-            url = "https://www.powerball.com/api/v1/numbers/powerball/recent?_format=json"
-            
-            async with httpx.AsyncClient(verify=False) as client:
-                response = await client.get(url, timeout=10.0)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if data and len(data) > 0:
-                        latest = data[0]
-                        
-                        # Parse números "11, 23, 45, 67, 89" e Powerball "12"
-                        # O formato da API pode variar, vamos tratar com cuidado
-                        field_winning_numbers = latest.get('field_winning_numbers', '')
-                        if ',' in field_winning_numbers:
-                            white_numbers = [int(n.strip()) for n in field_winning_numbers.split(',')]
-                        else:
-                            # Tentar separar por espaço se não tiver vírgula
-                            white_numbers = [int(n.strip()) for n in field_winning_numbers.split(' ') if n.strip()]
-                            
-                        # Pegar apenas os 5 primeiros se vierem juntos
-                        if len(white_numbers) > 5:
-                            powerball = white_numbers[-1]
-                            white_numbers = white_numbers[:5]
-                        else:
-                            # Tentar pegar do campo específico se existir
-                            powerball = int(latest.get('field_powerball', '0'))
-
-                        date_str = latest.get('field_draw_date', '')
-                        
-                        return {
-                            "data": date_str,
-                            "white": sorted(white_numbers),
-                            "powerball": [powerball]  # Lista para manter compatibilidade com nosso sistema
-                        }
-            
-            # Fallback: Scraping do site lotteryusa.com (mais simples de fazer parse)
-            return await self._scrape_fallback()
-            
-        except Exception as e:
-            logger.error(f"Erro ao buscar resultados da Powerball: {e}")
-            # Tentar fallback em caso de erro na API
-            return await self._scrape_fallback()
+        # A API oficial do powerball.com é protegida, mas eles tem um endpoint JSON público
+        url = "https://www.powerball.com/api/v1/numbers/powerball/recent?_format=json"
+        
+        response = await self._get("recent_numbers", url)
+        data = response.json()
+        if not data:
+            return None
+        latest = data[0]
+        
+        # Parse números "11, 23, 45, 67, 89" e Powerball "12"
+        # O formato da API pode variar, vamos tratar com cuidado
+        field_winning_numbers = latest.get('field_winning_numbers', '')
+        if ',' in field_winning_numbers:
+            white_numbers = [int(n.strip()) for n in field_winning_numbers.split(',')]
+        else:
+            # Tentar separar por espaço se não tiver vírgula
+            white_numbers = [int(n.strip()) for n in field_winning_numbers.split(' ') if n.strip()]
+        
+        # Pegar apenas os 5 primeiros se vierem juntos
+        if len(white_numbers) > 5:
+            powerball = white_numbers[-1]
+            white_numbers = white_numbers[:5]
+        else:
+            # Tentar pegar do campo específico se existir
+            powerball = int(latest.get('field_powerball', '0'))
+        
+        return {
+            "data": latest.get('field_draw_date', ''),
+            "white": sorted(white_numbers),
+            "powerball": [powerball]  # Lista para manter compatibilidade com nosso sistema
+        }
+    
+    async def _fetch_ny_open_data(self) -> Optional[Dict[str, Any]]:
+        """Fonte extra: dataset Socrata (ex: data.ny.gov d6yy-54nr), "winning_numbers" com o Powerball no fim"""
+        response = await self._get(
+            "ny_open_data", self.extra_source_url, policy=ny_open_data_policy,
+            params={"$order": "draw_date DESC", "$limit": 1}
+        )
+        data = response.json()
+        if not data:
+            return None
+        numbers = [int(n) for n in data[0].get("winning_numbers", "").split()]
+        if len(numbers) != 6:
+            return None
+        return {
+            "data": data[0].get("draw_date", "")[:10],
+            "white": sorted(numbers[:5]),
+            "powerball": [numbers[5]]
+        }
 
     async def get_next_drawing(self) -> Optional[Dict[str, Any]]:
         """
@@ -78,77 +480,57 @@ class PowerballScraper:
             # API oficial para estimativas de jackpot
             url = "https://www.powerball.com/api/v1/estimates/powerball?_format=json"
             
-            async with httpx.AsyncClient(verify=False) as client:
-                response = await client.get(url, timeout=10.0)
+            response = await self._get("next_drawing", url)
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    if data and len(data) > 0:
-                        next_draw = data[0]
-                        return {
-                            "date": next_draw.get('field_next_draw_date'),
-                            "jackpot": next_draw.get('field_next_jackpot_amount', 'N/A')
-                        }
+            if response.status_code == 200:
+                data = response.json()
+                if data and len(data) > 0:
+                    next_draw = data[0]
+                    return {
+                        "date": next_draw.get('field_next_draw_date'),
+                        "jackpot": next_draw.get('field_next_jackpot_amount', 'N/A')
+                    }
             return None
         except Exception as e:
             logger.error(f"Erro ao buscar próximo sorteio: {e}")
             return None
 
     async def _scrape_fallback(self) -> Optional[Dict[str, Any]]:
-        """Fallback usando scraping de site de terceiros"""
+        """Resultado via scraping de site de terceiros (lotteryusa.com)"""
         try:
             url = "https://www.lotteryusa.com/powerball/"
             headers = {
                 "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
             }
             
-            async with httpx.AsyncClient(verify=False) as client:
-                response = await client.get(url, headers=headers, timeout=10.0)
-                
-                if response.status_code == 200:
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    
-                    # Procurar containers de números
-                    # A estrutura pode mudar, mas geralmente são listas ul/li com classes específicas
-                    
-                    # Exemplo genérico de busca
-                    numbers_container = soup.find('ul', class_='draw-result')
-                    if not numbers_container:
-                        # Tentar outra classe comum
-                        numbers_container = soup.find(class_='c-draw-result')
-                    
-                    white_numbers = []
-                    powerball = None
-                    
-                    if numbers_container:
-                        items = numbers_container.find_all('li')
-                        for item in items:
-                            text = item.get_text(strip=True)
-                            if text.isdigit():
-                                if 'powerball' in item.get('class', []) or 'bonus' in item.get('class', []):
-                                    powerball = int(text)
-                                else:
-                                    white_numbers.append(int(text))
-                    
-                    # Se não achou na estrutura, tentar regex no texto cru (último recurso)
-                    if not white_numbers:
-                        import re
-                        # Procurar padrão de data e números
-                        # Ex: "Winning Numbers: 10 20 30 40 50 Powerball: 15"
-                        pass
-
-                    if white_numbers and powerball:
-                        return {
-                            "data": datetime.now().strftime("%Y-%m-%d"), # Data aproximada
-                            "white": sorted(white_numbers[:5]),
-                            "powerball": [powerball]
-                        }
-                        
-            return None
+            # Breaker próprio: o fallback continua disponível com o powerball.com fora do ar
+            response = await self._get("lotteryusa_page", url, policy=lotteryusa_policy, headers=headers)
+            
+            numeros = parse_lotteryusa_html(response.content)
+            if not numeros:
+                return None
+            if "data" in numeros:
+                return numeros
+            
+            # Sem data na página: logo após um sorteio ela ainda pode mostrar o anterior,
+            # que sairia com a data do novo. Nessa janela a fonte fica de fora
+            agora = datetime.now(timezone.utc)
+            ultimo = last_draw_at(agora)
+            if agora - ultimo < LOTTERYUSA_UNDATED_BLACKOUT:
+                logger.info(f"lotteryusa sem data do sorteio e a menos de {LOTTERYUSA_UNDATED_BLACKOUT} do sorteio de {ultimo.date()}: ignorado")
+                return None
+            # Data suposta pelo calendário: a apuração automática não usa (ver services/auto_settlement.py)
+            return {"data": ultimo.date().isoformat(), "data_inferida": True, **numeros}
         except Exception as e:
             logger.error(f"Erro no fallback scraping: {e}")
             return None
 
 # Instância global
-powerball_service = PowerballScraper()
+powerball_service = PowerballScraper(
+    cache_file=settings.POWERBALL_CACHE_FILE,
+    pending_ttl=settings.POWERBALL_PENDING_TTL_SECONDS,
+    hedge_delay=settings.POWERBALL_HEDGE_DELAY_SECONDS,
+    extra_source_url=settings.POWERBALL_EXTRA_SOURCE_URL,
+    background_revalidate=not settings.SERVERLESS
+)
 
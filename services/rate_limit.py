@@ -0,0 +1,327 @@
+"""
+Limitação de taxa e de concorrência para a API pública.
+
+- Token bucket por grupo de rotas, por IP e por cliente (IP + telegram_id);
+  o telegram_id não é autenticado, então nunca é a chave sozinho: trocar de
+  id não escapa do bucket do IP, e forjar o id de outro usuário só gasta o
+  bucket do próprio IP
+- Limite global de requisições simultâneas por classe de rota, para que um
+  único cliente abusivo não esgote o pool de conexões do SQLAlchemy
+- Backend em memória (por worker) ou PostgreSQL (compartilhado entre workers,
+  com pool próprio: o limitador não disputa o pool da aplicação)
+- Respostas 429/503 com Retry-After e contadores para monitoramento
+"""
+import json
+import logging
+import math
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+TELEGRAM_ID_PATH = re.compile(r"/(\d{5,})(?:/|$)")
+TELEGRAM_ID_QUERY = re.compile(r"(?:^|&)telegram_id=(\d+)")
+
+
+class RouteRule:
+    """Regra de limitação para um prefixo de rota"""
+
+    def __init__(
+        self,
+        name: str,
+        prefix: str,
+        capacity: float,
+        refill_per_second: float,
+        in_flight_class: Optional[str] = None
+    ):
+        self.name = name
+        self.prefix = prefix
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        # Classe de concorrência (None = não conta, ex: conexões SSE de longa duração)
+        self.in_flight_class = in_flight_class
+
+
+# Ordem importa: o primeiro prefixo que casar vence
+DEFAULT_RULES: List[RouteRule] = [
+    RouteRule("finance_deposit", "/finance/deposit", capacity=5, refill_per_second=0.1, in_flight_class="gateway"),
+    RouteRule("finance_webhook", "/finance/webhook", capacity=100, refill_per_second=50, in_flight_class="webhook"),
+    RouteRule("finance", "/finance", capacity=30, refill_per_second=2, in_flight_class="db"),
+    RouteRule("player_events", "/api/player/events", capacity=5, refill_per_second=0.2),
+    RouteRule("player", "/api/player", capacity=60, refill_per_second=5, in_flight_class="db"),
+    RouteRule("bot_webhook", settings.WEBHOOK_PATH, capacity=100, refill_per_second=30, in_flight_class="webhook"),
+]
+
+
+class InMemoryRateLimitBackend:
+    """Buckets no processo (cada worker tem os seus)"""
+
+    MAX_KEYS = 100000
+
+    def __init__(self):
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    async def take(self, key: str, capacity: float, refill_per_second: float) -> Tuple[bool, float]:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [capacity, now]
+            while len(self._buckets) > self.MAX_KEYS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+
+        tokens = min(capacity, bucket[0] + (now - bucket[1]) * refill_per_second)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return True, 0.0
+        bucket[0] = tokens
+        return False, (1 - tokens) / refill_per_second
+
+
+class PostgresRateLimitBackend:
+    """
+    Buckets em tabela UNLOGGED, atualizados com um único UPSERT atômico.
+
+    Usa um engine próprio com poucas conexões e pool_timeout curto, fora do
+    pool da aplicação: sob enxurrada o timeout vira exceção e RateLimiter.check
+    libera a requisição (o limite de concorrência ainda se aplica).
+    """
+
+    CLEANUP_INTERVAL = 300.0
+    # Tokens após a recarga desde a última atualização (valores antigos da linha)
+    REFILLED = "LEAST(:capacity, b.tokens + EXTRACT(EPOCH FROM statement_timestamp() - b.updated_at) * :rate)"
+
+    def __init__(self):
+        self._table_ready = False
+        self._last_cleanup = 0.0
+        self._engine = None
+
+    def _get_engine(self):
+        if self._engine is None:
+            from sqlalchemy.ext.asyncio import create_async_engine
+            from sqlalchemy.pool import NullPool
+
+            connect_args = {"timeout": settings.RATE_LIMIT_DB_TIMEOUT_SECONDS}
+            if settings.DB_PGBOUNCER:
+                connect_args.update(statement_cache_size=0, prepared_statement_cache_size=0)
+            if settings.SERVERLESS:
+                # Uma requisição por instância; o pool não sobrevive à troca de event loop
+                pool_options = {"poolclass": NullPool}
+            else:
+                pool_options = {
+                    "pool_size": settings.RATE_LIMIT_DB_POOL_SIZE,
+                    "max_overflow": 0,
+                    "pool_timeout": settings.RATE_LIMIT_DB_TIMEOUT_SECONDS
+                }
+            self._engine = create_async_engine(
+                settings.DATABASE_URL, future=True, connect_args=connect_args, **pool_options
+            )
+        return self._engine
+
+    async def take(self, key: str, capacity: float, refill_per_second: float) -> Tuple[bool, float]:
+        async with self._get_engine().begin() as conn:
+            if not self._table_ready:
+                await conn.execute(text("""
+                    CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_buckets (
+                        key VARCHAR(255) PRIMARY KEY,
+                        tokens DOUBLE PRECISION NOT NULL,
+                        allowed BOOLEAN NOT NULL,
+                        updated_at TIMESTAMPTZ NOT NULL
+                    )
+                """))
+                self._table_ready = True
+
+            result = await conn.execute(text(f"""
+                INSERT INTO rate_limit_buckets AS b (key, tokens, allowed, updated_at)
+                VALUES (:key, :capacity - 1, TRUE, statement_timestamp())
+                ON CONFLICT (key) DO UPDATE SET
+                    tokens = CASE WHEN {self.REFILLED} >= 1 THEN {self.REFILLED} - 1 ELSE {self.REFILLED} END,
+                    allowed = {self.REFILLED} >= 1,
+                    updated_at = statement_timestamp()
+                RETURNING b.allowed, b.tokens
+            """), {"key": key, "capacity": capacity, "rate": refill_per_second})
+            allowed, tokens = result.one()
+
+            now = time.monotonic()
+            if now - self._last_cleanup > self.CLEANUP_INTERVAL:
+                self._last_cleanup = now
+                await conn.execute(text(
+                    "DELETE FROM rate_limit_buckets WHERE updated_at < statement_timestamp() - INTERVAL '1 hour'"
+                ))
+
+        if allowed:
+            return True, 0.0
+        return False, (1 - tokens) / refill_per_second
+
+
+class RateLimiter:
+    """Aplica as regras e mantém os contadores"""
+
+    def __init__(self, rules: List[RouteRule], backend, in_flight_caps: Dict[str, int]):
+        self.rules = rules
+        self.backend = backend
+        self.in_flight_caps = in_flight_caps
+        self._in_flight: Dict[str, int] = {name: 0 for name in in_flight_caps}
+        self._in_flight_peak: Dict[str, int] = {name: 0 for name in in_flight_caps}
+        self._counters: Dict[str, Dict[str, int]] = {
+            rule.name: {"permitidas": 0, "limitadas": 0, "sem_capacidade": 0, "erros_backend": 0}
+            for rule in rules
+        }
+
+    def match(self, path: str) -> Optional[RouteRule]:
+        for rule in self.rules:
+            if path.startswith(rule.prefix):
+                return rule
+        return None
+
+    async def check(self, rule: RouteRule, ip: str, telegram_id: Optional[str] = None) -> Tuple[bool, float]:
+        """Bucket do cliente (IP + telegram_id) e, depois, o do IP inteiro"""
+        factor = settings.RATE_LIMIT_IP_FACTOR
+        try:
+            allowed, retry_after = await self.backend.take(
+                f"{rule.name}:ip:{ip}:tg:{telegram_id or '-'}", rule.capacity, rule.refill_per_second
+            )
+            if allowed:
+                allowed, retry_after = await self.backend.take(
+                    f"{rule.name}:ip:{ip}", rule.capacity * factor, rule.refill_per_second * factor
+                )
+        except Exception as e:
+            # Falha no backend não pode derrubar a API: libera a requisição
+            logger.warning(f"Falha no backend de rate limit ({rule.name}): {e}")
+            self._counters[rule.name]["erros_backend"] += 1
+            return True, 0.0
+        self._counters[rule.name]["permitidas" if allowed else "limitadas"] += 1
+        return allowed, retry_after
+
+    def acquire(self, rule: RouteRule) -> bool:
+        """Reserva uma vaga de concorrência (sem bloquear)"""
+        name = rule.in_flight_class
+        if name is None or name not in self.in_flight_caps:
+            return True
+        if self._in_flight[name] >= self.in_flight_caps[name]:
+            self._counters[rule.name]["sem_capacidade"] += 1
+            return False
+        self._in_flight[name] += 1
+        self._in_flight_peak[name] = max(self._in_flight_peak[name], self._in_flight[name])
+        return True
+
+    def release(self, rule: RouteRule):
+        name = rule.in_flight_class
+        if name is not None and name in self._in_flight:
+            self._in_flight[name] -= 1
+
+    def stats(self) -> Dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "rotas": self._counters,
+            "em_andamento": {
+                name: {
+                    "atual": self._in_flight[name],
+                    "pico": self._in_flight_peak[name],
+                    "limite": cap
+                }
+                for name, cap in self.in_flight_caps.items()
+            }
+        }
+
+
+def forwarded_client_ip(scope, trusted_proxies: int) -> Optional[str]:
+    """
+    IP do cliente segundo o X-Forwarded-For, contando trusted_proxies
+    entradas da direita (cada proxy acrescenta a sua). Entradas mais à
+    esquerda vêm do próprio cliente e não são confiáveis.
+    """
+    if trusted_proxies <= 0:
+        return None
+    entradas = []
+    for name, value in scope.get("headers", []):
+        if name == b"x-forwarded-for":
+            entradas.extend(ip.strip() for ip in value.decode("latin-1").split(","))
+    if len(entradas) < trusted_proxies:
+        return None
+    return entradas[-trusted_proxies] or None
+
+
+def client_identity(scope) -> Tuple[str, Optional[str]]:
+    """IP do cliente e o telegram_id informado (caminho ou query string), se houver"""
+    ip = forwarded_client_ip(scope, settings.RATE_LIMIT_TRUSTED_PROXIES)
+    if not ip:
+        client = scope.get("client")
+        ip = client[0] if client else "desconhecido"
+
+    match = TELEGRAM_ID_PATH.search(scope.get("path", "")) or TELEGRAM_ID_QUERY.search(
+        scope.get("query_string", b"").decode("latin-1")
+    )
+    return ip, match.group(1) if match else None
+
+
+class RateLimitMiddleware:
+    """Middleware ASGI (não bufferiza o corpo, compatível com SSE)"""
+
+    def __init__(self, app, limiter: "RateLimiter"):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rule = self.limiter.match(scope["path"])
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        allowed, retry_after = await self.limiter.check(rule, *client_identity(scope))
+        if not allowed:
+            await self._reject(send, 429, retry_after, "Muitas requisições. Tente novamente em instantes.")
+            return
+
+        if not self.limiter.acquire(rule):
+            await self._reject(send, 503, 1.0, "Servidor ocupado. Tente novamente em instantes.")
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.limiter.release(rule)
+
+    async def _reject(self, send, status: int, retry_after: float, detail: str):
+        body = json.dumps({"detail": detail}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def _build_backend():
+    if settings.RATE_LIMIT_BACKEND == "postgres":
+        return PostgresRateLimitBackend()
+    return InMemoryRateLimitBackend()
+
+
+# Instância global
+rate_limiter = RateLimiter(
+    DEFAULT_RULES,
+    _build_backend(),
+    in_flight_caps={
+        "db": settings.RATE_LIMIT_MAX_IN_FLIGHT_DB,
+        "gateway": settings.RATE_LIMIT_MAX_IN_FLIGHT_GATEWAY,
+        "webhook": settings.RATE_LIMIT_MAX_IN_FLIGHT_WEBHOOK,
+    }
+)
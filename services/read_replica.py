@@ -0,0 +1,198 @@
+"""
+Roteamento de leituras para a réplica (DATABASE_REPLICA_URL).
+
+Rotas só de leitura (dashboard, listas e CSV do admin, históricos e
+estatísticas do jogador) abrem a sessão por read_session() em vez de
+AsyncSessionLocal; o resto continua no primário.
+
+A leitura volta para o primário quando:
+- não há réplica configurada
+- a mesma chave (telegram_id do jogador, "admin:<usuario>") gravou algo nos
+  últimos READ_YOUR_WRITES_SECONDS (read-your-writes). Cada gravação chama
+  mark_write(), que avisa os outros workers via NOTIFY
+- o atraso de replicação passa de REPLICA_MAX_LAG_SECONDS (medido a cada
+  REPLICA_LAG_CHECK_SECONDS)
+- a réplica falhou: fica fora por REPLICA_RETRY_SECONDS
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Union
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import get_settings
+from database import AsyncSessionLocal, ReplicaSessionLocal
+from services.pg_notify import pg_bridge, PgNotifyBridge
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+WriteKey = Union[int, str]
+
+# 0 quando a réplica já aplicou tudo o que recebeu (primário ocioso não conta como atraso)
+REPLICATION_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class ReadReplicaRouter:
+    """Escolhe réplica ou primário para cada sessão de leitura"""
+
+    CHANNEL = "read_your_writes"
+    LAG_QUERY_TIMEOUT = 2.0
+    MAX_KEYS = 50000
+
+    def __init__(
+        self,
+        bridge: PgNotifyBridge,
+        replica_factory,
+        max_lag: float,
+        lag_check_interval: float,
+        retry_interval: float,
+        read_your_writes: float
+    ):
+        self.bridge = bridge
+        self.replica_factory = replica_factory
+        self.max_lag = max_lag
+        self.lag_check_interval = lag_check_interval
+        self.retry_interval = retry_interval
+        self.read_your_writes = read_your_writes
+        self._writes: "OrderedDict[str, float]" = OrderedDict()  # chave -> monotonic da gravação
+        self._lag: Optional[float] = None
+        self._lag_checked_at = 0.0
+        self._down_until = 0.0
+        self._lag_lock = asyncio.Lock()
+        self._stats = {
+            "leituras_replica": 0,
+            "primario_read_your_writes": 0,
+            "primario_atraso": 0,
+            "primario_indisponivel": 0,
+            "falhas_replica": 0
+        }
+        bridge.subscribe(self.CHANNEL, self._on_notify)
+
+    @property
+    def enabled(self) -> bool:
+        return self.replica_factory is not None
+
+    async def mark_write(self, key: WriteKey):
+        """Registra uma gravação da chave: as próximas leituras dela vão ao primário"""
+        if not self.enabled:
+            return
+        self._remember(str(key))
+        try:
+            await self.bridge.notify(self.CHANNEL, json.dumps({"key": str(key)}))
+        except Exception as e:
+            logger.error(f"Erro ao propagar read-your-writes de {key}: {e}", exc_info=True)
+
+    def _remember(self, key: str):
+        self._writes[key] = time.monotonic()
+        self._writes.move_to_end(key)
+        while len(self._writes) > self.MAX_KEYS:
+            self._writes.popitem(last=False)
+
+    def _on_notify(self, payload: str):
+        try:
+            self._remember(json.loads(payload)["key"])
+        except Exception as e:
+            logger.error(f"Payload de read-your-writes inválido: {e}")
+
+    def _wrote_recently(self, key: Optional[WriteKey]) -> bool:
+        if key is None:
+            return False
+        gravado_em = self._writes.get(str(key))
+        return gravado_em is not None and time.monotonic() - gravado_em < self.read_your_writes
+
+    async def _replica_ok(self) -> bool:
+        """Réplica no ar e com atraso aceitável (consulta o atraso no máximo a cada intervalo)"""
+        agora = time.monotonic()
+        if agora < self._down_until:
+            return False
+        if agora - self._lag_checked_at >= self.lag_check_interval and not self._lag_lock.locked():
+            async with self._lag_lock:
+                await self._check_lag()
+        return self._lag is not None and self._lag <= self.max_lag and time.monotonic() >= self._down_until
+
+    async def _check_lag(self):
+        try:
+            async with self.replica_factory() as session:
+                result = await asyncio.wait_for(session.execute(REPLICATION_LAG_SQL), self.LAG_QUERY_TIMEOUT)
+                self._lag = float(result.scalar() or 0.0)
+        except Exception as e:
+            self._mark_down(e)
+        finally:
+            self._lag_checked_at = time.monotonic()
+
+    def _mark_down(self, error: BaseException):
+        self._stats["falhas_replica"] += 1
+        self._lag = None
+        self._down_until = time.monotonic() + self.retry_interval
+        logger.warning(f"Réplica de leitura indisponível, usando o primário por {self.retry_interval:.0f}s: {error}")
+
+    async def _choose(self, key: Optional[WriteKey]):
+        if not self.enabled:
+            return AsyncSessionLocal, False
+        if self._wrote_recently(key):
+            self._stats["primario_read_your_writes"] += 1
+            return AsyncSessionLocal, False
+        if not await self._replica_ok():
+            motivo = "primario_indisponivel" if self._lag is None else "primario_atraso"
+            self._stats[motivo] += 1
+            return AsyncSessionLocal, False
+        self._stats["leituras_replica"] += 1
+        return self.replica_factory, True
+
+    @asynccontextmanager
+    async def session(self, key: Optional[WriteKey] = None) -> AsyncIterator[AsyncSession]:
+        """
+        Sessão só de leitura. key identifica quem lê (telegram_id ou
+        "admin:<usuario>") para o read-your-writes.
+        """
+        factory, replica = await self._choose(key)
+        async with factory() as session:
+            try:
+                yield session
+            except (DBAPIError, OSError) as e:
+                # Conexão perdida com a réplica: próximas leituras vão ao primário
+                if replica and (not isinstance(e, DBAPIError) or e.connection_invalidated):
+                    self._mark_down(e)
+                raise
+
+    def stats(self) -> Dict:
+        agora = time.monotonic()
+        return {
+            **self._stats,
+            "replica_configurada": self.enabled,
+            "atraso_segundos": round(self._lag, 3) if self._lag is not None else None,
+            "atraso_maximo_segundos": self.max_lag,
+            "indisponivel_por_segundos": round(max(0.0, self._down_until - agora), 1),
+            "read_your_writes_ativos": sum(
+                1 for gravado_em in self._writes.values() if agora - gravado_em < self.read_your_writes
+            )
+        }
+
+
+# Instância global
+read_replica = ReadReplicaRouter(
+    pg_bridge,
+    ReplicaSessionLocal,
+    max_lag=settings.REPLICA_MAX_LAG_SECONDS,
+    lag_check_interval=settings.REPLICA_LAG_CHECK_SECONDS,
+    retry_interval=settings.REPLICA_RETRY_SECONDS,
+    read_your_writes=settings.READ_YOUR_WRITES_SECONDS
+)
+
+
+def read_session(key: Optional[WriteKey] = None):
+    """Atalho: async with read_session(telegram_id) as session"""
+    return read_replica.session(key)
+
@@ -0,0 +1,143 @@
+"""
+Canal de eventos em tempo real para o Mini App (Server-Sent Events).
+
+Cada worker mantém um hub local que distribui eventos para as conexões SSE
+abertas. A entrega entre workers passa pelo LISTEN/NOTIFY do PostgreSQL:
+quem publica envia um NOTIFY e todos os workers (inclusive o próprio)
+recebem e repassam para seus assinantes.
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Set
+
+from services.pg_notify import pg_bridge, PgNotifyBridge
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """Fila de eventos de uma conexão SSE"""
+
+    def __init__(self, telegram_id: int, maxsize: int):
+        self.telegram_id = telegram_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        # Marcado quando o cliente não consome rápido o bastante; a conexão
+        # é encerrada e o cliente retoma pelo último ID recebido
+        self.overflowed = False
+
+
+class RealtimeHub:
+    """Distribuidor de eventos por usuário com buffer para retomada"""
+
+    CHANNEL = "powerpix_events"
+    BUFFER_SIZE = 50  # Eventos guardados por usuário para Last-Event-ID
+    MAX_BUFFERED_USERS = 10000
+    QUEUE_SIZE = 100
+
+    def __init__(self, bridge: PgNotifyBridge):
+        self.bridge = bridge
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._buffers: "OrderedDict[int, Deque[Dict[str, Any]]]" = OrderedDict()
+        bridge.subscribe(self.CHANNEL, self._on_notify)
+
+    async def publish(self, telegram_id: int, event: str, data: Dict[str, Any]):
+        """
+        Publica um evento para um usuário.
+
+        Deve ser chamado após o commit da alteração correspondente. Falhas são
+        registradas e nunca propagadas para o fluxo principal.
+        """
+        message = {
+            "id": f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}",
+            "telegram_id": telegram_id,
+            "event": event,
+            "data": data,
+        }
+        try:
+            payload = json.dumps(message, default=str)
+            if not await self.bridge.notify(self.CHANNEL, payload):
+                # Sem PostgreSQL/LISTEN: entrega apenas neste worker
+                self._dispatch(message)
+        except Exception as e:
+            logger.error(f"Erro ao publicar evento '{event}' para {telegram_id}: {e}", exc_info=True)
+
+    def subscribe(self, telegram_id: int, last_event_id: Optional[str] = None):
+        """
+        Registra uma nova conexão.
+
+        Returns:
+            (subscription, backlog) onde backlog são os eventos perdidos desde
+            last_event_id (ou um evento "resync" se ele já saiu do buffer).
+        """
+        subscription = Subscription(telegram_id, self.QUEUE_SIZE)
+        backlog = self._replay(telegram_id, last_event_id)
+        self._subscribers.setdefault(telegram_id, set()).add(subscription)
+        return subscription, backlog
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.telegram_id)
+        if subscribers:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.telegram_id]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "usuarios_conectados": len(self._subscribers),
+            "conexoes": sum(len(s) for s in self._subscribers.values()),
+            "usuarios_em_buffer": len(self._buffers),
+        }
+
+    def _on_notify(self, payload: str):
+        try:
+            self._dispatch(json.loads(payload))
+        except Exception as e:
+            logger.error(f"Payload de evento inválido: {e}")
+
+    def _dispatch(self, message: Dict[str, Any]):
+        telegram_id = message["telegram_id"]
+
+        buffer = self._buffers.get(telegram_id)
+        if buffer is None:
+            buffer = self._buffers[telegram_id] = deque(maxlen=self.BUFFER_SIZE)
+            while len(self._buffers) > self.MAX_BUFFERED_USERS:
+                self._buffers.popitem(last=False)
+        else:
+            self._buffers.move_to_end(telegram_id)
+        buffer.append(message)
+
+        for subscription in list(self._subscribers.get(telegram_id, ())):
+            try:
+                subscription.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                subscription.overflowed = True
+                self.unsubscribe(subscription)
+
+    def _replay(self, telegram_id: int, last_event_id: Optional[str]) -> List[Dict[str, Any]]:
+        if not last_event_id:
+            return []
+        buffer = list(self._buffers.get(telegram_id, ()))
+        for index, message in enumerate(buffer):
+            if message["id"] == last_event_id:
+                return buffer[index + 1:]
+        # O ID não está mais no buffer: o cliente precisa recarregar o estado
+        return [{
+            "id": last_event_id,
+            "telegram_id": telegram_id,
+            "event": "resync",
+            "data": {},
+        }]
+
+
+def format_sse(message: Dict[str, Any]) -> str:
+    """Formata um evento no protocolo text/event-stream"""
+    data = json.dumps(message["data"], default=str)
+    return f"id: {message['id']}\nevent: {message['event']}\ndata: {data}\n\n"
+
+
+# Instância global
+realtime_hub = RealtimeHub(pg_bridge)
@@ -0,0 +1,252 @@
+"""
+Reconciliação de depósitos Pix pendentes.
+
+Se um webhook se perde, o depósito fica PENDENTE para sempre. Periodicamente
+o reconciliador consulta no Asaas as cobranças pendentes há mais de
+RECONCILE_MIN_AGE_MINUTES e aplica o mesmo crédito idempotente do inbox de
+webhooks (services/payments.py).
+
+- Páginas por id (keyset) e transações curtas, para não segurar conexões
+- Concorrência limitada e token bucket nas chamadas ao Asaas
+- Depósitos sem cobrança ou ainda pendentes após RECONCILE_EXPIRE_HOURS
+  viram FALHA (um pagamento tardio ainda é creditado pelo webhook)
+- Apenas um worker reconcilia por vez (advisory lock do PostgreSQL)
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, text, update
+from sqlalchemy.engine import make_url
+
+from config import get_settings
+from database import AsyncSessionLocal, StatusTransacao, TipoTransacao, Transacao, direct_engine
+from services.asaas import asaas_service
+from services.payments import apply_payment_event, credit_balances, publish_credits
+from services.rate_limit import InMemoryRateLimitBackend
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Status da cobrança no Asaas -> evento equivalente do webhook
+STATUS_EVENTS = {
+    "RECEIVED": "PAYMENT_RECEIVED",
+    "CONFIRMED": "PAYMENT_CONFIRMED",
+    "RECEIVED_IN_CASH": "PAYMENT_RECEIVED",
+    "OVERDUE": "PAYMENT_OVERDUE",
+    "REFUNDED": "PAYMENT_REFUNDED",
+}
+
+LEADER_LOCK_KEY = 7310036  # pg_advisory_lock: um reconciliador por vez
+
+
+class DepositReconciler:
+    """Varredura periódica dos depósitos pendentes"""
+
+    def __init__(
+        self,
+        interval: float,
+        min_age_minutes: int,
+        expire_hours: int,
+        concurrency: int,
+        rate_per_second: float,
+        batch_size: int
+    ):
+        self.interval = interval
+        self.min_age = timedelta(minutes=min_age_minutes)
+        self.expire_after = timedelta(hours=expire_hours)
+        self.concurrency = concurrency
+        self.rate_per_second = rate_per_second
+        self.batch_size = batch_size
+        self._bucket = InMemoryRateLimitBackend()
+        self._task: Optional[asyncio.Task] = None
+        self._running = asyncio.Lock()
+        self._last_run: Optional[Dict] = None
+        self._totals = {
+            "passadas": 0,
+            "consultados": 0,
+            "creditados": 0,
+            "expirados": 0,
+            "erros_gateway": 0
+        }
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erro na reconciliação de depósitos: {e}", exc_info=True)
+
+    async def run_once(self) -> Optional[Dict]:
+        """Uma passada completa; None se outro worker já estiver reconciliando"""
+        if self._running.locked():
+            return None
+        async with self._running:
+            if make_url(settings.DATABASE_URL).get_backend_name() != "postgresql":
+                return await self._reconcile()
+
+            # Conexão dedicada segura o advisory lock durante a passada
+            async with direct_engine.connect() as conn:
+                result = await conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": LEADER_LOCK_KEY})
+                adquirido = result.scalar()
+                # O lock é da sessão: encerra a transação para a conexão não ficar
+                # "idle in transaction" (e ser derrubada pelo servidor) durante a passada
+                await conn.commit()
+                if not adquirido:
+                    return None
+                try:
+                    return await self._reconcile()
+                finally:
+                    await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": LEADER_LOCK_KEY})
+                    await conn.commit()
+
+    async def _reconcile(self) -> Dict:
+        started = time.perf_counter()
+        stats = {"consultados": 0, "creditados": 0, "expirados": 0, "erros_gateway": 0}
+        agora = datetime.utcnow()
+        limite = agora - self.min_age
+        last_id = 0
+
+        while True:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(Transacao.id, Transacao.gateway_id, Transacao.created_at)
+                    .where(
+                        Transacao.tipo == TipoTransacao.DEPOSITO,
+                        Transacao.status == StatusTransacao.PENDENTE,
+                        Transacao.created_at < limite,
+                        Transacao.id > last_id
+                    )
+                    .order_by(Transacao.id)
+                    .limit(self.batch_size)
+                )
+                pagina = result.all()
+
+            if not pagina:
+                break
+            last_id = pagina[-1].id
+
+            sem_cobranca = [row.id for row in pagina if not row.gateway_id]
+            com_cobranca = [row for row in pagina if row.gateway_id]
+
+            consultas = await self._fetch_statuses([row.gateway_id for row in com_cobranca])
+            stats["consultados"] += len(consultas)
+            stats["erros_gateway"] += sum(1 for status in consultas.values() if status is None)
+
+            eventos: List[Tuple[str, str]] = []
+            expirar = list(sem_cobranca)
+            for row in com_cobranca:
+                status = consultas.get(row.gateway_id)
+                if status in STATUS_EVENTS:
+                    eventos.append((row.gateway_id, STATUS_EVENTS[status]))
+                elif status == "PENDING" and agora - row.created_at > self.expire_after:
+                    expirar.append(row.id)
+
+            creditados, expirados = await self._apply(eventos, expirar)
+            stats["creditados"] += creditados
+            stats["expirados"] += expirados
+
+        stats["duracao_segundos"] = round(time.perf_counter() - started, 2)
+        stats["finalizado_em"] = datetime.utcnow().isoformat()
+        self._last_run = stats
+        self._totals["passadas"] += 1
+        for key in ("consultados", "creditados", "expirados", "erros_gateway"):
+            self._totals[key] += stats[key]
+
+        if stats["creditados"] or stats["expirados"]:
+            logger.info(f"Reconciliação de depósitos: {stats}")
+        return stats
+
+    async def _fetch_statuses(self, payment_ids: List[str]) -> Dict[str, Optional[str]]:
+        """Status de cada cobrança no Asaas (None em caso de erro)"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(payment_id: str) -> Tuple[str, Optional[str]]:
+            async with semaphore:
+                await self._throttle()
+                try:
+                    payment = await asaas_service.get_payment_status(payment_id)
+                    return payment_id, payment.get("status")
+                except Exception as e:
+                    logger.warning(f"Reconciliação: erro ao consultar cobrança {payment_id}: {e}")
+                    return payment_id, None
+
+        return dict(await asyncio.gather(*(fetch(payment_id) for payment_id in payment_ids)))
+
+    async def _throttle(self):
+        """Token bucket compartilhado pelas consultas da passada"""
+        while True:
+            allowed, retry_after = await self._bucket.take(
+                "reconciliacao", max(1.0, self.rate_per_second), self.rate_per_second
+            )
+            if allowed:
+                return
+            await asyncio.sleep(retry_after)
+
+    async def _apply(self, eventos: List[Tuple[str, str]], expirar: List[int]) -> Tuple[int, int]:
+        """Aplica os eventos e expira as cobranças vencidas numa transação curta"""
+        if not eventos and not expirar:
+            return 0, 0
+
+        async with AsyncSessionLocal() as session:
+            creditar = []
+            for payment_id, event in eventos:
+                outcome = await apply_payment_event(session, payment_id, event)
+                if outcome.credita:
+                    creditar.append(outcome.transacao)
+
+            expirados = 0
+            if expirar:
+                result = await session.execute(
+                    update(Transacao)
+                    .where(
+                        Transacao.id.in_(expirar),
+                        Transacao.status == StatusTransacao.PENDENTE
+                    )
+                    .values(status=StatusTransacao.FALHA, updated_at=datetime.utcnow())
+                )
+                expirados = result.rowcount
+
+            creditos = await credit_balances(session, creditar)
+            await session.commit()
+
+        await publish_credits(creditos)
+        return len(creditar), expirados
+
+    def stats(self) -> Dict:
+        return {
+            "ativo": self._task is not None,
+            "em_execucao": self._running.locked(),
+            "intervalo_segundos": self.interval,
+            "ultima_passada": self._last_run,
+            "totais": self._totals
+        }
+
+
+# Instância global
+deposit_reconciler = DepositReconciler(
+    interval=settings.RECONCILE_INTERVAL_SECONDS,
+    min_age_minutes=settings.RECONCILE_MIN_AGE_MINUTES,
+    expire_hours=settings.RECONCILE_EXPIRE_HOURS,
+    concurrency=settings.RECONCILE_CONCURRENCY,
+    rate_per_second=settings.RECONCILE_RATE_PER_SECOND,
+    batch_size=settings.RECONCILE_BATCH_SIZE
+)
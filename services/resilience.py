@@ -0,0 +1,246 @@
+"""
+Política de chamadas externas (Asaas, Powerball).
+
+- Deadline por operação (inclui as retentativas)
+- Retentativas com backoff exponencial e jitter, só para chamadas idempotentes
+  e erros transitórios (rede, timeout, 429, 5xx)
+- Circuit breaker por dependência: após falhas seguidas, falha rápido até o
+  tempo de recuperação, depois deixa passar uma chamada de teste
+- Bulkhead: limite de chamadas simultâneas por dependência, para que um
+  gateway lento não prenda todos os workers
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+import httpx
+
+from config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class OutboundUnavailableError(Exception):
+    """Dependência externa indisponível (circuito aberto, sem vaga ou deadline)"""
+
+
+class CircuitOpenError(OutboundUnavailableError):
+    pass
+
+
+class BulkheadFullError(OutboundUnavailableError):
+    pass
+
+
+class DeadlineExceededError(OutboundUnavailableError):
+    pass
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Erro do lado da dependência (conta para o breaker e pode ser retentado)"""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRYABLE_STATUS
+    return isinstance(exc, (httpx.TransportError, asyncio.TimeoutError))
+
+
+class CircuitBreaker:
+    """Circuit breaker simples: FECHADO -> ABERTO -> MEIO_ABERTO -> FECHADO"""
+
+    FECHADO = "FECHADO"
+    ABERTO = "ABERTO"
+    MEIO_ABERTO = "MEIO_ABERTO"
+
+    def __init__(self, name: str, failure_threshold: int, recovery_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.FECHADO
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.times_opened = 0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        """True se a chamada pode seguir (no MEIO_ABERTO, apenas uma de teste)"""
+        if self.state == self.FECHADO:
+            return True
+        if self.state == self.ABERTO:
+            if time.monotonic() - self.opened_at < self.recovery_timeout:
+                return False
+            self.state = self.MEIO_ABERTO
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def record_success(self):
+        self.state = self.FECHADO
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == self.MEIO_ABERTO or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.ABERTO:
+                self.times_opened += 1
+                logger.warning(f"Circuit breaker de {self.name} aberto após {self.consecutive_failures} falha(s)")
+            self.state = self.ABERTO
+            self.opened_at = time.monotonic()
+
+    def release_probe(self):
+        """Chamada de teste cancelada sem resultado: libera para a próxima"""
+        self._probe_in_flight = False
+
+    def stats(self) -> Dict:
+        return {
+            "estado": self.state,
+            "falhas_consecutivas": self.consecutive_failures,
+            "aberturas": self.times_opened,
+            "reabre_em_segundos": (
+                max(0.0, round(self.recovery_timeout - (time.monotonic() - self.opened_at), 1))
+                if self.state == self.ABERTO else None
+            )
+        }
+
+
+class OutboundPolicy:
+    """Deadline, retentativas, breaker e bulkhead para uma dependência externa"""
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        bulkhead_timeout: float,
+        failure_threshold: int,
+        recovery_timeout: float,
+        max_retries: int,
+        backoff_base: float = 0.2,
+        backoff_max: float = 2.0
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.bulkhead_timeout = bulkhead_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(name, failure_threshold, recovery_timeout)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._in_flight = 0
+        self._operations: Dict[str, Dict[str, int]] = {}
+
+    def _bulkhead(self) -> asyncio.Semaphore:
+        """Semáforo do event loop atual (serverless pode trocar de loop entre invocações)"""
+        loop = asyncio.get_running_loop()
+        if self._semaphore_loop is not loop:
+            if self._semaphore_loop is not None:
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                self._in_flight = 0
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    def _counters(self, operation: str) -> Dict[str, int]:
+        if operation not in self._operations:
+            self._operations[operation] = {
+                "chamadas": 0, "sucesso": 0, "falhas": 0, "retentativas": 0,
+                "deadline": 0, "circuito_aberto": 0, "bulkhead_cheio": 0
+            }
+        return self._operations[operation]
+
+    async def call(
+        self,
+        operation: str,
+        fn: Callable[[], Awaitable[T]],
+        deadline: float,
+        idempotent: bool = False
+    ) -> T:
+        """Executa fn sob a política; erros de negócio (4xx) são repassados sem retentativa"""
+        counters = self._counters(operation)
+        counters["chamadas"] += 1
+
+        if not self.breaker.allow():
+            counters["circuito_aberto"] += 1
+            raise CircuitOpenError(f"{self.name} indisponível (circuito aberto)")
+
+        semaphore = self._bulkhead()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=self.bulkhead_timeout)
+        except asyncio.TimeoutError:
+            self.breaker.release_probe()
+            counters["bulkhead_cheio"] += 1
+            raise BulkheadFullError(f"{self.name}: limite de {self.max_concurrency} chamadas simultâneas")
+
+        self._in_flight += 1
+        try:
+            return await asyncio.wait_for(self._attempts(fn, counters, idempotent), timeout=deadline)
+        except asyncio.TimeoutError:
+            counters["deadline"] += 1
+            self.breaker.record_failure()
+            raise DeadlineExceededError(f"{self.name}: {operation} excedeu {deadline:.0f}s")
+        except asyncio.CancelledError:
+            self.breaker.release_probe()
+            raise
+        finally:
+            self._in_flight -= 1
+            semaphore.release()
+
+    async def _attempts(self, fn: Callable[[], Awaitable[T]], counters: Dict[str, int], idempotent: bool) -> T:
+        attempt = 0
+        while True:
+            try:
+                result = await fn()
+            except Exception as e:
+                if not is_transient(e):
+                    # A dependência respondeu (ex: 400/404): está saudável
+                    self.breaker.record_success()
+                    raise
+                counters["falhas"] += 1
+                self.breaker.record_failure()
+                if not idempotent or attempt >= self.max_retries or self.breaker.state != CircuitBreaker.FECHADO:
+                    raise
+                attempt += 1
+                counters["retentativas"] += 1
+                # Backoff exponencial com jitter completo
+                await asyncio.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+                continue
+
+            counters["sucesso"] += 1
+            self.breaker.record_success()
+            return result
+
+    def stats(self) -> Dict:
+        return {
+            "circuit_breaker": self.breaker.stats(),
+            "bulkhead": {"em_andamento": self._in_flight, "limite": self.max_concurrency},
+            "operacoes": self._operations
+        }
+
+
+def _build_policy(name: str, max_concurrency: int) -> OutboundPolicy:
+    return OutboundPolicy(
+        name,
+        max_concurrency=max_concurrency,
+        bulkhead_timeout=settings.OUTBOUND_BULKHEAD_WAIT_SECONDS,
+        failure_threshold=settings.OUTBOUND_BREAKER_FAILURES,
+        recovery_timeout=settings.OUTBOUND_BREAKER_RECOVERY_SECONDS,
+        max_retries=settings.OUTBOUND_MAX_RETRIES
+    )
+
+
+# Uma política por dependência externa
+asaas_policy = _build_policy("asaas", settings.ASAAS_MAX_CONCURRENCY)
+powerball_policy = _build_policy("powerball", settings.POWERBALL_MAX_CONCURRENCY)
+lotteryusa_policy = _build_policy("lotteryusa", settings.POWERBALL_MAX_CONCURRENCY)
+ny_open_data_policy = _build_policy("ny_open_data", settings.POWERBALL_MAX_CONCURRENCY)
+
+
+def outbound_stats() -> Dict:
+    return {policy.name: policy.stats() for policy in (asaas_policy, powerball_policy, lotteryusa_policy, ny_open_data_policy)}
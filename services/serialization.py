@@ -0,0 +1,76 @@
+"""
+Camada de serialização JSON rápida para as respostas da API.
+
+- FastJSONResponse: response class padrão da aplicação, baseada em orjson
+- ResponseAdapter: TypeAdapter pré-compilado para devolver modelos Pydantic
+  já codificados, sem a revalidação que o FastAPI faz no response_model
+- raw_json_array: embute listas de inteiros já armazenadas no banco (ex:
+  números das apostas) sem o ciclo json.loads -> json.dumps
+"""
+import json
+import re
+from typing import Any, Generic, Optional, Type, TypeVar
+
+import orjson
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, TypeAdapter
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+# Lista JSON de inteiros: o único formato embutido sem decodificar
+INT_ARRAY = re.compile(r"\[\s*(?:-?\d+\s*(?:,\s*-?\d+\s*)*)?\]", re.ASCII)
+
+T = TypeVar("T")
+
+
+def _default(value: Any) -> Any:
+    """Tipos que o orjson não serializa nativamente"""
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if hasattr(value, "value"):  # Enums
+        return value.value
+    raise TypeError(f"Tipo não serializável: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse usando orjson"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class ResponseAdapter(Generic[T]):
+    """Serializador pré-compilado de um modelo de resposta"""
+
+    def __init__(self, model: Type[T]):
+        self._adapter = TypeAdapter(model)
+
+    def dump(self, value: T) -> bytes:
+        return self._adapter.dump_json(value)
+
+    def response(self, value: T, status_code: int = 200) -> Response:
+        return Response(content=self.dump(value), status_code=status_code, media_type="application/json")
+
+
+def raw_json_array(value: Optional[str]) -> Any:
+    """
+    Embute uma lista JSON de inteiros armazenada como texto na resposta sem
+    decodificar.
+
+    O texto só vira orjson.Fragment se for uma lista de inteiros válida
+    (conferida por regex, sem montar objetos); qualquer outro valor cai no
+    caminho lento (json.loads, [] se inválido), então um valor corrompido no
+    banco não quebra o corpo da resposta.
+    """
+    if value:
+        stripped = value.strip()
+        if INT_ARRAY.fullmatch(stripped):
+            return orjson.Fragment(stripped)
+    try:
+        return json.loads(value) if value else []
+    except (TypeError, ValueError):
+        return []
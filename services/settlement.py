@@ -0,0 +1,159 @@
+"""
+Apuração de concursos: confere as apostas com o resultado oficial, distribui
+o prêmio entre os ganhadores e avisa os jogadores.
+
+Usada pelo sorteio manual do admin (/admin/concursos/{id}/sorteio) e pela
+apuração automática (services/auto_settlement.py).
+"""
+import json
+import logging
+from datetime import datetime
+from typing import Dict, List
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+
+from database import Aposta, Concurso, StatusConcurso, Usuario
+from schemas import DrawNumbersSchema
+from services.balance_cache import balance_cache
+from services.read_replica import read_replica
+from services.realtime import realtime_hub
+
+logger = logging.getLogger(__name__)
+
+
+class SettlementError(Exception):
+    """Concurso não pode ser apurado (status_code para a resposta HTTP)"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+async def settle_contest(session: AsyncSession, concurso_id: int, numeros: DrawNumbersSchema) -> Dict:
+    """
+    Apura o concurso com os números oficiais e faz o commit.
+
+    A linha do concurso fica bloqueada (FOR UPDATE) até o commit: o sorteio
+    manual e o automático não apuram o mesmo concurso duas vezes.
+    """
+    result = await session.execute(
+        select(Concurso).where(Concurso.id == concurso_id).with_for_update()
+    )
+    concurso = result.scalar_one_or_none()
+
+    if not concurso:
+        raise SettlementError("Concurso não encontrado", status_code=404)
+    if concurso.is_drawn:
+        raise SettlementError("Este concurso já foi sorteado")
+    if not concurso.is_active:
+        raise SettlementError("Este concurso não está ativo")
+
+    white = numeros.white
+    powerball = numeros.powerball
+
+    concurso.numeros_sorteados = numeros.model_dump_json()
+    concurso.is_drawn = True
+    concurso.is_active = False
+    concurso.status = StatusConcurso.SORTEADO
+    concurso.data_sorteio_realizado = datetime.utcnow()
+
+    # Buscar todas as apostas do concurso
+    result = await session.execute(
+        select(Aposta)
+        .options(selectinload(Aposta.usuario))
+        .where(Aposta.concurso_id == concurso_id)
+        .order_by(Aposta.data_aposta.asc())  # Ordenar por data para distribuir centavos
+    )
+    apostas = result.scalars().all()
+
+    # Identificar ganhadores
+    # Números oficiais sorteados: 5 brancos + 1 Powerball
+    # Apostas dos jogadores: 20 brancos + 5 Powerballs
+    # Ganhador: acertou os 5 brancos oficiais + o 1 Powerball oficial
+    ganhadores: List[Aposta] = []
+    numeros_brancos_oficiais = set(white)  # 5 números oficiais
+    powerball_oficial = powerball[0] if powerball else None  # 1 Powerball oficial
+
+    for aposta in apostas:
+        try:
+            numeros_brancos_aposta = json.loads(aposta.numeros_brancos)  # 20 números do jogador
+            numeros_vermelhos_aposta = json.loads(aposta.numeros_vermelhos)  # 5 Powerballs do jogador
+        except (TypeError, ValueError):
+            continue
+
+        # Calcular acertos: quantos dos 5 brancos oficiais o jogador acertou
+        acertos_brancos = len(set(numeros_brancos_aposta) & numeros_brancos_oficiais)
+        # Verificar se acertou o Powerball oficial
+        acertou_powerball = powerball_oficial in numeros_vermelhos_aposta
+
+        # Total de acertos: brancos acertados + 1 se acertou Powerball
+        aposta.acertos = acertos_brancos + (1 if acertou_powerball else 0)
+
+        # Ganhador: acertou os 5 brancos oficiais + o Powerball oficial (6 acertos)
+        if acertos_brancos == 5 and acertou_powerball:
+            ganhadores.append(aposta)
+            aposta.is_winner = True
+
+    # Calcular e distribuir prêmios
+    premios: Dict[int, float] = {}
+    if ganhadores:
+        premio_por_ganhador = concurso.premio_total / len(ganhadores)
+        premio_base = int(premio_por_ganhador * 100) / 100  # Arredondar para 2 casas decimais
+        centavos_restantes = int((concurso.premio_total - (premio_base * len(ganhadores))) * 100)
+
+        for idx, ganhador in enumerate(ganhadores):
+            valor_premio = premio_base
+            if idx < centavos_restantes:
+                valor_premio += 0.01
+
+            ganhador.valor_premio = round(valor_premio, 2)
+            ganhador.cota_ganhadora = idx + 1
+            if ganhador.usuario:
+                premios[ganhador.usuario.id] = premios.get(ganhador.usuario.id, 0.0) + valor_premio
+
+    # Crédito no próprio UPDATE (saldo = saldo + x): não perde depósitos concorrentes
+    usuarios = {aposta.usuario.id: aposta.usuario for aposta in apostas if aposta.usuario}
+    for usuario_id in sorted(premios):  # Mesma ordem de credit_balances: evita deadlock
+        result = await session.execute(
+            update(Usuario)
+            .where(Usuario.id == usuario_id)
+            .values(saldo=Usuario.saldo + premios[usuario_id])
+            .returning(Usuario.saldo)
+        )
+        set_committed_value(usuarios[usuario_id], "saldo", result.scalar_one())
+
+    await session.commit()
+    await publish_settlement(concurso, apostas, white, powerball)
+
+    return {
+        "concurso_id": concurso.id,
+        "apostas": len(apostas),
+        "ganhadores": len(ganhadores),
+        "numeros_sorteados": {"white": white, "powerball": powerball}
+    }
+
+
+async def publish_settlement(concurso: Concurso, apostas: List[Aposta], white: List[int], powerball: List[int]):
+    """Atualiza o cache de saldo e notifica cada jogador com o resultado das suas apostas"""
+    resultados_por_usuario = {}
+    for aposta in apostas:
+        if not aposta.usuario:
+            continue
+        resultados_por_usuario.setdefault(aposta.usuario.telegram_id, (aposta.usuario, []))[1].append({
+            "aposta_id": aposta.id,
+            "acertos": aposta.acertos,
+            "is_winner": aposta.is_winner,
+            "valor_premio": aposta.valor_premio
+        })
+    for telegram_id, (usuario, resultados) in resultados_por_usuario.items():
+        await balance_cache.set(telegram_id, usuario.nome, usuario.saldo)
+        await read_replica.mark_write(telegram_id)
+        await realtime_hub.publish(telegram_id, "contest_settled", {
+            "concurso_id": concurso.id,
+            "numeros_sorteados": {"white": white, "powerball": powerball},
+            "apostas": resultados,
+            "saldo": usuario.saldo
+        })
@@ -4,11 +4,13 @@ from pathlib import Path
 from aiogram import Bot
 from typing import Optional
 
+from config import get_settings
+
+settings = get_settings()
 logger = logging.getLogger(__name__)
 
-# Diretório para armazenar avatares
+# Diretório para armazenar avatares (criado no primeiro download)
 AVATARS_DIR = Path("static/avatars")
-AVATARS_DIR.mkdir(parents=True, exist_ok=True)
 
 
 async def download_user_photo(bot: Bot, user_id: int) -> Optional[str]:
@@ -22,6 +24,10 @@ async def download_user_photo(bot: Bot, user_id: int) -> Optional[str]:
     Returns:
         Caminho relativo da foto salva (ex: /static/avatars/123456.jpg) ou None se não houver foto
     """
+    if settings.SERVERLESS:
+        # Disco somente leitura/efêmero e sem /static compartilhado entre instâncias
+        return None
+
     try:
         # Buscar fotos de perfil do usuário
         photos = await bot.get_user_profile_photos(user_id, limit=1)
@@ -37,6 +43,7 @@ async def download_user_photo(bot: Bot, user_id: int) -> Optional[str]:
         file = await bot.get_file(photo.file_id)
         
         # Caminho de destino
+        AVATARS_DIR.mkdir(parents=True, exist_ok=True)
         file_path = AVATARS_DIR / f"{user_id}.jpg"
         
         # Baixar e salvar
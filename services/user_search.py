@@ -0,0 +1,143 @@
+"""
+Busca paginada de usuários para o painel admin.
+
+- Busca textual por nome/CPF/telefone usando os índices GiST de trigramas
+  (pg_trgm), ordenada por relevância (word_similarity)
+- Conjunto de candidatos limitado: cada coluna entrega no máximo
+  MAX_CANDIDATES linhas na ordem do próprio índice (KNN pelo operador <<->),
+  e só elas são ranqueadas; um termo comum não ordena a tabela inteira
+- Paginação por keyset (cursor opaco), sem OFFSET nem COUNT(*)
+- Listagem sem busca: mais recentes primeiro (data_cadastro), pelo índice
+  ix_usuarios_data_cadastro_id
+- Filtros por arquivado, cadastro completo e faixa de saldo
+"""
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, func, literal, or_, select, union
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import Usuario, normalize_digits
+
+PAGE_SIZE = 50
+MIN_TRIGRAM_LENGTH = 3  # Abaixo disso o pg_trgm não consegue usar o índice
+MAX_CANDIDATES = 1000  # Por coluna; resultados além disso pedem um termo mais específico
+
+
+def _like_pattern(term: str) -> str:
+    """Padrão '%termo%' com os curingas do LIKE escapados"""
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _parse_cursor(cursor: Optional[str]) -> Tuple[Optional[str], Optional[int]]:
+    """Cursor: '<chave>:<id>' (chave = data de cadastro na listagem, rank na busca)"""
+    if not cursor or ":" not in cursor:
+        return None, None
+    chave, last_id = cursor.rsplit(":", 1)
+    try:
+        return chave, int(last_id)
+    except ValueError:
+        return None, None
+
+
+async def _list_users(db: AsyncSession, filtros: list, cursor: Optional[str], limit: int):
+    """Listagem: mais recentes primeiro (data_cadastro desc, sem data por primeiro, como o PostgreSQL)"""
+    query = select(Usuario).where(*filtros)
+    chave, cursor_id = _parse_cursor(cursor)
+    if cursor_id is not None:
+        if chave == "":
+            query = query.where(or_(
+                Usuario.data_cadastro.isnot(None),
+                and_(Usuario.data_cadastro.is_(None), Usuario.id < cursor_id)
+            ))
+        else:
+            try:
+                cursor_data = datetime.fromisoformat(chave)
+            except ValueError:
+                cursor_data = None
+            if cursor_data is not None:
+                query = query.where(or_(
+                    Usuario.data_cadastro < cursor_data,
+                    and_(Usuario.data_cadastro == cursor_data, Usuario.id < cursor_id)
+                ))
+
+    result = await db.execute(
+        query.order_by(Usuario.data_cadastro.desc().nulls_first(), Usuario.id.desc()).limit(limit + 1)
+    )
+    usuarios = list(result.scalars().all())
+    next_cursor = None
+    if len(usuarios) > limit:
+        ultimo = usuarios[limit - 1]
+        next_cursor = f"{ultimo.data_cadastro.isoformat() if ultimo.data_cadastro else ''}:{ultimo.id}"
+    return usuarios[:limit], next_cursor
+
+
+async def search_users(
+    db: AsyncSession,
+    search: Optional[str] = None,
+    arquivado: Optional[bool] = None,
+    completo: Optional[bool] = None,
+    saldo_min: Optional[float] = None,
+    saldo_max: Optional[float] = None,
+    cursor: Optional[str] = None,
+    limit: int = PAGE_SIZE
+) -> Tuple[List[Usuario], Optional[str]]:
+    """
+    Retorna uma página de usuários e o cursor da próxima página (ou None).
+    """
+    filtros = []
+    if arquivado is not None:
+        filtros.append(Usuario.is_archived == arquivado)
+    if completo is not None:
+        filtros.append(Usuario.cadastro_completo == completo)
+    if saldo_min is not None:
+        filtros.append(Usuario.saldo >= saldo_min)
+    if saldo_max is not None:
+        filtros.append(Usuario.saldo <= saldo_max)
+
+    termo = (search or "").strip()
+    if not termo:
+        return await _list_users(db, filtros, cursor, limit)
+
+    # Candidatos de cada coluna na ordem do índice GiST (distância de palavra <<->),
+    # já filtrados; o ranking completo só roda sobre eles
+    colunas = [(termo, Usuario.nome, Usuario.nome.ilike(_like_pattern(termo), escape="\\"))]
+    digitos = normalize_digits(termo)
+    if digitos and len(digitos) >= MIN_TRIGRAM_LENGTH:
+        colunas += [
+            (digitos, coluna, coluna.like(_like_pattern(digitos), escape="\\"))
+            for coluna in (Usuario.cpf_digitos, Usuario.telefone_digitos)
+        ]
+
+    selects = [
+        select(Usuario.id)
+        .where(condicao, *filtros)
+        .order_by(literal(valor).op("<<->")(coluna))
+        .limit(MAX_CANDIDATES)
+        for valor, coluna, condicao in colunas
+    ]
+    candidatos = (union(*selects) if len(selects) > 1 else selects[0]).subquery()
+
+    relevancia = [func.word_similarity(valor, coluna) for valor, coluna, _ in colunas]
+    rank = func.greatest(*relevancia) if len(relevancia) > 1 else relevancia[0]
+    query = select(Usuario, rank.label("rank")).where(Usuario.id.in_(select(candidatos.c.id)))
+
+    chave, cursor_id = _parse_cursor(cursor)
+    try:
+        cursor_rank = float(chave) if chave else None
+    except ValueError:
+        cursor_rank = None
+    if cursor_rank is not None and cursor_id is not None:
+        query = query.where(or_(
+            rank < cursor_rank,
+            and_(rank == cursor_rank, Usuario.id < cursor_id)
+        ))
+
+    result = await db.execute(query.order_by(rank.desc(), Usuario.id.desc()).limit(limit + 1))
+    rows = result.all()
+    next_cursor = None
+    if len(rows) > limit:
+        ultimo, ultimo_rank = rows[limit - 1]
+        next_cursor = f"{ultimo_rank!r}:{ultimo.id}"
+    return [usuario for usuario, _ in rows[:limit]], next_cursor
@@ -0,0 +1,292 @@
+"""
+Inbox durável dos webhooks do Asaas.
+
+- O endpoint só grava o corpo bruto (chave única event + payment_id) e responde
+- Workers em background pegam lotes com FOR UPDATE SKIP LOCKED, respeitando a
+  ordem de chegada por pagamento, e creditam os saldos do lote de uma vez
+- Linhas com erro são retentadas até WEBHOOK_INBOX_MAX_ATTEMPTS e depois ficam
+  em FALHA, podendo ser reprocessadas pelo admin
+- Webhook de cobrança que ainda não tem transação local (o Asaas pode avisar
+  antes de o depósito gravar o gateway_id) fica PENDENTE com backoff
+  exponencial; só vira PROCESSADO/nao_encontrada depois de
+  WEBHOOK_INBOX_NOT_FOUND_WINDOW_SECONDS desde o recebimento
+- Novos eventos acordam os workers de todos os processos via NOTIFY
+- Perfil serverless (sem workers): o endpoint processa um lote logo após
+  gravar (process_inline) e /api/cron/tick retenta o que sobrar
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, exists, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import aliased
+
+from config import get_settings
+from database import AsyncSessionLocal, WebhookInbox
+from services.payments import apply_payment_event, credit_balances, publish_credits
+from services.pg_notify import pg_bridge
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class WebhookInboxProcessor:
+    """Gravação rápida e processamento assíncrono dos webhooks"""
+
+    CHANNEL = "webhook_inbox"
+
+    def __init__(self, workers: int, batch_size: int, poll_interval: float, max_attempts: int,
+                 not_found_window: float, backoff: float, backoff_max: float):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.not_found_window = timedelta(seconds=not_found_window)
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._counters = {
+            "recebidos": 0,
+            "duplicados": 0,
+            "processados": 0,
+            "creditados": 0,
+            "erros": 0,
+            "falhas_definitivas": 0,
+            "adiados": 0,
+            "lotes": 0,
+            "erros_lote": 0
+        }
+        self._last_batch_ms = 0.0
+        pg_bridge.subscribe(self.CHANNEL, lambda _: self._wakeup.set())
+
+    async def enqueue(self, event: str, payment_id: str, payload: str) -> bool:
+        """Grava o webhook; retorna False se já havia sido recebido"""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                insert(WebhookInbox)
+                .values(event=event, payment_id=payment_id, payload=payload, status="PENDENTE",
+                        tentativas=0, received_at=datetime.utcnow())
+                .on_conflict_do_nothing(constraint="uq_webhook_inbox_event_payment")
+                .returning(WebhookInbox.id)
+            )
+            inserted = result.scalar_one_or_none() is not None
+            await session.commit()
+
+        if not inserted:
+            self._counters["duplicados"] += 1
+            return False
+
+        self._counters["recebidos"] += 1
+        if not await pg_bridge.notify(self.CHANNEL, payment_id):
+            self._wakeup.set()
+        return True
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._run(n)) for n in range(self.workers)]
+        logger.info(f"Inbox de webhooks: {self.workers} worker(s) iniciado(s)")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    async def _run(self, worker: int):
+        while True:
+            try:
+                claimed = await self.process_batch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._counters["erros_lote"] += 1
+                logger.error(f"Erro no worker {worker} do inbox de webhooks: {e}", exc_info=True)
+                claimed = 0
+
+            if claimed >= self.batch_size:
+                continue  # Fila cheia: segue sem esperar
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def process_inline(self) -> int:
+        """Processa um lote na própria requisição; erros ficam no inbox para a próxima passada"""
+        try:
+            return await self.process_batch()
+        except Exception as e:
+            self._counters["erros_lote"] += 1
+            logger.error(f"Erro ao processar o inbox de webhooks na requisição: {e}", exc_info=True)
+            return 0
+
+    async def process_batch(self) -> int:
+        """Processa um lote pendente; retorna quantas linhas foram pegas"""
+        started = time.perf_counter()
+        anterior = aliased(WebhookInbox)
+        agora = datetime.utcnow()
+
+        async with AsyncSessionLocal() as session:
+            # Só pega o evento mais antigo pendente de cada pagamento (ordem por pagamento)
+            result = await session.execute(
+                select(WebhookInbox)
+                .where(
+                    WebhookInbox.status == "PENDENTE",
+                    or_(WebhookInbox.proxima_tentativa_em.is_(None), WebhookInbox.proxima_tentativa_em <= agora),
+                    ~exists().where(and_(
+                        anterior.payment_id == WebhookInbox.payment_id,
+                        anterior.status == "PENDENTE",
+                        anterior.id < WebhookInbox.id
+                    ))
+                )
+                .order_by(WebhookInbox.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            rows = list(result.scalars().all())
+            if not rows:
+                return 0
+
+            creditar = []
+            for row in rows:
+                row.tentativas += 1
+                try:
+                    async with session.begin_nested():
+                        outcome = await apply_payment_event(session, row.payment_id, row.event)
+                except Exception as e:
+                    self._counters["erros"] += 1
+                    row.ultimo_erro = str(e)[:1000]
+                    if row.tentativas >= self.max_attempts:
+                        row.status = "FALHA"
+                        row.processed_at = datetime.utcnow()
+                        self._counters["falhas_definitivas"] += 1
+                    logger.error(f"Erro ao processar webhook {row.id} ({row.event} {row.payment_id}): {e}")
+                    continue
+
+                if outcome.resultado == "nao_encontrada" and agora - row.received_at < self.not_found_window:
+                    # Continua PENDENTE (e segurando os eventos seguintes do mesmo pagamento)
+                    row.ultimo_erro = "Transação ainda não encontrada para o payment_id"
+                    row.proxima_tentativa_em = agora + timedelta(seconds=self._backoff_seconds(row.tentativas))
+                    self._counters["adiados"] += 1
+                    continue
+
+                if outcome.credita:
+                    creditar.append(outcome.transacao)
+                row.status = "PROCESSADO"
+                row.resultado = outcome.resultado
+                row.ultimo_erro = None
+                row.proxima_tentativa_em = None
+                row.processed_at = datetime.utcnow()
+
+            creditos = await credit_balances(session, creditar)
+            await session.commit()
+
+        await publish_credits(creditos)
+        self._counters["lotes"] += 1
+        self._counters["processados"] += sum(1 for row in rows if row.status == "PROCESSADO")
+        self._counters["creditados"] += len(creditar)
+        self._last_batch_ms = (time.perf_counter() - started) * 1000
+        return len(rows)
+
+    def _backoff_seconds(self, tentativas: int) -> float:
+        """Espera antes da próxima tentativa: dobra a cada uma, até backoff_max"""
+        return min(self.backoff * 2 ** max(tentativas - 1, 0), self.backoff_max)
+
+    async def reprocess(self, inbox_id: Optional[int] = None) -> int:
+        """
+        Volta linhas para PENDENTE: uma linha específica (qualquer status) ou
+        todas em FALHA. Seguro para crédito: transações já PAGO não são
+        creditadas de novo.
+        """
+        query = update(WebhookInbox).values(status="PENDENTE", tentativas=0, processed_at=None,
+                                            proxima_tentativa_em=None)
+        if inbox_id is not None:
+            query = query.where(WebhookInbox.id == inbox_id)
+        else:
+            query = query.where(WebhookInbox.status == "FALHA")
+
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(query)
+            await session.commit()
+
+        if result.rowcount:
+            self._wakeup.set()
+        return result.rowcount
+
+    async def stats(self) -> Dict:
+        """Tamanho da fila, atraso e falhas (banco) + contadores deste worker"""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(WebhookInbox.status, func.count()).group_by(WebhookInbox.status)
+            )
+            por_status = {status: total for status, total in result.all()}
+
+            result = await session.execute(
+                select(func.min(WebhookInbox.received_at)).where(WebhookInbox.status == "PENDENTE")
+            )
+            mais_antigo = result.scalar_one_or_none()
+
+            result = await session.execute(
+                select(
+                    func.avg(func.extract("epoch", WebhookInbox.processed_at - WebhookInbox.received_at)),
+                    func.max(func.extract("epoch", WebhookInbox.processed_at - WebhookInbox.received_at))
+                ).where(
+                    WebhookInbox.status == "PROCESSADO",
+                    WebhookInbox.processed_at >= datetime.utcnow() - timedelta(hours=1)
+                )
+            )
+            lag_medio, lag_maximo = result.one()
+
+            result = await session.execute(
+                select(WebhookInbox)
+                .where(WebhookInbox.status == "FALHA")
+                .order_by(WebhookInbox.id.desc())
+                .limit(10)
+            )
+            falhas = result.scalars().all()
+
+        return {
+            "por_status": por_status,
+            "atraso_pendente_segundos": (datetime.utcnow() - mais_antigo).total_seconds() if mais_antigo else 0.0,
+            "atraso_ultima_hora": {
+                "medio_segundos": float(lag_medio or 0.0),
+                "maximo_segundos": float(lag_maximo or 0.0)
+            },
+            "falhas_recentes": [
+                {
+                    "id": f.id,
+                    "event": f.event,
+                    "payment_id": f.payment_id,
+                    "tentativas": f.tentativas,
+                    "erro": f.ultimo_erro,
+                    "received_at": f.received_at.isoformat()
+                }
+                for f in falhas
+            ],
+            "worker": {
+                **self._counters,
+                "workers": len(self._tasks),
+                "ultimo_lote_ms": round(self._last_batch_ms, 2)
+            }
+        }
+
+
+# Instância global
+webhook_inbox = WebhookInboxProcessor(
+    workers=settings.WEBHOOK_INBOX_WORKERS,
+    batch_size=settings.WEBHOOK_INBOX_BATCH_SIZE,
+    poll_interval=settings.WEBHOOK_INBOX_POLL_SECONDS,
+    max_attempts=settings.WEBHOOK_INBOX_MAX_ATTEMPTS,
+    not_found_window=settings.WEBHOOK_INBOX_NOT_FOUND_WINDOW_SECONDS,
+    backoff=settings.WEBHOOK_INBOX_BACKOFF_SECONDS,
+    backoff_max=settings.WEBHOOK_INBOX_BACKOFF_MAX_SECONDS
+)
@@ -0,0 +1,46 @@
+"""
+Sincroniza a tabela official_draws com o histórico oficial da Powerball
+
+Sem argumentos, busca apenas os sorteios posteriores ao último gravado (na
+primeira vez, carrega o histórico inteiro). Útil para o backfill inicial
+fora do horário de pico ou para rodar via cron com OFFICIAL_DRAWS_SYNC_ENABLED=false.
+
+Uso:
+    python sync_official_draws.py [--full] [--fixture fixtures/official_draws.json]
+"""
+import argparse
+import asyncio
+
+from config import get_settings
+from database import init_db
+from services.http_client import http_clients
+from services.official_draws import OfficialDrawSync, official_draw_sync
+
+settings = get_settings()
+
+
+async def run(args):
+    await init_db()
+    sync = official_draw_sync
+    if args.fixture:
+        sync = OfficialDrawSync(settings.OFFICIAL_DRAWS_SOURCE_URL, args.fixture, settings.OFFICIAL_DRAWS_RETRY_SECONDS)
+    try:
+        stats = await sync.sync(full=args.full)
+    finally:
+        await http_clients.aclose()
+
+    if stats is None:
+        print("Outro worker já está sincronizando; tente novamente em instantes")
+        return False
+    print(f"Sync {stats['modo']}: {stats['linhas_recebidas']} linha(s) recebida(s), "
+          f"{stats['inseridos']} sorteio(s) novo(s), {stats['invalidas']} inválida(s) em {stats['duracao_segundos']}s")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--full", action="store_true", help="Recarrega o histórico inteiro (ignora o último gravado)")
+    parser.add_argument("--fixture", default="", help="Lê os sorteios de um JSON local em vez da API")
+    args = parser.parse_args()
+
+    raise SystemExit(0 if asyncio.run(run(args)) else 1)
@@ -1,10 +1,10 @@
 """
 Configuração centralizada de templates Jinja2
+
+O Jinja2Templates (e o próprio Jinja) só é criado na primeira página
+renderizada: processos que servem apenas a API não pagam esse import.
 """
-from fastapi.templating import Jinja2Templates
 
-# Instância compartilhada de templates
-templates = Jinja2Templates(directory="templates")
 
 # Filtros customizados para Jinja2
 def format_currency_br(value):
@@ -26,7 +26,28 @@ def from_json_filter(value):
     except:
         return []
 
-# Registrar filtros globalmente
-templates.env.filters["currency"] = format_currency_br
-templates.env.filters["from_json"] = from_json_filter
 
+class LazyTemplates:
+    """Repassa tudo (TemplateResponse, env...) ao Jinja2Templates criado no primeiro uso"""
+
+    def __init__(self, directory: str):
+        self._directory = directory
+        self._templates = None
+
+    def _load(self):
+        if self._templates is None:
+            from fastapi.templating import Jinja2Templates
+
+            templates = Jinja2Templates(directory=self._directory)
+            # Registrar filtros globalmente
+            templates.env.filters["currency"] = format_currency_br
+            templates.env.filters["from_json"] = from_json_filter
+            self._templates = templates
+        return self._templates
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+
+# Instância compartilhada de templates
+templates = LazyTemplates(directory="templates")
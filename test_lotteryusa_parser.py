@@ -0,0 +1,40 @@
+"""
+Confere a extração do resultado do lotteryusa.com nas páginas salvas
+
+Cada HTML em fixtures/lotteryusa/ tem o resultado esperado em expected.json
+(null quando a página não traz resultado). Sem rede nem banco.
+
+Uso:
+    python test_lotteryusa_parser.py
+"""
+import json
+from pathlib import Path
+
+from services.powerball_results import is_valid_result, parse_lotteryusa_html
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures" / "lotteryusa"
+
+
+def main() -> bool:
+    esperados = json.loads((FIXTURES_DIR / "expected.json").read_text(encoding="utf-8"))
+    paginas = sorted(p.name for p in FIXTURES_DIR.glob("*.html"))
+    sem_esperado = set(paginas) - set(esperados)
+    if sem_esperado:
+        print(f"ERRO: fixtures sem resultado esperado em expected.json: {sorted(sem_esperado)}")
+        return False
+
+    ok = True
+    for nome in paginas:
+        obtido = parse_lotteryusa_html((FIXTURES_DIR / nome).read_bytes())
+        esperado = esperados[nome]
+        valido = obtido is None or is_valid_result({**obtido, "data": "2024-01-01"})
+        if obtido == esperado and valido:
+            print(f"OK    {nome}")
+        else:
+            ok = False
+            print(f"FALHA {nome}: esperado {esperado}, obtido {obtido}")
+    return ok
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if main() else 1)
@@ -0,0 +1,180 @@
+"""
+Testa se as consultas quentes dos routers usam índice (EXPLAIN)
+
+Cria as tabelas num schema temporário, popula com uma massa sintética grande,
+roda ANALYZE e confere o plano de cada consulta. Tudo acontece numa única
+transação desfeita no final: o banco não é alterado.
+
+Requer PostgreSQL (DATABASE_URL).
+
+Uso:
+    python test_query_plans.py [--usuarios 20000] [--apostas 300000] [--transacoes 300000]
+"""
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, desc, func, or_, select, text
+from sqlalchemy.dialects import postgresql
+
+from database import (
+    Aposta, Base, Concurso, StatusConcurso, StatusTransacao, TipoTransacao, Transacao, engine
+)
+
+SCHEMA = "query_plan_check"
+
+
+def hot_queries():
+    """(descrição, consulta, índice esperado) - mesmas consultas dos routers"""
+    agora = datetime.utcnow()
+    return [
+        (
+            "Webhook/reconciliação: transação por gateway_id (services/payments.py)",
+            select(Transacao).where(Transacao.gateway_id == "pay_150000"),
+            "ix_transacoes_gateway_id"
+        ),
+        (
+            "Meus jogos (routers/player.py my-bets, routers/bot.py)",
+            select(Aposta).where(Aposta.usuario_id == 4321).order_by(Aposta.data_aposta.desc()).limit(50),
+            "ix_apostas_usuario_data_aposta"
+        ),
+        (
+            "Ganhadores do concurso (routers/admin.py)",
+            select(func.count(Aposta.id)).where(Aposta.concurso_id == 777, Aposta.is_winner == True),
+            "ix_apostas_concurso_winner"
+        ),
+        (
+            "Apostas do concurso na apuração (routers/admin.py realizar_sorteio)",
+            select(Aposta).where(Aposta.concurso_id == 777),
+            "ix_apostas_concurso_winner"
+        ),
+        (
+            "Histórico de transações (routers/finance.py, routers/player.py)",
+            select(Transacao).where(Transacao.usuario_id == 4321).order_by(desc(Transacao.created_at)).limit(20),
+            "ix_transacoes_usuario_created_at"
+        ),
+        (
+            "Cobrança pendente reaproveitável (routers/finance.py create_deposit)",
+            select(Transacao).where(
+                Transacao.usuario_id == 4321,
+                Transacao.tipo == TipoTransacao.DEPOSITO,
+                Transacao.status == StatusTransacao.PENDENTE,
+                Transacao.valor == 50.0,
+                Transacao.gateway_id != "",
+                Transacao.created_at >= agora - timedelta(minutes=30),
+                or_(Transacao.pix_expira_em.is_(None), Transacao.pix_expira_em > agora)
+            ).order_by(Transacao.created_at.desc()).limit(1),
+            "ix_transacoes_usuario_created_at"
+        ),
+        (
+            "Concurso ativo (routers/admin.py dashboard, routers/bot.py)",
+            select(Concurso).where(
+                Concurso.is_active == True,
+                Concurso.status == StatusConcurso.ATIVO,
+                Concurso.is_drawn == False
+            ).order_by(Concurso.data_criacao.desc()),
+            "ix_concursos_ativos_data_criacao"
+        ),
+        (
+            "Concurso ativo (routers/player.py)",
+            select(Concurso).where(and_(
+                Concurso.status == StatusConcurso.ATIVO,
+                Concurso.is_active == True
+            )).order_by(desc(Concurso.data_criacao)).limit(1),
+            "ix_concursos_ativos_data_criacao"
+        ),
+    ]
+
+
+SEED = [
+    """
+    INSERT INTO usuarios (telegram_id, nome, saldo, cadastro_completo, is_archived, data_cadastro)
+    SELECT 1000000 + g, 'Usuario ' || g, 0, TRUE, FALSE, now() - g * INTERVAL '1 minute'
+    FROM generate_series(1, :usuarios) g
+    """,
+    """
+    INSERT INTO concursos (titulo, premio_total, preco_cota, status, is_active, is_drawn, data_criacao)
+    SELECT 'Concurso ' || g, 1000, 25,
+           CASE WHEN g = :concursos THEN 'ATIVO' ELSE 'SORTEADO' END::statusconcurso,
+           g = :concursos, g <> :concursos, now() - (:concursos - g) * INTERVAL '1 day'
+    FROM generate_series(1, :concursos) g
+    """,
+    """
+    INSERT INTO apostas (usuario_id, concurso_id, numeros_brancos, numeros_vermelhos, valor_pago,
+                         data_aposta, is_winner, valor_premio, acertos)
+    SELECT 1 + (g * 7919) % :usuarios, 1 + (g * 104729) % :concursos, '[1,2,3,4,5]', '[1]', 25,
+           now() - g * INTERVAL '1 second', g % 500 = 0, 0, 0
+    FROM generate_series(1, :apostas) g
+    """,
+    """
+    INSERT INTO transacoes (usuario_id, tipo, valor, status, gateway_id, created_at, updated_at)
+    SELECT 1 + (g * 7919) % :usuarios, 'DEPOSITO', 50,
+           CASE WHEN g % 10 = 0 THEN 'PENDENTE' ELSE 'PAGO' END::statustransacao,
+           'pay_' || g, now() - g * INTERVAL '1 second', now()
+    FROM generate_series(1, :transacoes) g
+    """,
+]
+
+
+def plan_indexes(node) -> set:
+    """Nomes de índices usados em qualquer nó do plano"""
+    indexes = set()
+    if "Index Name" in node:
+        indexes.add(node["Index Name"])
+    for child in node.get("Plans", []):
+        indexes |= plan_indexes(child)
+    return indexes
+
+
+async def main(args) -> bool:
+    ok = True
+    async with engine.connect() as conn:
+        trans = await conn.begin()
+        try:
+            await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+            await conn.execute(text(f"SET LOCAL search_path TO {SCHEMA}"))
+            await conn.run_sync(Base.metadata.create_all)
+
+            params = {
+                "usuarios": args.usuarios,
+                "concursos": args.concursos,
+                "apostas": args.apostas,
+                "transacoes": args.transacoes
+            }
+            print("Populando massa sintética...")
+            for statement in SEED:
+                await conn.execute(text(statement), params)
+            await conn.execute(text("ANALYZE usuarios, concursos, apostas, transacoes"))
+
+            print("=" * 80)
+            for descricao, query, indice in hot_queries():
+                sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+                result = await conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+                plan = result.scalar()
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                usados = plan_indexes(plan[0]["Plan"])
+
+                if indice in usados:
+                    print(f"OK    {descricao}\n      -> {indice}")
+                else:
+                    ok = False
+                    print(f"FALHA {descricao}\n      esperado {indice}, usados: {sorted(usados) or 'nenhum (Seq Scan)'}")
+            print("=" * 80)
+        finally:
+            await trans.rollback()
+    await engine.dispose()
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--usuarios", type=int, default=20000)
+    parser.add_argument("--concursos", type=int, default=2000)
+    parser.add_argument("--apostas", type=int, default=300000)
+    parser.add_argument("--transacoes", type=int, default=300000)
+    args = parser.parse_args()
+
+    sys.exit(0 if asyncio.run(main(args)) else 1)